@@ -0,0 +1,164 @@
+"""Заглушки Telegram Bot API и Django для нагрузочных тестов.
+
+`FakeTelegram` отвечает на методы Bot API так, чтобы aiogram принимал ответы,
+добавляет задержку и с заданной вероятностью отвечает 429 с `retry_after`.
+Каждая отправка тревоги записывается с моментом получения — по ним считается
+задержка от приёма до доставки, а правки сообщений тревог — вместе с текстом.
+`FakeDjango` считает решения по каждой тревоге и обслуживает `send-action`, `send-actions`,
+`alert-stats`, `register_telegram` и раздаёт картинку тревоги из `/media/`.
+"""
+import asyncio
+import random
+import re
+import time
+from collections import Counter
+from typing import List, Tuple
+
+import orjson
+from aiohttp import web
+
+ALERT_ID_RE = re.compile(r"ID тревоги:</b> (\S+)")
+
+
+class FakeTelegram:
+    def __init__(self, latency: Tuple[float, float] = (0.0, 0.0), rate_429: float = 0.0, retry_after: int = 1):
+        self.latency = latency
+        self.rate_429 = rate_429
+        self.retry_after = retry_after
+        self.methods: Counter = Counter()
+        self.throttled = 0
+        # (момент получения, aibox_alert_id, chat_id)
+        self.deliveries: List[Tuple[float, str, int]] = []
+        # (aibox_alert_id, chat_id, новый текст) для editMessageText/editMessageCaption
+        self.edits: List[Tuple[str, int, str]] = []
+        self._message_id = 0
+        self._file_id = 0
+
+    def app(self) -> web.Application:
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        app.router.add_post("/bot{token}/{method}", self.handle)
+        return app
+
+    @staticmethod
+    def _ok(result) -> web.Response:
+        return web.Response(body=orjson.dumps({"ok": True, "result": result}), content_type="application/json")
+
+    def _message(self, chat_id: int, **extra) -> dict:
+        self._message_id += 1
+        chat_type = "private" if chat_id > 0 else "supergroup"
+        return {"message_id": self._message_id, "date": int(time.time()), "chat": {"id": chat_id, "type": chat_type}, **extra}
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"].lower()
+        form = await request.post()
+        self.methods[method] += 1
+
+        if method == "getupdates":
+            await asyncio.sleep(min(float(form.get("timeout") or 0), 1.0))
+            return self._ok([])
+        if method == "getme":
+            return self._ok({"id": 1, "is_bot": True, "first_name": "Bench", "username": "bench_bot"})
+        if method not in ("sendmessage", "sendphoto", "sendvideo", "editmessagetext", "editmessagecaption"):
+            return self._ok(True)
+
+        low, high = self.latency
+        if high:
+            await asyncio.sleep(random.uniform(low, high))
+        if self.rate_429 and random.random() < self.rate_429:
+            self.throttled += 1
+            return web.Response(
+                status=429,
+                body=orjson.dumps({
+                    "ok": False,
+                    "error_code": 429,
+                    "description": f"Too Many Requests: retry after {self.retry_after}",
+                    "parameters": {"retry_after": self.retry_after},
+                }),
+                content_type="application/json",
+            )
+
+        chat_id = int(form["chat_id"])
+        text = form.get("text") or form.get("caption") or ""
+        match = ALERT_ID_RE.search(text)
+        if match and method.startswith("send"):
+            self.deliveries.append((time.time(), match.group(1), chat_id))
+        elif match:
+            self.edits.append((match.group(1), chat_id, text))
+        extra = {"text": text} if method.endswith("text") or method == "sendmessage" else {"caption": text}
+        if method == "sendphoto":
+            self._file_id += 1
+            photo = form["photo"]
+            file_id = photo if isinstance(photo, str) else f"bench-photo-{self._file_id}"
+            extra["photo"] = [{"file_id": file_id, "file_unique_id": file_id, "width": 640, "height": 360}]
+        if method == "sendvideo":
+            self._file_id += 1
+            video = form["video"]
+            file_id = video if isinstance(video, str) else f"bench-video-{self._file_id}"
+            extra["video"] = {"file_id": file_id, "file_unique_id": file_id, "width": 640, "height": 360, "duration": 10}
+        return self._ok(self._message(chat_id, **extra))
+
+    def stats(self) -> dict:
+        return {"methods": dict(self.methods), "throttled": self.throttled}
+
+
+class FakeDjango:
+    def __init__(self, image: bytes, latency: Tuple[float, float] = (0.0, 0.0)):
+        self.image = image
+        self.latency = latency
+        self.requests: Counter = Counter()
+        # alert_id -> сколько раз по тревоге пришло решение
+        self.actions: Counter = Counter()
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/api/algorithms/v1/alerts/{alert_id}/send-action/", self.send_action)
+        app.router.add_post("/api/algorithms/v1/alerts/send-actions/", self.send_actions)
+        app.router.add_get("/api/algorithms/alert-stats/", self.alert_stats)
+        app.router.add_post("/api/users/v1/register_telegram/", self.register_telegram)
+        app.router.add_get("/media/{name}", self.media)
+        return app
+
+    async def _delay(self, endpoint: str):
+        self.requests[endpoint] += 1
+        low, high = self.latency
+        if high:
+            await asyncio.sleep(random.uniform(low, high))
+
+    async def send_action(self, request: web.Request) -> web.Response:
+        await self._delay("send_action")
+        self.actions[int(request.match_info["alert_id"])] += 1
+        return web.json_response({"error_code": 0, "message": "OK", "data": None})
+
+    async def send_actions(self, request: web.Request) -> web.Response:
+        await self._delay("send_actions")
+        actions = (await request.json())["actions"]
+        self.actions.update(int(action["alert_id"]) for action in actions)
+        return web.json_response({
+            "results": [{"alert_id": action["alert_id"], "status": 200, "data": {}} for action in actions],
+        })
+
+    async def alert_stats(self, request: web.Request) -> web.Response:
+        await self._delay("alert_stats")
+        return web.json_response({
+            "total_alerts": 0,
+            "confirmed_alerts": 0,
+            "rejected_alerts": 0,
+            "algorithms": [],
+        })
+
+    async def register_telegram(self, request: web.Request) -> web.Response:
+        await self._delay("register_telegram")
+        return web.json_response({"error_code": 0, "message": "OK", "data": None})
+
+    async def media(self, request: web.Request) -> web.Response:
+        self.requests["media"] += 1
+        return web.Response(body=self.image, content_type="image/jpeg")
+
+
+async def serve(app: web.Application, host: str = "127.0.0.1", port: int = 0) -> Tuple[web.AppRunner, int]:
+    """Запускает приложение aiohttp на свободном порту; возвращает runner и порт."""
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    return runner, site._server.sockets[0].getsockname()[1]
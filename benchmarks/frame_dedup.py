@@ -0,0 +1,129 @@
+"""Цена подавления почти одинаковых кадров (bot.services.frames) на одну тревогу.
+
+Берёт тревогу в сыром формате AIBox из data/alerts.json (JPEG в base64),
+строит из её кадра варианты — пережатый, чуть светлее, сдвинутый на
+несколько пикселей, отражённый и чужой — и печатает расстояние Хэмминга
+каждого до исходного. Затем меряет:
+- разбор сырой тревоги с декодированием base64 (что уже платит каждая тревога);
+- полное декодирование JPEG (для сравнения с уменьшенным декодированием);
+- dHash в текущем потоке;
+- `FrameDeduplicator.check` через пул потоков, включая сравнение с кольцом.
+
+Запуск: python -m benchmarks.frame_dedup [--alerts 2000] [--ring 16]
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from io import BytesIO
+from typing import Callable, Dict, List
+
+from bot import config
+from bot.services.aibox import RawAlertReader, raw_to_alert
+from bot.services.frames import FrameDeduplicator, dhash
+
+try:
+    from PIL import Image, ImageEnhance, ImageOps
+except ImportError:
+    Image = None
+
+
+def _jpeg(image, quality: int = 90) -> bytes:
+    output = BytesIO()
+    image.convert("RGB").save(output, "JPEG", quality=quality)
+    return output.getvalue()
+
+
+def _variants(data: bytes) -> Dict[str, bytes]:
+    with Image.open(BytesIO(data)) as image:
+        image.load()
+    width, height = image.size
+    shift = max(2, width // 200)
+    return {
+        "исходный": data,
+        "пережат q=60": _jpeg(image, 60),
+        "ярче на 5%": _jpeg(ImageEnhance.Brightness(image).enhance(1.05)),
+        f"сдвиг на {shift} пикс.": _jpeg(image.crop((shift, shift, width, height)).resize((width, height))),
+        "отражён": _jpeg(ImageOps.mirror(image)),
+        "другая сцена": _jpeg(ImageOps.invert(image.convert("RGB")).rotate(90, expand=True)),
+    }
+
+
+def _timed(func: Callable[[], object], repeat: int) -> List[float]:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def _summary(timings: List[float]) -> str:
+    timings = sorted(timings)
+    return (
+        f"p50 {statistics.median(timings) * 1000:.3f} мс, "
+        f"p99 {timings[int(len(timings) * 0.99)] * 1000:.3f} мс"
+    )
+
+
+def _full_decode(data: bytes):
+    with Image.open(BytesIO(data)) as image:
+        image.load()
+
+
+def _parse(body: bytes):
+    reader = RawAlertReader()
+    reader.feed(body)
+    return reader.result()
+
+
+async def _check(alerts, ring: int) -> List[float]:
+    dedup = FrameDeduplicator(ring_size=ring, window=3600)
+    timings = []
+    for alert, data in alerts:
+        started = time.perf_counter()
+        await dedup.check(alert, data)
+        timings.append(time.perf_counter() - started)
+    print(f"  уникальных: {dedup.unique}, дубликатов: {dedup.duplicates}")
+    dedup.shutdown()
+    return timings
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--alerts", type=int, default=2000)
+    parser.add_argument("--ring", type=int, default=16)
+    options = parser.parse_args()
+    if Image is None:
+        print("Нужен Pillow: pip install Pillow")
+        return 1
+
+    with open(config.ALERT_JSON_PATH, "rb") as file:
+        body = file.read()
+    raw, frame = _parse(body)
+    with Image.open(BytesIO(frame)) as image:
+        size = image.size
+    print(f"кадр: {size[0]}x{size[1]}, {len(frame) / 1024:.0f} КБ JPEG, порог: {config.ALERT_FRAME_DEDUP_THRESHOLD} бит")
+
+    variants = _variants(frame)
+    reference = dhash(frame)
+    for name, data in variants.items():
+        print(f"  {name:<22} расстояние {(dhash(data) ^ reference).bit_count():>2}")
+
+    repeat = max(1, options.alerts // 4)
+    print(f"разбор сырой тревоги:     {_summary(_timed(lambda: _parse(body), repeat))}")
+    print(f"полное декодирование JPEG: {_summary(_timed(lambda: _full_decode(frame), repeat))}")
+    print(f"dHash в потоке:            {_summary(_timed(lambda: dhash(frame), repeat))}")
+
+    # Поток тревог одной камеры: кадры чередуются, как при неподвижной сцене с редкими изменениями
+    alert = raw_to_alert(raw, None)
+    frames = list(variants.values())
+    alerts = [(alert, frames[n % len(frames)]) for n in range(options.alerts)]
+    timings = asyncio.run(_check(alerts, options.ring))
+    print(f"check() через пул потоков: {_summary(timings)}, {len(timings) / sum(timings):.0f} тревог/с")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,371 @@
+"""Сквозной нагрузочный тест: POST /alerts/ -> очередь -> Telegram.
+
+Поднимает заглушки Telegram Bot API и Django (benchmarks/fakes.py), запускает
+бота отдельным процессом (`python -m bot`) и с постоянной частотой шлёт ему
+тревоги, собранные из data/alerts.json. Меряет:
+- задержку приёма (ответ /alerts/), p50/p95/p99;
+- задержку от приёма до доставки каждому получателю, p50/p95/p99;
+- отправки в секунду;
+- пиковую память (RSS) и число открытых дескрипторов процесса бота.
+
+Результат — JSON с коммитом и параметрами прогона (`--output`), который можно
+сравнить с прошлым прогоном (`--compare`): при ухудшении больше `--threshold`
+скрипт завершается с кодом 1. По умолчанию действуют лимиты Telegram из конфига;
+`--no-limits` снимает их, чтобы мерить саму отправку (send_alert_to_telegram_v2).
+
+Пример:
+    python -m benchmarks.load --rate 50 --duration 20 --recipients 5 --no-limits \\
+        --latency-ms 20,80 --rate-429 0.01 --output bench.json --compare baseline.json
+"""
+import argparse
+import asyncio
+import base64
+import os
+import random
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import httpx
+import orjson
+
+from benchmarks.fakes import FakeDjango, FakeTelegram, serve
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DJANGO_HOST = "127.0.0.2"
+
+# Метрики для сравнения прогонов: имя -> True, если больше — лучше
+COMPARED_METRICS = {
+    "ingest_ms.p95": False,
+    "ingest_ms.p99": False,
+    "delivery_ms.p50": False,
+    "delivery_ms.p95": False,
+    "delivery_ms.p99": False,
+    "sends_per_sec": True,
+    "delivered_ratio": True,
+    "rss_mb_peak": False,
+    "fds_peak": False,
+}
+
+
+def percentiles(values: List[float]) -> Dict[str, Optional[float]]:
+    if not values:
+        return {"p50": None, "p95": None, "p99": None, "max": None}
+    values = sorted(values)
+
+    def at(q: float) -> float:
+        return round(values[min(len(values) - 1, int(len(values) * q))], 2)
+
+    return {"p50": round(statistics.median(values), 2), "p95": at(0.95), "p99": at(0.99), "max": round(values[-1], 2)}
+
+
+def load_sample(path: str) -> dict:
+    with open(path, "rb") as file:
+        return orjson.loads(file.read())
+
+
+def make_payload(sample: dict, n: int, run_id: str, media_url: str, users: List[int], options) -> dict:
+    """Тревога в формате Django (AlertSchema) на основе сырой тревоги AIBox."""
+    return {
+        "id": n + 1,
+        "aibox_alert_id": f"{run_id}-{n}",
+        "alert_time": datetime.fromtimestamp(sample["alert_time"]).isoformat(),
+        "device": {"id": 1, "aibox_id": sample["device"]["id"], "name": sample["device"]["name"], "desc": None},
+        "source": {
+            "id": 1,
+            "source_id": str(n % options.cameras),
+            "ipv4": sample["source"]["ipv4"],
+            "desc": sample["source"]["desc"],
+        },
+        "alg": {
+            "id": 1,
+            "key": sample["alg"]["name"],
+            "name": sample["alg"]["ch_name"] or sample["alg"]["name"],
+            "type": sample["alg"]["type"],
+        },
+        "hazard_level": sample.get("hazard_level", ""),
+        "image": f"{media_url}/alert.jpg?n={n}" if options.unique_images else f"{media_url}/alert.jpg",
+        "company": {"id": 1, "name": "Bench", "description": None},
+        "users_telegram_id": random.sample(users, options.recipients),
+        "for_security": True,
+    }
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def process_usage(pid: int) -> Dict[str, float]:
+    """RSS (МБ) и число открытых дескрипторов процесса (Linux, /proc)."""
+    rss = 0.0
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                rss = int(line.split()[1]) / 1024
+    return {"rss_mb": rss, "fds": len(os.listdir(f"/proc/{pid}/fd"))}
+
+
+def git_commit() -> str:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+        dirty = subprocess.run(["git", "diff", "--quiet", "HEAD", "--", "bot"], cwd=REPO_ROOT).returncode != 0
+        return commit + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+async def wait_ready(client: httpx.AsyncClient, process: subprocess.Popen, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Бот завершился при старте с кодом {process.returncode}")
+        try:
+            if (await client.get("/alerts/queue")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("Бот не поднял API за отведённое время")
+
+
+async def run(options) -> dict:
+    sample = load_sample(options.sample)
+    telegram = FakeTelegram(
+        latency=(options.latency_ms[0] / 1000, options.latency_ms[1] / 1000),
+        rate_429=options.rate_429,
+        retry_after=options.retry_after,
+    )
+    django = FakeDjango(base64.b64decode(sample["image"]))
+    telegram_runner, telegram_port = await serve(telegram.app())
+    # Не 127.0.0.1/localhost: такие картинки бот читает с диска, а не скачивает
+    django_runner, django_port = await serve(django.app(), host=DJANGO_HOST)
+    api_port = free_port()
+    tmp = tempfile.TemporaryDirectory()
+
+    env = dict(
+        os.environ,
+        BOT_TOKEN="123456:BENCHMARK",
+        TELEGRAM_API_URL=f"http://127.0.0.1:{telegram_port}",
+        DJANGO_API_URL=f"http://{DJANGO_HOST}:{django_port}/",
+        API_HOST="127.0.0.1",
+        API_PORT=str(api_port),
+        ALERT_COALESCE_WINDOW=str(options.coalesce_window),
+        OUTBOX_PATH=os.path.join(tmp.name, "outbox.sqlite3"),
+        STATE_SQLITE_PATH=os.path.join(tmp.name, "state.sqlite3"),
+        STATS_SNAPSHOT_PATH=os.path.join(tmp.name, "stats_snapshot.json"),
+    )
+    if options.no_limits:
+        env.update(TELEGRAM_GLOBAL_RATE="100000", TELEGRAM_CHAT_RATE="100000", TELEGRAM_GROUP_RATE="100000")
+    for item in options.env:
+        key, _, value = item.partition("=")
+        env[key] = value
+
+    log = open(os.path.join(tmp.name, "bot.log"), "wb")
+    process = subprocess.Popen([sys.executable, "-m", "bot"], cwd=REPO_ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)
+    usage: List[Dict[str, float]] = []
+    posted_at: Dict[str, float] = {}
+    ingest_ms: List[float] = []
+    statuses: Counter = Counter()
+
+    async def sample_usage():
+        while True:
+            try:
+                usage.append(process_usage(process.pid))
+            except OSError:
+                return
+            await asyncio.sleep(0.5)
+
+    limits = httpx.Limits(max_connections=options.concurrency, max_keepalive_connections=options.concurrency)
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{api_port}", limits=limits, timeout=30) as client:
+            await wait_ready(client, process)
+            sampler = asyncio.create_task(sample_usage())
+            baseline = process_usage(process.pid)
+
+            run_id = f"bench{int(time.time())}"
+            users = list(range(100000, 100000 + options.users))
+            media_url = f"http://{DJANGO_HOST}:{django_port}/media"
+            total = int(options.rate * options.duration)
+            payloads = [
+                orjson.dumps(make_payload(sample, n, run_id, media_url, users, options)) for n in range(total)
+            ]
+            headers = {"Content-Type": "application/json"}
+
+            async def post(n: int, payload: bytes):
+                alert_id = f"{run_id}-{n}"
+                started = time.time()
+                try:
+                    response = await client.post("/alerts/", content=payload, headers=headers)
+                    statuses[str(response.status_code)] += 1
+                    if response.status_code == 202:
+                        posted_at[alert_id] = started
+                except httpx.HTTPError as e:
+                    statuses[type(e).__name__] += 1
+                ingest_ms.append((time.time() - started) * 1000)
+
+            # Открытая модель нагрузки: тревоги уходят по расписанию, не дожидаясь ответов
+            started = time.monotonic()
+            tasks = []
+            for n, payload in enumerate(payloads):
+                delay = started + n / options.rate - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                tasks.append(asyncio.create_task(post(n, payload)))
+            await asyncio.gather(*tasks)
+            load_seconds = time.monotonic() - started
+
+            # Ждём доставок, пока они идут; останавливаемся после `drain_timeout` секунд без прогресса
+            expected = len(posted_at) * options.recipients if options.coalesce_window <= 0 else None
+            last_count, last_progress = -1, time.monotonic()
+            while time.monotonic() - last_progress < options.drain_timeout:
+                count = len(telegram.deliveries)
+                if expected is not None and count >= expected:
+                    break
+                if count != last_count:
+                    last_count, last_progress = count, time.monotonic()
+                await asyncio.sleep(0.2)
+            queue = (await client.get("/alerts/queue")).json()["data"]
+            sampler.cancel()
+            await asyncio.gather(sampler, return_exceptions=True)
+    finally:
+        if process.poll() is None:
+            process.send_signal(signal.SIGTERM)
+            try:
+                process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        log.close()
+        await telegram_runner.cleanup()
+        await django_runner.cleanup()
+        if options.keep_log:
+            print(f"Лог бота: {os.path.join(tmp.name, 'bot.log')}", file=sys.stderr)
+        else:
+            tmp.cleanup()
+
+    delivered = {}
+    for moment, alert_id, chat_id in telegram.deliveries:
+        delivered.setdefault((alert_id, chat_id), moment)
+    delivery_ms = [
+        (moment - posted_at[alert_id]) * 1000 for (alert_id, _), moment in delivered.items() if alert_id in posted_at
+    ]
+    first_post = min(posted_at.values(), default=0.0)
+    last_delivery = max(delivered.values(), default=first_post)
+    expected_sends = len(posted_at) * options.recipients
+
+    return {
+        "commit": git_commit(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "params": {
+            "rate": options.rate,
+            "duration": options.duration,
+            "recipients": options.recipients,
+            "users": options.users,
+            "cameras": options.cameras,
+            "latency_ms": options.latency_ms,
+            "rate_429": options.rate_429,
+            "coalesce_window": options.coalesce_window,
+            "no_limits": options.no_limits,
+            "unique_images": options.unique_images,
+            "env": options.env,
+        },
+        "metrics": {
+            "alerts_sent": len(payloads),
+            "offered_rate": round(len(payloads) / load_seconds, 1),
+            "statuses": dict(statuses),
+            "ingest_ms": percentiles(ingest_ms),
+            "delivery_ms": percentiles(delivery_ms),
+            "deliveries": len(delivered),
+            "delivered_ratio": round(len(delivered) / expected_sends, 4) if expected_sends else None,
+            "sends_per_sec": round(len(delivered) / (last_delivery - first_post), 1) if last_delivery > first_post else 0.0,
+            "rss_mb_start": round(baseline["rss_mb"], 1),
+            "rss_mb_peak": round(max(item["rss_mb"] for item in usage), 1) if usage else None,
+            "fds_start": baseline["fds"],
+            "fds_peak": max(item["fds"] for item in usage) if usage else None,
+            "telegram": telegram.stats(),
+            "django": dict(django.requests),
+            "queue": queue,
+        },
+    }
+
+
+def _lookup(metrics: dict, path: str):
+    value = metrics
+    for part in path.split("."):
+        value = value.get(part) if isinstance(value, dict) else None
+    return value
+
+
+def compare(result: dict, baseline: dict, threshold: float) -> bool:
+    """Печатает изменения ключевых метрик; возвращает False, если есть ухудшение больше порога."""
+    if result["params"] != baseline["params"]:
+        print("Внимание: параметры прогонов различаются, сравнение может быть некорректным")
+    ok = True
+    print(f"{'метрика':<18}{baseline['commit']:>14}{result['commit']:>14}{'изменение':>12}")
+    for path, higher_is_better in COMPARED_METRICS.items():
+        old, new = _lookup(baseline["metrics"], path), _lookup(result["metrics"], path)
+        if old is None or new is None:
+            continue
+        change = (new - old) / old if old else 0.0
+        worse = -change if higher_is_better else change
+        flag = ""
+        if worse > threshold:
+            flag, ok = "  <- хуже", False
+        print(f"{path:<18}{old:>14}{new:>14}{change:>+11.1%}{flag}")
+    return ok
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0], formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rate", type=float, default=20, help="тревог в секунду")
+    parser.add_argument("--duration", type=float, default=15, help="длительность подачи нагрузки, с")
+    parser.add_argument("--recipients", type=int, default=3, help="получателей у каждой тревоги")
+    parser.add_argument("--users", type=int, default=500, help="размер пула получателей")
+    parser.add_argument("--cameras", type=int, default=1000, help="число разных камер (влияет на сворачивание)")
+    parser.add_argument("--latency-ms", type=lambda s: [float(x) for x in s.split(",")], default=[0.0, 0.0],
+                        help="задержка ответа Telegram, мин,макс в мс")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="доля ответов 429 от Telegram")
+    parser.add_argument("--retry-after", type=int, default=1, help="retry_after в ответах 429")
+    parser.add_argument("--coalesce-window", type=float, default=0, help="ALERT_COALESCE_WINDOW для бота")
+    parser.add_argument("--no-limits", action="store_true", help="снять лимиты отправки в Telegram")
+    parser.add_argument("--same-image", dest="unique_images", action="store_false",
+                        help="у всех тревог один URL картинки (по умолчанию у каждой свой)")
+    parser.add_argument("--concurrency", type=int, default=100, help="одновременных HTTP-соединений к боту")
+    parser.add_argument("--drain-timeout", type=float, default=10, help="ожидание доставок без прогресса, с")
+    parser.add_argument("--env", action="append", default=[], help="переменная окружения бота KEY=VALUE")
+    parser.add_argument("--sample", default=os.path.join(REPO_ROOT, "data", "alerts.json"), help="образец тревоги AIBox")
+    parser.add_argument("--output", help="куда записать JSON с результатом")
+    parser.add_argument("--compare", help="JSON прошлого прогона для сравнения")
+    parser.add_argument("--threshold", type=float, default=0.2, help="допустимое ухудшение метрик (доля)")
+    parser.add_argument("--keep-log", action="store_true", help="не удалять лог бота")
+    return parser.parse_args(argv)
+
+
+def main() -> int:
+    options = parse_args()
+    result = asyncio.run(run(options))
+    text = orjson.dumps(result, option=orjson.OPT_INDENT_2).decode()
+    print(text)
+    if options.output:
+        with open(options.output, "w") as file:
+            file.write(text + "\n")
+    if options.compare:
+        with open(options.compare, "rb") as file:
+            baseline = orjson.loads(file.read())
+        if not compare(result, baseline, options.threshold):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
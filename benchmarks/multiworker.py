@@ -0,0 +1,229 @@
+"""Сквозная проверка бота в нескольких процессах (WEB_WORKERS > 1).
+
+Запускает `python -m bot` с WEB_WORKERS воркерами uvicorn, webhook Telegram и
+общим состоянием в SQLite (STATE_BACKEND=sqlite) на заглушках Telegram и Django
+(benchmarks/fakes.py). Каждый запрос идёт по новому соединению, так что ядро
+раскидывает их по воркерам. Проверяет:
+- разные тревоги вместе с повторами тех же тревог доставлены каждому
+  получателю ровно один раз;
+- шквал тревог с одной камеры сворачивается в одно сообщение, которое потом
+  правится на «Ещё тревог: N-1» — серия общая для всех воркеров;
+- одновременные нажатия «Подтвердить»/«Отклонить» по одной тревоге из разных
+  чатов дают ровно одно решение в Django.
+
+Запуск: python -m benchmarks.multiworker [--workers 4] [--alerts 100]
+"""
+import argparse
+import asyncio
+import base64
+import os
+import random
+import re
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from types import SimpleNamespace
+from typing import List
+
+import httpx
+import orjson
+
+from benchmarks.fakes import FakeDjango, FakeTelegram, serve
+from benchmarks.load import DJANGO_HOST, REPO_ROOT, free_port, load_sample, make_payload, wait_ready
+
+WEBHOOK_PATH = "/telegram/webhook"
+WEBHOOK_SECRET = "multiworker-secret"
+FOLDED_RE = re.compile(r"Ещё тревог:</b> (\d+)")
+
+
+def callback_update(update_id: int, chat_id: int, data: str) -> dict:
+    """Апдейт Telegram с нажатием кнопки под сообщением тревоги."""
+    return {
+        "update_id": update_id,
+        "callback_query": {
+            "id": f"cb-{update_id}",
+            "from": {"id": chat_id, "is_bot": False, "first_name": "Bench"},
+            "chat_instance": "bench",
+            "data": data,
+            "message": {"message_id": update_id, "date": int(time.time()), "chat": {"id": chat_id, "type": "private"}, "text": "alert"},
+        },
+    }
+
+
+async def wait_for(condition, timeout: float, step: float = 0.2) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        await asyncio.sleep(step)
+    return condition()
+
+
+async def run(options) -> bool:
+    sample = load_sample(options.sample)
+    telegram = FakeTelegram()
+    # Задержка Django держит решение «в полёте», пока приходят остальные нажатия
+    django = FakeDjango(base64.b64decode(sample["image"]), latency=(0.3, 0.5))
+    telegram_runner, telegram_port = await serve(telegram.app())
+    django_runner, django_port = await serve(django.app(), host=DJANGO_HOST)
+    api_port = free_port()
+    tmp = tempfile.TemporaryDirectory()
+
+    env = dict(
+        os.environ,
+        BOT_TOKEN="123456:BENCHMARK",
+        TELEGRAM_API_URL=f"http://127.0.0.1:{telegram_port}",
+        DJANGO_API_URL=f"http://{DJANGO_HOST}:{django_port}/",
+        API_HOST="127.0.0.1",
+        API_PORT=str(api_port),
+        WEB_WORKERS=str(options.workers),
+        TELEGRAM_MODE="webhook",
+        WEBHOOK_BASE_URL=f"http://127.0.0.1:{api_port}",
+        WEBHOOK_PATH=WEBHOOK_PATH,
+        WEBHOOK_SECRET=WEBHOOK_SECRET,
+        STATE_BACKEND="sqlite",
+        ALERT_COALESCE_WINDOW=str(options.coalesce_window),
+        # Без окна повторных нажатий: до решения в Django доходит каждое нажатие
+        CALLBACK_DEBOUNCE="0",
+        TELEGRAM_GLOBAL_RATE="100000",
+        TELEGRAM_CHAT_RATE="100000",
+        TELEGRAM_GROUP_RATE="100000",
+        OUTBOX_PATH=os.path.join(tmp.name, "outbox.sqlite3"),
+        HISTORY_PATH=os.path.join(tmp.name, "history.sqlite3"),
+        SUBSCRIPTIONS_PATH=os.path.join(tmp.name, "subscriptions.json"),
+        STATE_SQLITE_PATH=os.path.join(tmp.name, "state.sqlite3"),
+        STATS_SNAPSHOT_PATH=os.path.join(tmp.name, "stats_snapshot.json"),
+    )
+    log = open(os.path.join(tmp.name, "bot.log"), "wb")
+    process = subprocess.Popen([sys.executable, "-m", "bot"], cwd=REPO_ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+    run_id = f"mw{int(time.time())}"
+    users = list(range(100000, 100000 + options.users))
+    media_url = f"http://{DJANGO_HOST}:{django_port}/media"
+    payload_options = SimpleNamespace(cameras=10 ** 9, recipients=options.recipients, unique_images=False)
+    distinct = [make_payload(sample, n, run_id, media_url, users, payload_options) for n in range(options.alerts)]
+    storms: List[List[dict]] = []
+    for s in range(options.storms):
+        series = []
+        for i in range(options.storm_size):
+            payload = make_payload(sample, 10 ** 6 + s * options.storm_size + i, run_id, media_url, users, payload_options)
+            payload["source"]["source_id"] = f"storm-{s}"
+            payload["users_telegram_id"] = users[:options.recipients]
+            series.append(payload)
+        storms.append(series)
+
+    # Новое соединение на каждый запрос: иначе всё уйдёт в один воркер
+    limits = httpx.Limits(max_connections=options.concurrency, max_keepalive_connections=0)
+    ok = True
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{api_port}", limits=limits, timeout=30) as client:
+            await wait_ready(client, process)
+            if not await wait_for(lambda: telegram.methods["setwebhook"] >= options.workers, 60):
+                raise RuntimeError(f"webhook зарегистрировали {telegram.methods['setwebhook']} воркеров из {options.workers}")
+
+            async def post(payload: dict):
+                await client.post("/alerts/", content=orjson.dumps(payload), headers={"Content-Type": "application/json"})
+
+            # 1. Разные тревоги, каждая — `copies` раз одновременно
+            posts = [post(payload) for payload in distinct for _ in range(options.copies)]
+            random.shuffle(posts)
+            await asyncio.gather(*posts)
+            expected = len(distinct) * options.recipients
+            await wait_for(lambda: len(telegram.deliveries) >= expected, 30)
+
+            # 2. Шквалы с одной камеры — одновременно, вперемешку между сериями
+            posts = [post(payload) for series in storms for payload in series]
+            random.shuffle(posts)
+            await asyncio.gather(*posts)
+
+            # 3. Одновременные нажатия по тревогам из п. 1 из разных чатов
+            async def press(update_id: int, chat_id: int, data: str):
+                await client.post(
+                    WEBHOOK_PATH,
+                    content=orjson.dumps(callback_update(update_id, chat_id, data)),
+                    headers={"Content-Type": "application/json", "X-Telegram-Bot-Api-Secret-Token": WEBHOOK_SECRET},
+                )
+
+            pressed = [payload["id"] for payload in distinct[:options.pressed]]
+            presses = []
+            for alert_id in pressed:
+                for p in range(options.presses):
+                    action = "reject_alert" if p == options.presses - 1 else "confirm_alert"
+                    # У каждого нажатия свой пользователь: лимит входящих команд считается на пользователя
+                    update_id = alert_id * 100 + p
+                    presses.append(press(update_id, 200000 + update_id, f"{action}:{alert_id}"))
+            random.shuffle(presses)
+            await asyncio.gather(*presses)
+
+            # Серии закрываются через ALERT_COALESCE_WINDOW, решения уходят в Django в фоне
+            await wait_for(
+                lambda: len(telegram.edits) >= options.storms * options.recipients and len(django.actions) >= len(pressed),
+                options.coalesce_window + 30,
+            )
+            await asyncio.sleep(1.0)
+    finally:
+        if process.poll() is None:
+            process.send_signal(signal.SIGTERM)
+            try:
+                process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        log.close()
+        await telegram_runner.cleanup()
+        await django_runner.cleanup()
+        if options.keep_log:
+            print(f"Лог бота: {os.path.join(tmp.name, 'bot.log')}", file=sys.stderr)
+        else:
+            tmp.cleanup()
+
+    deliveries = Counter((alert_id, chat_id) for _, alert_id, chat_id in telegram.deliveries)
+    distinct_ids = {payload["aibox_alert_id"] for payload in distinct}
+    per_recipient = Counter(count for (alert_id, _), count in deliveries.items() if alert_id in distinct_ids)
+    missing = expected - sum(1 for (alert_id, _) in deliveries if alert_id in distinct_ids)
+    print(f"воркеров: {options.workers}, webhook зарегистрирован {telegram.methods['setwebhook']} раз")
+    print(f"разные тревоги: доставок на получателя {dict(per_recipient)}, не доставлено {missing}")
+    ok &= missing == 0 and set(per_recipient) == {1}
+
+    for s, series in enumerate(storms):
+        series_ids = {payload["aibox_alert_id"] for payload in series}
+        sent = sum(count for (alert_id, _), count in deliveries.items() if alert_id in series_ids)
+        folded = [int(FOLDED_RE.search(text).group(1)) for alert_id, _, text in telegram.edits
+                  if alert_id in series_ids and FOLDED_RE.search(text)]
+        print(f"шквал {s}: отправок {sent}, правок {len(folded)}, свёрнуто {max(folded, default=0)} из {len(series) - 1}")
+        ok &= sent == options.recipients and folded and max(folded) == len(series) - 1
+
+    decisions = Counter(django.actions[alert_id] for alert_id in pressed)
+    print(f"нажатия: решений в Django на тревогу {dict(decisions)} (по {options.presses} нажатия на тревогу)")
+    ok &= set(decisions) == {1}
+
+    print("OK" if ok else "РАСХОЖДЕНИЕ")
+    return bool(ok)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=4, help="WEB_WORKERS бота")
+    parser.add_argument("--alerts", type=int, default=100, help="разных тревог")
+    parser.add_argument("--copies", type=int, default=3, help="сколько раз одновременно приходит каждая тревога")
+    parser.add_argument("--recipients", type=int, default=2, help="получателей у каждой тревоги")
+    parser.add_argument("--users", type=int, default=50, help="размер пула получателей")
+    parser.add_argument("--storms", type=int, default=3, help="камер со шквалом тревог")
+    parser.add_argument("--storm-size", type=int, default=40, help="тревог в одном шквале")
+    parser.add_argument("--coalesce-window", type=float, default=3, help="ALERT_COALESCE_WINDOW для бота")
+    parser.add_argument("--pressed", type=int, default=20, help="тревог, по которым нажимают кнопки")
+    parser.add_argument("--presses", type=int, default=4, help="одновременных нажатий на тревогу")
+    parser.add_argument("--concurrency", type=int, default=50, help="одновременных HTTP-соединений к боту")
+    parser.add_argument("--sample", default=os.path.join(REPO_ROOT, "data", "alerts.json"), help="образец тревоги AIBox")
+    parser.add_argument("--keep-log", action="store_true", help="не удалять лог бота")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    return 0 if asyncio.run(run(parse_args(argv))) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
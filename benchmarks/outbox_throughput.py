@@ -0,0 +1,111 @@
+"""Пропускная способность журнала доставок (bot.services.database.DeliveryOutbox).
+
+Имитирует приём тревог: `--concurrency` одновременных запросов записывают
+`--alerts` тревог по `--recipients` получателей, затем каждая тревога
+отмечается доставленной. Для сравнения печатается скорость пустого
+FastAPI-эндпоинта, принимающего `AlertSchema` (потолок приёма одного процесса
+без журнала), и скорость журнала без групповых коммитов (batch_size=1).
+
+Запуск: python -m benchmarks.outbox_throughput [--alerts 5000] [--concurrency 64]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import httpx
+from fastapi import FastAPI
+
+from bot.schemas import AlertSchema
+from bot.services.database import DeliveryOutbox
+
+
+def _payload(n: int, recipients: int) -> bytes:
+    alert = AlertSchema(
+        id=n,
+        aibox_alert_id=f"bench-{n}",
+        alert_time="2025-01-27T14:41:01",
+        device={"id": 1, "aibox_id": "box", "name": "AIBox", "desc": None},
+        source={"id": 1, "source_id": "16", "ipv4": "192.168.88.253", "desc": None},
+        alg={"id": 1, "key": "person_departure", "name": "Off-Post Detection", "type": "general"},
+        image="http://localhost/media/alerts/frame.jpg",
+        company={"id": 1, "name": "Company", "description": None},
+        users_telegram_id=list(range(100000, 100000 + recipients)),
+        for_security=True,
+    )
+    return alert.model_dump_json().encode()
+
+
+async def _run(path: str, payloads, concurrency: int, batch_size: int) -> dict:
+    outbox = DeliveryOutbox(path, batch_size=batch_size)
+    await outbox.start()
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def ingest(payload: bytes):
+        async with semaphore:
+            started = time.perf_counter()
+            alert = AlertSchema.model_validate_json(payload)
+            outbox_id = await outbox.add(alert)
+            latencies.append(time.perf_counter() - started)
+        await outbox.mark_delivered(outbox_id, {chat_id: 1 for chat_id in alert.users_telegram_id})
+
+    started = time.perf_counter()
+    await asyncio.gather(*(ingest(payload) for payload in payloads))
+    elapsed = time.perf_counter() - started
+    stats = outbox.stats()
+    await outbox.close()
+    latencies.sort()
+    return {
+        "alerts_per_sec": round(len(payloads) / elapsed),
+        "p50_ms": round(statistics.median(latencies) * 1000, 2),
+        "p99_ms": round(latencies[int(len(latencies) * 0.99)] * 1000, 2),
+        "avg_batch": stats["avg_batch"],
+    }
+
+
+async def _endpoint_rate(payloads, concurrency: int) -> float:
+    app = FastAPI()
+
+    @app.post("/alerts/", status_code=202)
+    async def receive_alert(alert: AlertSchema):
+        return {"error_code": 0, "message": "Alert accepted", "data": None}
+
+    semaphore = asyncio.Semaphore(concurrency)
+    headers = {"Content-Type": "application/json"}
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        async def post(payload: bytes):
+            async with semaphore:
+                await client.post("/alerts/", content=payload, headers=headers)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(post(payload) for payload in payloads))
+        return len(payloads) / (time.perf_counter() - started)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--alerts", type=int, default=5000)
+    parser.add_argument("--recipients", type=int, default=5)
+    parser.add_argument("--concurrency", type=int, default=64)
+    options = parser.parse_args()
+
+    payloads = [_payload(n, options.recipients) for n in range(options.alerts)]
+    endpoint_rate = asyncio.run(_endpoint_rate(payloads, options.concurrency))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        batched = asyncio.run(_run(os.path.join(tmp, "batched.sqlite3"), payloads, options.concurrency, 500))
+        single = asyncio.run(_run(os.path.join(tmp, "single.sqlite3"), payloads, options.concurrency, 1))
+
+    print(f"тревог: {options.alerts}, получателей: {options.recipients}, одновременно: {options.concurrency}")
+    print(f"эндпоинт без журнала:   {endpoint_rate:.0f} тревог/с")
+    print(f"журнал, пачки:          {batched}")
+    print(f"журнал, без пачек:      {single}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
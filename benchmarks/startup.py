@@ -0,0 +1,223 @@
+"""Холодный старт бота: через сколько после запуска он принимает и доставляет тревоги.
+
+Несколько раз запускает `python -m bot` против заглушек Telegram и Django
+(benchmarks/fakes.py) и для каждого запуска меряет снаружи:
+- api_ready_ms — от запуска процесса до первого ответа /alerts/queue;
+- first_delivery_ms — от запуска до доставки тревоги, отправленной сразу
+  после готовности API (она ждёт в очереди, пока поднимается Telegram);
+и забирает изнутри отметки профилировщика запуска (GET /startup):
+ingest_ready, delivery_ready, updates_ready.
+
+Результат — медианы по запускам; `--output`, `--compare` и `--threshold`
+работают как в benchmarks/load.py.
+
+Пример:
+    python -m benchmarks.startup --runs 5 --output startup.json --compare baseline.json
+"""
+import argparse
+import asyncio
+import base64
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Dict, List
+
+import httpx
+import orjson
+
+from benchmarks.fakes import FakeDjango, FakeTelegram, serve
+from benchmarks.load import DJANGO_HOST, REPO_ROOT, _lookup, free_port, git_commit, load_sample, make_payload
+
+# Метрики для сравнения прогонов (все — чем меньше, тем лучше)
+COMPARED_METRICS = (
+    "api_ready_ms",
+    "first_delivery_ms",
+    "marks.ingest_ready",
+    "marks.delivery_ready",
+    "marks.updates_ready",
+)
+
+
+async def wait_api(client: httpx.AsyncClient, process: subprocess.Popen, timeout: float = 60):
+    """Как `load.wait_ready`, но опрашивает часто: здесь важны миллисекунды."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Бот завершился при старте с кодом {process.returncode}")
+        try:
+            if (await client.get("/alerts/queue")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.005)
+    raise RuntimeError("Бот не поднял API за отведённое время")
+
+
+async def run_once(options, sample: dict, telegram: FakeTelegram, telegram_port: int, django_port: int, n: int) -> dict:
+    api_port = free_port()
+    tmp = tempfile.TemporaryDirectory()
+    env = dict(
+        os.environ,
+        BOT_TOKEN="123456:BENCHMARK",
+        TELEGRAM_API_URL=f"http://127.0.0.1:{telegram_port}",
+        DJANGO_API_URL=f"http://{DJANGO_HOST}:{django_port}/",
+        API_HOST="127.0.0.1",
+        API_PORT=str(api_port),
+        OUTBOX_PATH=os.path.join(tmp.name, "outbox.sqlite3"),
+        HISTORY_PATH=os.path.join(tmp.name, "history.sqlite3"),
+        SUBSCRIPTIONS_PATH=os.path.join(tmp.name, "subscriptions.sqlite3"),
+        STATE_SQLITE_PATH=os.path.join(tmp.name, "state.sqlite3"),
+        STATS_SNAPSHOT_PATH=os.path.join(tmp.name, "stats_snapshot.json"),
+    )
+    for item in options.env:
+        key, _, value = item.partition("=")
+        env[key] = value
+
+    run_id = f"startup{int(time.time())}-{n}"
+    alert_id = f"{run_id}-0"
+    shape = SimpleNamespace(cameras=1, recipients=1, unique_images=False)
+    payload = make_payload(sample, 0, run_id, f"http://{DJANGO_HOST}:{django_port}/media", [100000], shape)
+
+    log = open(os.path.join(tmp.name, "bot.log"), "wb")
+    started = time.time()
+    process = subprocess.Popen([sys.executable, "-m", "bot"], cwd=REPO_ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{api_port}", timeout=30) as client:
+            await wait_api(client, process)
+            api_ready = time.time()
+            response = await client.post("/alerts/", json=payload)
+            if response.status_code != 202:
+                raise RuntimeError(f"Тревога не принята: {response.status_code} {response.text}")
+            deadline = time.monotonic() + options.timeout
+            delivered = None
+            while delivered is None and time.monotonic() < deadline:
+                delivered = next((moment for moment, sent_id, _ in telegram.deliveries if sent_id == alert_id), None)
+                await asyncio.sleep(0.005)
+            if delivered is None:
+                raise RuntimeError("Тревога не доставлена за отведённое время")
+            # updates_ready отмечается чуть позже первой доставки — ждём её
+            while True:
+                response = await client.get("/startup")
+                if response.status_code != 200:
+                    report = {"marks": {}, "phases": []}  # версия без профилировщика запуска
+                    break
+                report = response.json()["data"]
+                if "updates_ready" in report["marks"] or time.monotonic() > deadline:
+                    break
+                await asyncio.sleep(0.01)
+    finally:
+        if process.poll() is None:
+            process.send_signal(signal.SIGTERM)
+            try:
+                process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        log.close()
+        if options.keep_log:
+            print(f"Лог бота: {os.path.join(tmp.name, 'bot.log')}", file=sys.stderr)
+        else:
+            tmp.cleanup()
+
+    return {
+        "api_ready_ms": (api_ready - started) * 1000,
+        "first_delivery_ms": (delivered - started) * 1000,
+        "marks": report["marks"],
+        "phases": report["phases"],
+    }
+
+
+async def run(options) -> dict:
+    sample = load_sample(options.sample)
+    telegram = FakeTelegram()
+    django = FakeDjango(base64.b64decode(sample["image"]))
+    telegram_runner, telegram_port = await serve(telegram.app())
+    django_runner, django_port = await serve(django.app(), host=DJANGO_HOST)
+    runs: List[dict] = []
+    try:
+        for n in range(options.runs):
+            runs.append(await run_once(options, sample, telegram, telegram_port, django_port, n))
+    finally:
+        await telegram_runner.cleanup()
+        await django_runner.cleanup()
+
+    def median(values: List[float]) -> float:
+        return round(statistics.median(values), 1)
+
+    marks: Dict[str, float] = {}
+    for name in runs[0]["marks"]:
+        values = [item["marks"][name] for item in runs if name in item["marks"]]
+        marks[name] = median(values)
+    phases: Dict[str, float] = {}
+    for name in dict.fromkeys(phase["name"] for item in runs for phase in item["phases"]):
+        phases[name] = median([
+            phase["duration_ms"] for item in runs for phase in item["phases"] if phase["name"] == name
+        ])
+
+    return {
+        "commit": git_commit(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "params": {"runs": options.runs, "env": options.env},
+        "metrics": {
+            "api_ready_ms": median([item["api_ready_ms"] for item in runs]),
+            "first_delivery_ms": median([item["first_delivery_ms"] for item in runs]),
+            "marks": marks,
+            "phases_ms": phases,
+        },
+    }
+
+
+def compare(result: dict, baseline: dict, threshold: float) -> bool:
+    """Печатает изменения ключевых метрик; возвращает False, если есть ухудшение больше порога."""
+    if result["params"] != baseline["params"]:
+        print("Внимание: параметры прогонов различаются, сравнение может быть некорректным")
+    ok = True
+    print(f"{'метрика':<24}{baseline['commit']:>14}{result['commit']:>14}{'изменение':>12}")
+    for path in COMPARED_METRICS:
+        old, new = _lookup(baseline["metrics"], path), _lookup(result["metrics"], path)
+        if old is None or new is None:
+            continue
+        change = (new - old) / old if old else 0.0
+        flag = ""
+        if change > threshold:
+            flag, ok = "  <- хуже", False
+        print(f"{path:<24}{old:>14}{new:>14}{change:>+11.1%}{flag}")
+    return ok
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0], formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="число запусков бота")
+    parser.add_argument("--timeout", type=float, default=30, help="ожидание доставки первой тревоги, с")
+    parser.add_argument("--env", action="append", default=[], help="переменная окружения бота KEY=VALUE")
+    parser.add_argument("--sample", default=os.path.join(REPO_ROOT, "data", "alerts.json"), help="образец тревоги AIBox")
+    parser.add_argument("--output", help="куда записать JSON с результатом")
+    parser.add_argument("--compare", help="JSON прошлого прогона для сравнения")
+    parser.add_argument("--threshold", type=float, default=0.2, help="допустимое ухудшение метрик (доля)")
+    parser.add_argument("--keep-log", action="store_true", help="не удалять лог бота")
+    return parser.parse_args(argv)
+
+
+def main() -> int:
+    options = parse_args()
+    result = asyncio.run(run(options))
+    text = orjson.dumps(result, option=orjson.OPT_INDENT_2).decode()
+    print(text)
+    if options.output:
+        with open(options.output, "w") as file:
+            file.write(text + "\n")
+    if options.compare:
+        with open(options.compare, "rb") as file:
+            baseline = orjson.loads(file.read())
+        if not compare(result, baseline, options.threshold):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,89 @@
+"""Проверка согласованности SQLiteStateBackend между процессами.
+
+Несколько процессов одновременно работают с одним файлом состояния:
+- `add` по одним и тем же ключам — каждый ключ должен быть принят ровно один раз
+  (так работает дедупликация тревог между воркерами);
+- `incr` одного счётчика — итог должен равняться сумме всех приращений;
+- `reserve_token` общего бакета — ни в одном окне времени не выдано больше
+  токенов, чем позволяют ёмкость и скорость пополнения.
+
+Запуск: python -m benchmarks.state_consistency [--processes 8] [--keys 500]
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+from bot.services.state import SQLiteStateBackend
+
+
+async def _worker(path: str, keys: int, rate: float) -> dict:
+    backend = SQLiteStateBackend(path)
+    accepted = 0
+    for i in range(keys):
+        if await backend.add(f"alert:seen:{i}", ttl=60):
+            accepted += 1
+        await backend.incr("counter")
+    # Каждый процесс берёт по 10 токенов из общего бакета; запоминаем момент выдачи
+    grants = [time.time() + await backend.reserve_token("tg:global", rate, rate) for _ in range(10)]
+    await backend.close()
+    return {"accepted": accepted, "grants": grants}
+
+
+async def _read_counter(path: str) -> int:
+    backend = SQLiteStateBackend(path)
+    try:
+        return await backend.get("counter")
+    finally:
+        await backend.close()
+
+
+def _run_worker(args) -> dict:
+    return asyncio.run(_worker(*args))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--processes", type=int, default=8)
+    parser.add_argument("--keys", type=int, default=500)
+    parser.add_argument("--rate", type=float, default=30)
+    options = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "state.sqlite3")
+        started = time.perf_counter()
+        with multiprocessing.get_context("spawn").Pool(options.processes) as pool:
+            results = pool.map(_run_worker, [(path, options.keys, options.rate)] * options.processes)
+        elapsed = time.perf_counter() - started
+
+        counter = asyncio.run(_read_counter(path))
+
+    accepted = sum(result["accepted"] for result in results)
+    operations = options.processes * options.keys * 2
+    grants = sorted(grant for result in results for grant in result["grants"])
+    # Превышение лимита: сколько токенов выдано сверх ёмкости + пополнения за окно [i, j]
+    overdraft = max(
+        (j - i + 1) - (options.rate + (grants[j] - grants[i]) * options.rate)
+        for i in range(len(grants))
+        for j in range(i, len(grants))
+    )
+
+    print(f"процессов: {options.processes}, операций: {operations}, {operations / elapsed:.0f} оп/с")
+    print(f"add: принято {accepted} из {options.keys} ключей")
+    print(f"incr: {counter} (ожидалось {options.processes * options.keys})")
+    print(f"reserve_token: выдано {len(grants)} токенов, превышение лимита {max(overdraft, 0):.2f}")
+
+    ok = (
+        accepted == options.keys
+        and counter == options.processes * options.keys
+        and overdraft < 0.5
+    )
+    print("OK" if ok else "РАСХОЖДЕНИЕ")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
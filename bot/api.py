@@ -1,19 +1,376 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterable, AsyncIterator, Awaitable, Callable, Dict, List
+import asyncio
+import sys
+from datetime import datetime
+import orjson
+from fastapi import FastAPI, Request
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse, PlainTextResponse
+from pydantic import ValidationError
 from bot.schemas import AlertSchema
-from bot.utils.telegram import send_alert_to_telegram, send_alert_to_telegram_v2
+from bot.services.alert_queue import SHED_DIGEST, SHED_DROP, SHED_TEXT, AlertQueue, QueueFullError
+from bot.services.images import image_fetcher
+from bot.services.transcode import image_transcoder
+from bot.services.frames import frame_dedup
+from bot.services.api import django_api
+from bot.services.aibox import read_raw_alert, raw_to_alert
+from bot.services.state import state_backend
+from bot.services.stats_cache import stats_cache
+from bot.services.local_stats import local_stats
+from bot.services.coalesce import AlertCoalescer
+from bot.services.database import history, outbox
+from bot.services.subscriptions import subscriptions
+from bot.services.metrics import alerts_received, registry, validation_seconds
+from bot.utils.logger import log_event
+from bot.utils.startup import startup_profiler
+from bot import config
 import logging
 
 # Настраиваем логирование
 logging.basicConfig(level=logging.INFO)
 
-app = FastAPI()
 
-@app.post("/alerts/")
-async def receive_alert(alert: AlertSchema):
-    """Получает данные о тревоге от Django и отправляет их в Telegram."""
+def _telegram():
+    """Модуль отправки в Telegram. Он тянет aiogram (больше секунды импорта), поэтому
+    импортируется при первой отправке, а не при старте: приём тревог его не ждёт."""
+    from bot.utils import telegram
+    return telegram
 
-    # Отправляем тревогу в Telegram
-    print(alert)
-    await send_alert_to_telegram_v2(alert)
 
-    return {"error_code": 0, "message": "Alert received successfully", "data": None}
+async def deliver_alert(alert: AlertSchema):
+    """Отправляет тревогу по правилам подписки и записывает результат по каждому получателю в журнал доставок."""
+    telegram = _telegram()
+    if frame_dedup.enabled and (alert.image or alert.image_data is not None):
+        data = await telegram.load_alert_image(alert)
+        duplicate = await frame_dedup.check(alert, data) if data is not None else None
+        if duplicate is not None:
+            log_event("alert_frame_duplicate", sample=config.LOG_SAMPLE_RATE, aibox_alert_id=alert.aibox_alert_id,
+                      duplicate_of=duplicate)
+            if config.ALERT_FRAME_DEDUP_MODE == "suppress" and not alert.for_security:
+                await fold_alert(alert)
+                return {}
+            # Тот же кадр уже у получателей: тревога уходит текстом, без повторной загрузки фото
+            alert = alert.without_image()
+    recipients, silent = subscriptions.route(alert)
+    muted = set(alert.users_telegram_id).difference(recipients)
+    if muted:
+        alert = alert.model_copy(update={"users_telegram_id": recipients})
+    messages = await telegram.send_alert_to_telegram_v2(alert, silent=silent) if recipients else {}
+    telegram.schedule_alert_video(alert, messages)
+    photo = next((message.photo for message in messages.values() if message.photo), None)
+    if photo:
+        history.set_file_id(alert.aibox_alert_id, photo[-1].file_id)
+    if alert.outbox_id is not None:
+        await outbox.mark_delivered(
+            alert.outbox_id, {chat_id: message.message_id for chat_id, message in messages.items()}, muted
+        )
+    return messages
+
+
+async def fold_alert(alert: AlertSchema):
+    if alert.outbox_id is not None:
+        await outbox.mark_folded(alert.outbox_id)
+
+
+async def shed_alert(alert: AlertSchema):
+    if alert.outbox_id is not None:
+        await outbox.mark_shed(alert.outbox_id)
+
+
+async def deliver_digest(alerts: List[AlertSchema]):
+    """Отправляет отложенные под нагрузкой тревоги одной сводкой на получателя (с учётом подписок)."""
+    alerts_by_chat: Dict[int, List[AlertSchema]] = {}
+    for alert in alerts:
+        recipients, _ = subscriptions.route(alert)
+        for chat_id in recipients:
+            alerts_by_chat.setdefault(chat_id, []).append(alert)
+    if alerts_by_chat:
+        await _telegram().send_alert_digest(alerts_by_chat)
+    await asyncio.gather(*(shed_alert(alert) for alert in alerts))
+
+
+async def update_alert(alert: AlertSchema, messages: dict, folded: int, last_time: datetime):
+    await _telegram().update_coalesced_alert(alert, messages, folded, last_time)
+
+
+# Серии одинаковых тревог сворачиваются в одно сообщение
+coalescer = AlertCoalescer(
+    deliver_alert,
+    update_alert,
+    window=config.ALERT_COALESCE_WINDOW,
+    max_groups=config.ALERT_COALESCE_MAX_GROUPS,
+    on_fold=fold_alert,
+    backend=state_backend,
+)
+
+# Очередь доставки: эндпоинт только кладёт тревогу, отправкой занимаются воркеры
+alert_queue = AlertQueue(
+    coalescer.handle,
+    maxsize=config.ALERT_QUEUE_SIZE,
+    workers=config.ALERT_WORKERS,
+    weights=config.ALERT_LANE_WEIGHTS,
+    high_hazards=config.ALERT_HIGH_HAZARDS,
+    shed_after={
+        SHED_TEXT: config.ALERT_SHED_TEXT_AFTER,
+        SHED_DIGEST: config.ALERT_SHED_DIGEST_AFTER,
+        SHED_DROP: config.ALERT_SHED_DROP_AFTER,
+    },
+    digest=deliver_digest,
+    digest_interval=config.ALERT_DIGEST_INTERVAL,
+    on_shed=shed_alert,
+)
+
+
+registry.gauge("bot_alert_queue_depth", "Тревог в очереди доставки", lambda: alert_queue.depth)
+registry.gauge("bot_alert_queue_oldest_age_seconds", "Возраст самой старой тревоги в очереди", alert_queue.oldest_age)
+registry.gauge("bot_alert_queue_in_progress", "Тревог в отправке прямо сейчас", lambda: alert_queue.in_progress)
+registry.gauge("bot_coalesce_open_groups", "Открытых серий сворачивания", lambda: coalescer.stats()["open_groups"])
+registry.gauge("bot_outbox_queued_operations", "Операций журнала доставок в ожидании коммита", lambda: outbox.stats()["queued"])
+registry.gauge("bot_image_cache_bytes", "Размер кэша изображений", lambda: image_fetcher.stats()["cached_bytes"])
+
+
+# Дополнительные хуки запуска и остановки (например, webhook Telegram)
+startup_hooks: List[Callable[[], Awaitable[None]]] = []
+shutdown_hooks: List[Callable[[], Awaitable[None]]] = []
+
+
+async def replay_outbox():
+    """Возвращает в очередь тревоги, не доставленные до перезапуска."""
+    alerts = await outbox.pending()
+    if alerts:
+        logging.info(f"Повторная отправка {len(alerts)} тревог из журнала доставок")
+    for alert in alerts:
+        # Django может прислать эти тревоги ещё раз — считаем их уже принятыми
+        await state_backend.add(f"alert:seen:{alert.aibox_alert_id}", ttl=config.ALERT_DEDUP_TTL)
+        await alert_queue.put(alert)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    for name, start in (
+        ("django_api", django_api.start),
+        ("local_stats", lambda: local_stats.start(
+            config.STATS_SNAPSHOT_INTERVAL, config.STATS_RECONCILE_INTERVAL, config.STATS_RECONCILE_DAYS,
+        )),
+        ("outbox", outbox.start),
+        ("history", history.start),
+        ("subscriptions", subscriptions.start),
+    ):
+        # Статистику из Django локальный учёт не дополняет: снимок не читаем и не перезаписываем
+        if name == "local_stats" and config.STATS_SOURCE != "local":
+            continue
+        with startup_profiler.phase(f"init:{name}"):
+            await start()
+    alert_queue.start()
+    replay = asyncio.create_task(replay_outbox())
+    for hook in startup_hooks:
+        await hook()
+    startup_profiler.mark("ingest_ready")
+    yield
+    # SIGTERM: uvicorn перестаёт принимать запросы, очередь дорабатывает не дольше
+    # ALERT_QUEUE_DRAIN_TIMEOUT, недоставленное остаётся в журнале до следующего старта
+    for hook in shutdown_hooks:
+        await hook()
+    replay.cancel()
+    await asyncio.gather(replay, return_exceptions=True)
+    await alert_queue.stop(timeout=config.ALERT_QUEUE_DRAIN_TIMEOUT)
+    await coalescer.close()
+    if "bot.utils.telegram" in sys.modules:
+        await _telegram().wait_video_deliveries(config.ALERT_QUEUE_DRAIN_TIMEOUT)
+    await outbox.close()
+    await history.close()
+    await subscriptions.stop()
+    if config.STATS_SOURCE == "local":
+        await local_stats.stop()
+    await image_fetcher.close()
+    await django_api.close()
+    image_transcoder.shutdown()
+    frame_dedup.shutdown()
+    await state_backend.close()
+
+
+app = FastAPI(lifespan=lifespan)
+
+async def _enqueue_alert(alert: AlertSchema) -> str:
+    """Ставит тревогу в очередь доставки, отбрасывая повторы по aibox_alert_id.
+
+    Принятые тревоги запоминаются в общем хранилище состояния на ALERT_DEDUP_TTL
+    секунд, поэтому повтор отбрасывается, даже если попал в другой воркер.
+    До постановки в очередь тревога записывается в журнал доставок.
+    Возвращает "accepted", "duplicate" или "queue_full".
+    """
+    status = await _store_alert(alert)
+    alerts_received.inc(status)
+    return status
+
+
+async def _store_alert(alert: AlertSchema) -> str:
+    seen_key = f"alert:seen:{alert.aibox_alert_id}"
+    if not await state_backend.add(seen_key, ttl=config.ALERT_DEDUP_TTL):
+        return "duplicate"
+    alert.outbox_id = await outbox.add(alert)
+    try:
+        alert_queue.put_nowait(alert)
+    except QueueFullError:
+        # Тревога не принята — её повтор не должен считаться дубликатом
+        await state_backend.delete(seen_key)
+        await outbox.discard(alert.outbox_id)
+        logging.warning(f"Очередь тревог заполнена, тревога {alert.aibox_alert_id} отклонена")
+        return "queue_full"
+    # Новая тревога меняет статистику за текущие периоды
+    await stats_cache.invalidate_recent()
+    local_stats.record_alert(alert)
+    history.record(alert)
+    return "accepted"
+
+
+async def _accept_alert(alert: AlertSchema):
+    """Ставит тревогу в очередь доставки или отвечает 429, если очередь заполнена."""
+    status = await _enqueue_alert(alert)
+    if status == "queue_full":
+        return JSONResponse(
+            status_code=429,
+            content={"error_code": 429, "message": "Alert queue is full", "data": None},
+            headers={"Retry-After": str(config.ALERT_QUEUE_RETRY_AFTER)},
+        )
+    if status == "duplicate":
+        return {"error_code": 0, "message": "Duplicate alert ignored", "data": {"queue_depth": alert_queue.depth}}
+
+    return {"error_code": 0, "message": "Alert accepted", "data": {"queue_depth": alert_queue.depth}}
+
+
+async def _ndjson_lines(stream: AsyncIterable[bytes]) -> AsyncIterator[bytes]:
+    """Разбивает поток тела запроса на строки NDJSON по мере поступления."""
+    buffer = b""
+    async for chunk in stream:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield line
+    if buffer.strip():
+        yield buffer
+
+
+async def _json_array_items(request: Request) -> AsyncIterator[Any]:
+    payload = orjson.loads(await request.body())
+    if not isinstance(payload, list):
+        raise ValueError("Ожидается JSON-массив тревог")
+    for item in payload:
+        yield item
+
+
+@app.post("/alerts/", status_code=202)
+async def receive_alert(request: Request):
+    """Получает данные о тревоге от Django и ставит её в очередь на отправку в Telegram.
+
+    Тело разбирается вручную (`model_validate_json`), чтобы замерить время
+    проверки схемы; ошибки возвращаются в том же формате 422, что и у FastAPI.
+    """
+    body = await request.body()
+    try:
+        with validation_seconds.time("alerts"):
+            alert = AlertSchema.model_validate_json(body)
+    except ValidationError as e:
+        alerts_received.inc("invalid")
+        errors = e.errors(include_url=False)
+        raise RequestValidationError([{**error, "loc": ("body", *error["loc"])} for error in errors], body=body)
+    return await _accept_alert(alert)
+
+
+@app.post("/alerts/raw", status_code=202)
+async def receive_raw_alert(request: Request):
+    """Принимает тревогу напрямую от AIBox (формат data/alerts.json).
+
+    Изображение приходит в теле как base64 и декодируется по мере чтения
+    запроса, без загрузки через Django.
+    """
+    try:
+        raw, image = await read_raw_alert(request.stream())
+        alert = raw_to_alert(raw, image)
+    except ValueError as e:
+        alerts_received.inc("invalid")
+        return JSONResponse(
+            status_code=422,
+            content={"error_code": 422, "message": f"Invalid AIBox alert: {e}", "data": None},
+        )
+    return await _accept_alert(alert)
+
+
+@app.post("/alerts/batch", status_code=202)
+async def receive_alert_batch(request: Request):
+    """Принимает пачку тревог: JSON-массив или поток NDJSON (application/x-ndjson).
+
+    Каждая тревога проверяется `AlertSchema` и ставится в очередь сразу,
+    не дожидаясь конца тела. Повторы по aibox_alert_id отбрасываются.
+    В ответе — результат по каждому элементу.
+    """
+    content_type = request.headers.get("content-type", "")
+    if "ndjson" in content_type or "jsonl" in content_type:
+        items = _ndjson_lines(request.stream())
+    else:
+        items = _json_array_items(request)
+
+    results = []
+    counts = {"accepted": 0, "duplicate": 0, "invalid": 0, "queue_full": 0}
+    index = 0
+    try:
+        async for item in items:
+            result = {"index": index}
+            index += 1
+            try:
+                with validation_seconds.time("batch"):
+                    if isinstance(item, bytes):
+                        alert = AlertSchema.model_validate_json(item)
+                    else:
+                        alert = AlertSchema.model_validate(item)
+            except ValidationError as e:
+                alerts_received.inc("invalid")
+                result.update(status="invalid", errors=e.errors(include_url=False, include_context=False, include_input=False))
+            else:
+                result.update(aibox_alert_id=alert.aibox_alert_id, status=await _enqueue_alert(alert))
+            counts[result["status"]] += 1
+            results.append(result)
+    except ValueError as e:
+        return JSONResponse(
+            status_code=422,
+            content={"error_code": 422, "message": f"Invalid batch: {e}", "data": {"counts": counts, "results": results}},
+        )
+
+    headers = {"Retry-After": str(config.ALERT_QUEUE_RETRY_AFTER)} if counts["queue_full"] else None
+    return JSONResponse(
+        status_code=202,
+        content={"error_code": 0, "message": "Batch processed", "data": {"counts": counts, "results": results}},
+        headers=headers,
+    )
+
+
+@app.get("/alerts/queue")
+async def alert_queue_stats():
+    """Состояние очереди тревог для операторов: глубина, возраст старейшей тревоги, счётчики."""
+    return {"error_code": 0, "message": "OK", "data": {**alert_queue.stats(), "coalescing": coalescer.stats(), "outbox": outbox.stats()}}
+
+
+@app.get("/images/stats")
+async def image_stats():
+    """Статистика кэша изображений: попадания, загрузки, объём в памяти, пережатие."""
+    return {"error_code": 0, "message": "OK", "data": {**image_fetcher.stats(), "transcode": image_transcoder.stats(), "frame_dedup": frame_dedup.stats()}}
+
+
+@app.get("/stats/cache")
+async def stats_cache_stats():
+    """Счётчики кэша статистики тревог: попадания, промахи, объединённые запросы."""
+    return {"error_code": 0, "message": "OK", "data": stats_cache.stats()}
+
+
+@app.get("/startup")
+async def startup_report():
+    """Время фаз запуска процесса (импорты, инициализация) и моменты готовности."""
+    return {"error_code": 0, "message": "OK", "data": startup_profiler.report()}
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Метрики в текстовом формате Prometheus."""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
@@ -4,7 +4,161 @@ from dotenv import load_dotenv
 load_dotenv()
 
 TOKEN = os.getenv("BOT_TOKEN")
+DJANGO_API_URL = os.getenv("DJANGO_API_URL")
 
 ALERT_JSON_PATH = "data/alerts.json"
 USERS_JSON_PATH = "data/users.json"
 
+# Очередь входящих тревог (POST /alerts/)
+ALERT_QUEUE_SIZE = int(os.getenv("ALERT_QUEUE_SIZE", "1000"))
+ALERT_WORKERS = int(os.getenv("ALERT_WORKERS", "4"))
+ALERT_QUEUE_RETRY_AFTER = int(os.getenv("ALERT_QUEUE_RETRY_AFTER", "5"))
+ALERT_QUEUE_DRAIN_TIMEOUT = float(os.getenv("ALERT_QUEUE_DRAIN_TIMEOUT", "10"))
+
+# Приоритетные полосы очереди: веса в формате "полоса:вес,..." и уровни опасности полосы high
+ALERT_LANE_WEIGHTS = {
+    lane.strip(): int(weight)
+    for lane, weight in (
+        item.split(":") for item in os.getenv("ALERT_LANE_WEIGHTS", "security:8,high:4,normal:1").split(",") if item.strip()
+    )
+}
+ALERT_HIGH_HAZARDS = [item.strip() for item in os.getenv("ALERT_HIGH_HAZARDS", "high,critical").split(",") if item.strip()]
+# Деградация полос high и normal по времени ожидания в очереди, секунды (0 — ступень выключена):
+# без фото, затем в сводку (раз в ALERT_DIGEST_INTERVAL), затем отбросить
+ALERT_SHED_TEXT_AFTER = float(os.getenv("ALERT_SHED_TEXT_AFTER", "15"))
+ALERT_SHED_DIGEST_AFTER = float(os.getenv("ALERT_SHED_DIGEST_AFTER", "60"))
+ALERT_SHED_DROP_AFTER = float(os.getenv("ALERT_SHED_DROP_AFTER", "600"))
+ALERT_DIGEST_INTERVAL = float(os.getenv("ALERT_DIGEST_INTERVAL", "60"))
+
+# Лимиты исходящих запросов к Telegram (сообщений в секунду)
+TELEGRAM_GLOBAL_RATE = float(os.getenv("TELEGRAM_GLOBAL_RATE", "30"))
+TELEGRAM_CHAT_RATE = float(os.getenv("TELEGRAM_CHAT_RATE", "1"))
+TELEGRAM_GROUP_RATE = float(os.getenv("TELEGRAM_GROUP_RATE", str(20 / 60)))
+TELEGRAM_SEND_RETRIES = int(os.getenv("TELEGRAM_SEND_RETRIES", "3"))
+
+# Изображения тревог: кэш в памяти и таймаут загрузки
+IMAGE_CACHE_BYTES = int(os.getenv("IMAGE_CACHE_BYTES", str(64 * 1024 * 1024)))
+IMAGE_FETCH_TIMEOUT = float(os.getenv("IMAGE_FETCH_TIMEOUT", "15"))
+
+# Пережатие фото тревог перед отправкой в Telegram (нужен Pillow)
+IMAGE_TRANSCODE = os.getenv("IMAGE_TRANSCODE", "0") == "1"
+IMAGE_MAX_DIMENSION = int(os.getenv("IMAGE_MAX_DIMENSION", "1280"))
+IMAGE_JPEG_QUALITY = int(os.getenv("IMAGE_JPEG_QUALITY", "80"))
+IMAGE_STRIP_METADATA = os.getenv("IMAGE_STRIP_METADATA", "1") == "1"
+IMAGE_TRANSCODE_WORKERS = int(os.getenv("IMAGE_TRANSCODE_WORKERS", "2"))
+IMAGE_TRANSCODE_CACHE_BYTES = int(os.getenv("IMAGE_TRANSCODE_CACHE_BYTES", str(32 * 1024 * 1024)))
+
+# Фоновая отправка решений по тревогам (подтвердить/отклонить) в Django
+ACTION_BATCH_SIZE = int(os.getenv("ACTION_BATCH_SIZE", "50"))
+ACTION_BATCH_DELAY = float(os.getenv("ACTION_BATCH_DELAY", "0.05"))
+ACTION_MAX_ATTEMPTS = int(os.getenv("ACTION_MAX_ATTEMPTS", "5"))
+ACTION_RETRY_DELAY = float(os.getenv("ACTION_RETRY_DELAY", "1"))
+# Сколько решение по тревоге закреплено за отправляющим процессом, если тот не сообщил результат
+ACTION_CLAIM_TTL = float(os.getenv("ACTION_CLAIM_TTL", "300"))
+# Путь bulk-эндпоинта Django для пачки решений; пусто — по одному запросу на тревогу
+DJANGO_BULK_ACTION_PATH = os.getenv("DJANGO_BULK_ACTION_PATH", "")
+
+# Ограничение частоты команд и нажатий от одного пользователя (запросов в секунду / запас)
+THROTTLE_RATE = float(os.getenv("THROTTLE_RATE", "1"))
+THROTTLE_BURST = float(os.getenv("THROTTLE_BURST", "5"))
+THROTTLE_HEAVY_RATE = float(os.getenv("THROTTLE_HEAVY_RATE", str(1 / 10)))
+THROTTLE_HEAVY_BURST = float(os.getenv("THROTTLE_HEAVY_BURST", "2"))
+CALLBACK_DEBOUNCE = float(os.getenv("CALLBACK_DEBOUNCE", "5"))
+
+# Видео тревог: отправка клипа вслед за тревогой (потоково, без буферизации в памяти)
+VIDEO_DELIVERY = os.getenv("VIDEO_DELIVERY", "0") == "1"
+VIDEO_MAX_BYTES = int(os.getenv("VIDEO_MAX_BYTES", str(50 * 1024 * 1024)))
+VIDEO_CONCURRENCY = int(os.getenv("VIDEO_CONCURRENCY", "2"))
+VIDEO_FETCH_TIMEOUT = int(os.getenv("VIDEO_FETCH_TIMEOUT", "120"))
+VIDEO_UPLOAD_TIMEOUT = int(os.getenv("VIDEO_UPLOAD_TIMEOUT", "300"))
+# Публичный адрес для ссылок на слишком большие локальные клипы (пусто — ссылка не даётся)
+VIDEO_PUBLIC_URL = os.getenv("VIDEO_PUBLIC_URL", "")
+
+# Клиент Django API
+DJANGO_HTTP2 = os.getenv("DJANGO_HTTP2", "0") == "1"
+DJANGO_API_RETRIES = int(os.getenv("DJANGO_API_RETRIES", "2"))
+DJANGO_BREAKER_THRESHOLD = int(os.getenv("DJANGO_BREAKER_THRESHOLD", "5"))
+DJANGO_BREAKER_RESET = float(os.getenv("DJANGO_BREAKER_RESET", "30"))
+
+# Сырые тревоги AIBox (POST /alerts/raw): компания, от имени которой они приходят
+AIBOX_COMPANY_ID = int(os.getenv("AIBOX_COMPANY_ID", "0"))
+AIBOX_COMPANY_NAME = os.getenv("AIBOX_COMPANY_NAME", "AIBox")
+
+# Дедупликация тревог по aibox_alert_id
+ALERT_DEDUP_TTL = float(os.getenv("ALERT_DEDUP_TTL", "3600"))
+
+# Сворачивание шторма тревог одной камеры и алгоритма (0 — выключено)
+ALERT_COALESCE_WINDOW = float(os.getenv("ALERT_COALESCE_WINDOW", "30"))
+ALERT_COALESCE_MAX_GROUPS = int(os.getenv("ALERT_COALESCE_MAX_GROUPS", "10000"))
+
+# Подавление почти одинаковых кадров одной камеры по перцептивному хэшу (нужен Pillow).
+# Порог — расстояние Хэмминга в битах из 64; режим suppress — не отправлять, text — отправить без фото.
+# Тревоги охраны не подавляются, в режиме suppress они уходят без фото
+ALERT_FRAME_DEDUP = os.getenv("ALERT_FRAME_DEDUP", "0") == "1"
+ALERT_FRAME_DEDUP_MODE = os.getenv("ALERT_FRAME_DEDUP_MODE", "suppress")
+ALERT_FRAME_DEDUP_THRESHOLD = int(os.getenv("ALERT_FRAME_DEDUP_THRESHOLD", "6"))
+ALERT_FRAME_DEDUP_RING = int(os.getenv("ALERT_FRAME_DEDUP_RING", "16"))
+ALERT_FRAME_DEDUP_WINDOW = float(os.getenv("ALERT_FRAME_DEDUP_WINDOW", "600"))
+ALERT_FRAME_DEDUP_MAX_CAMERAS = int(os.getenv("ALERT_FRAME_DEDUP_MAX_CAMERAS", "10000"))
+
+# Кэш статистики тревог (секунды жизни записи по периоду)
+STATS_TTL_DAY = float(os.getenv("STATS_TTL_DAY", "30"))
+STATS_TTL_WEEK = float(os.getenv("STATS_TTL_WEEK", "120"))
+STATS_TTL_MONTH = float(os.getenv("STATS_TTL_MONTH", "300"))
+STATS_TTL_ALL = float(os.getenv("STATS_TTL_ALL", "600"))
+STATS_TTL_HISTORY = float(os.getenv("STATS_TTL_HISTORY", "3600"))
+
+# Построение PDF-отчётов в отдельных процессах
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", "1"))
+PDF_CACHE_SIZE = int(os.getenv("PDF_CACHE_SIZE", "32"))
+
+# Локальная статистика тревог: "local" — считать в боте, "django" — всегда спрашивать Django
+STATS_SOURCE = os.getenv("STATS_SOURCE", "local")
+STATS_SNAPSHOT_PATH = os.getenv("STATS_SNAPSHOT_PATH", "data/stats_snapshot.json")
+STATS_SNAPSHOT_INTERVAL = float(os.getenv("STATS_SNAPSHOT_INTERVAL", "60"))
+# Сверка локальной статистики с Django: как часто и за сколько последних дней
+STATS_RECONCILE_INTERVAL = float(os.getenv("STATS_RECONCILE_INTERVAL", "900"))
+STATS_RECONCILE_DAYS = int(os.getenv("STATS_RECONCILE_DAYS", "30"))
+
+# Режим получения апдейтов Telegram: "polling" или "webhook"
+TELEGRAM_MODE = os.getenv("TELEGRAM_MODE", "polling")
+WEBHOOK_BASE_URL = os.getenv("WEBHOOK_BASE_URL", "")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram/webhook")
+# Обязателен в режиме webhook: им Telegram подписывает каждый запрос
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+# Журнал доставок тревог (переживает перезапуск): путь к SQLite, размер пачки, срок хранения
+OUTBOX_PATH = os.getenv("OUTBOX_PATH", "data/outbox.sqlite3")
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "500"))
+OUTBOX_RETENTION = float(os.getenv("OUTBOX_RETENTION", str(7 * 24 * 3600)))
+
+# Правила подписки пользователей (камеры, алгоритмы, уровни опасности, тихие часы)
+SUBSCRIPTIONS_PATH = os.getenv("SUBSCRIPTIONS_PATH", "data/subscriptions.json")
+SUBSCRIPTIONS_RELOAD_INTERVAL = float(os.getenv("SUBSCRIPTIONS_RELOAD_INTERVAL", "10"))
+
+# Локальная история тревог для /history
+HISTORY_PATH = os.getenv("HISTORY_PATH", "data/history.sqlite3")
+HISTORY_RETENTION = float(os.getenv("HISTORY_RETENTION", str(90 * 24 * 3600)))
+HISTORY_PAGE_SIZE = int(os.getenv("HISTORY_PAGE_SIZE", "5"))
+
+# Доля попадающих в лог событий на каждую тревогу (отправки, дубли кадров); остальные пишутся всегда
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "0.1"))
+
+# Адрес HTTP API бота (FastAPI)
+API_HOST = os.getenv("API_HOST", "0.0.0.0")
+API_PORT = int(os.getenv("API_PORT", "8002"))
+# Бюджет времени от запуска процесса до приёма тревог, мс: превышение пишется в лог (0 — не проверять)
+STARTUP_BUDGET_MS = float(os.getenv("STARTUP_BUDGET_MS", "1000"))
+
+# Свой сервер Bot API (локальный telegram-bot-api или заглушка бенчмарка); пусто — api.telegram.org
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "")
+
+# Число процессов uvicorn; больше 1 — только с TELEGRAM_MODE=webhook и STATE_BACKEND=sqlite (см. run_workers в bot/__main__.py)
+WEB_WORKERS = int(os.getenv("WEB_WORKERS", "1"))
+# Локальные счётчики статистики у каждого процесса свои: с несколькими воркерами /stats берётся из Django
+if WEB_WORKERS > 1:
+    STATS_SOURCE = "django"
+
+# Хранилище общего состояния: "memory" — в процессе, "sqlite" — общее для нескольких процессов
+STATE_BACKEND = os.getenv("STATE_BACKEND", "memory")
+STATE_SQLITE_PATH = os.getenv("STATE_SQLITE_PATH", "data/state.sqlite3")
+STATE_MEMORY_MAX_KEYS = int(os.getenv("STATE_MEMORY_MAX_KEYS", "100000"))
@@ -0,0 +1,180 @@
+"""Бот и диспетчер aiogram с обработчиками решений по тревогам.
+
+Модуль тяжёлый на импорт (aiogram), поэтому `bot.__main__` импортирует его
+в отдельном потоке уже после того, как API начал принимать тревоги.
+Роутеры команд (регистрация, статистика, PDF, история, подписки)
+подключаются следом в `start()`.
+"""
+import asyncio
+import logging
+import os
+from typing import Optional
+
+from aiogram import Bot, Dispatcher, F, types
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+
+from bot import config
+from bot.api import alert_queue, app as fastapi_app, shutdown_hooks
+from bot.handlers import import_routers
+from bot.middlewares.metrics import CallbackMetricsMiddleware
+from bot.middlewares.throttling import HEAVY_COMMANDS, ThrottlingMiddleware
+from bot.services.actions import ActionOrigin, PendingAction, action_dispatcher
+from bot.services.database import history
+from bot.services.fsm import BackendFSMStorage
+from bot.services.local_stats import local_stats
+from bot.services.sender import sender
+from bot.services.state import state_backend
+from bot.services.webhook import setup_webhook
+from bot.utils.startup import startup_profiler
+from bot.utils.telegram import (
+    setup_telegram, get_alert_photo, mark_alert_handled, unmark_alert_handled, keep_extra_buttons, send_original_photo,
+    ORIGINAL_CALLBACK,
+)
+
+BOT_TOKEN = os.getenv("BOT_TOKEN")
+CHAT_ID = "777079324"  # ID чата для отправки тревог
+DJANGO_API_URL = os.getenv("DJANGO_API_URL")
+
+# Создаем объекты бота и диспетчера
+session = AiohttpSession(api=TelegramAPIServer.from_base(config.TELEGRAM_API_URL)) if config.TELEGRAM_API_URL else None
+bot = Bot(token=BOT_TOKEN, session=session)
+dp = Dispatcher(storage=BackendFSMStorage(state_backend))
+dp.callback_query.middleware(CallbackMetricsMiddleware())
+# Внешний middleware: лишние запросы отбрасываются до фильтров и FSM
+throttling = ThrottlingMiddleware(
+    rate=config.THROTTLE_RATE,
+    burst=config.THROTTLE_BURST,
+    limits={command: (config.THROTTLE_HEAVY_RATE, config.THROTTLE_HEAVY_BURST) for command in HEAVY_COMMANDS},
+    debounce_window=config.CALLBACK_DEBOUNCE,
+    backend=state_backend,
+)
+dp.message.outer_middleware(throttling)
+dp.callback_query.outer_middleware(throttling)
+
+# Инициализируем `utils.telegram`
+setup_telegram(bot, CHAT_ID, DJANGO_API_URL)
+
+
+ACTION_REPLIES = {"confirm": "✅ Тревога подтверждена!", "reject": "🚫 Тревога отклонена!"}
+ACTION_FAILURES = {"confirm": "подтвердить", "reject": "отклонить"}
+
+
+async def handle_alert_action(callback: types.CallbackQuery, action: str):
+    """Принимает решение по тревоге сразу: отвечает, убирает кнопки, а в Django отправляет в фоне."""
+    alert_id = int(callback.data.split(":")[1])
+    message = callback.message
+    origin = ActionOrigin(message.chat.id, message.message_id, message.reply_markup)
+    if not await action_dispatcher.submit(alert_id, action, origin):
+        await callback.answer("⏳ По этой тревоге уже отправлено другое решение.", show_alert=True)
+        return
+    await callback.answer(ACTION_REPLIES[action], show_alert=True)
+    await mark_alert_handled(alert_id)
+    await message.edit_reply_markup(reply_markup=keep_extra_buttons(message.reply_markup))
+
+
+# 📌 Обработчик подтверждения тревоги
+@dp.callback_query(F.data.startswith("confirm_"))
+async def confirm_alert_handler(callback: types.CallbackQuery):
+    await handle_alert_action(callback, "confirm")
+
+
+# 📌 Обработчик отклонения тревоги
+@dp.callback_query(F.data.startswith("reject_"))
+async def reject_alert_handler(callback: types.CallbackQuery):
+    await handle_alert_action(callback, "reject")
+
+
+async def on_action_done(item: PendingAction, alert_data: Optional[dict]):
+    """Django принял решение: учитываем его и, если нужно, сразу уведомляем учредителей."""
+    local_stats.record_action(item.alert_id, item.action)
+    history.set_status(item.alert_id, item.action)
+    if item.action == "confirm" and alert_data and alert_data.get("executive_users"):
+        await send_alert_to_executives(alert_data, item.alert_id)
+
+
+async def on_action_failed(item: PendingAction, error: str):
+    """Решение так и не дошло до Django: возвращаем кнопки и сообщаем нажавшим."""
+    await unmark_alert_handled(item.alert_id)
+    tasks = []
+    for origin in item.origins:
+        tasks.append(sender.send(
+            origin.chat_id, bot.edit_message_reply_markup,
+            message_id=origin.message_id, reply_markup=origin.reply_markup,
+        ))
+        tasks.append(sender.send(
+            origin.chat_id, bot.send_message,
+            text=f"❌ Не удалось {ACTION_FAILURES[item.action]} тревогу — сервер недоступен. Нажмите кнопку ещё раз.",
+            reply_to_message_id=origin.message_id,
+        ))
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+action_dispatcher.setup(on_action_done, on_action_failed)
+shutdown_hooks.append(action_dispatcher.stop)
+
+# 📌 Оригинал пережатого фото тревоги
+@dp.callback_query(F.data.startswith(ORIGINAL_CALLBACK))
+async def original_photo_handler(callback: types.CallbackQuery):
+    aibox_alert_id = callback.data[len(ORIGINAL_CALLBACK):]
+    try:
+        found = await send_original_photo(callback.from_user.id, aibox_alert_id)
+    except Exception as e:
+        logging.error(f"Не удалось отправить оригинал фото тревоги {aibox_alert_id}: {e}")
+        await callback.answer("❌ Не удалось отправить оригинал.", show_alert=True)
+        return
+    if found:
+        await callback.answer()
+    else:
+        await callback.answer("⚠️ Оригинал фото больше недоступен.", show_alert=True)
+
+
+# 📌 Отправка учредителям
+async def send_alert_to_executives(alert_data, alert_id: int = None):
+    """Отправляет тревогу учредителям после подтверждения СБ.
+
+    Если фото тревоги уже загружалось в Telegram, отправляет его повторно по file_id.
+    """
+    executive_ids = alert_data.get("executive_users", [])
+    message_text = f"⚠️ <b>Подтвержденная тревога!</b>\n\n{alert_data.get('message', '')}"
+    file_id = await get_alert_photo(alert_id) if alert_id is not None else None
+
+    tasks = []
+    for user_id in executive_ids:
+        if file_id and len(message_text) <= 1024:
+            tasks.append(sender.send(user_id, bot.send_photo, photo=file_id, caption=message_text, parse_mode="HTML"))
+        else:
+            tasks.append(sender.send(user_id, bot.send_message, text=message_text, parse_mode="HTML"))
+
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def start():
+    """Запускает отправку тревог, подключает роутеры команд и начинает получать апдейты.
+
+    В режиме polling возвращается только после остановки polling.
+    """
+    # Клиент Telegram готов: тревоги, принятые за время запуска, уходят сразу
+    await action_dispatcher.start()
+    alert_queue.resume()
+    startup_profiler.mark("delivery_ready")
+
+    with startup_profiler.phase("import:handlers"):
+        routers = await asyncio.to_thread(import_routers)
+    for module in routers:
+        dp.include_router(module.router)
+
+    if config.TELEGRAM_MODE == "webhook":
+        # В режиме webhook апдейты приходят в тот же FastAPI, что и тревоги
+        on_startup = setup_webhook(fastapi_app, dp, bot, config.WEBHOOK_BASE_URL, config.WEBHOOK_PATH, config.WEBHOOK_SECRET)
+        await on_startup()
+        startup_profiler.mark("updates_ready")
+        startup_profiler.log_report(config.STARTUP_BUDGET_MS)
+        return
+
+    # При возврате к polling снимаем webhook, иначе getUpdates будет отклонён
+    await bot.delete_webhook()
+    startup_profiler.mark("updates_ready")
+    startup_profiler.log_report(config.STARTUP_BUDGET_MS)
+    # Сигналы обрабатывает uvicorn; polling останавливается shutdown-хуком в bot.__main__
+    await dp.start_polling(bot, handle_signals=False)
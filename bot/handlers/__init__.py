@@ -0,0 +1,17 @@
+import importlib
+from types import ModuleType
+from typing import List
+
+from bot.utils.startup import startup_profiler
+
+# Роутеры команд в порядке подключения; echo отвечает на всё остальное — последним
+ROUTERS = ("start", "user_commands", "reports", "history", "subscriptions", "echo")
+
+
+def import_routers() -> List[ModuleType]:
+    """Импортирует модули роутеров (можно в отдельном потоке: подключает их `bot.dispatcher.start`)."""
+    modules = []
+    for name in ROUTERS:
+        with startup_profiler.phase(f"import:handlers.{name}"):
+            modules.append(importlib.import_module(f"bot.handlers.{name}"))
+    return modules
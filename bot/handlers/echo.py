@@ -0,0 +1,11 @@
+# bot/handlers/echo.py
+from aiogram import Router
+from aiogram.types import Message
+
+router = Router()
+
+
+# Обработчик всех остальных сообщений
+@router.message()
+async def echo_handler(message: Message):
+    await message.answer("Бот работает!")
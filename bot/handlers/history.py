@@ -0,0 +1,141 @@
+# bot/handlers/history.py
+import time
+from datetime import datetime
+from typing import List, Optional
+
+from aiogram import F, Router, types
+from aiogram.filters import Command, CommandObject
+from aiogram.fsm.context import FSMContext
+from aiogram.types import InputMediaPhoto
+
+from bot import config
+from bot.keyboards.inline import HISTORY_PERIODS, HISTORY_STATUSES, history_choice_keyboard, history_keyboard
+from bot.services.database import STATUS_CONFIRMED, STATUS_REJECTED, history
+
+router = Router()
+
+PERIOD_SECONDS = {"1h": 3600, "24h": 24 * 3600, "7d": 7 * 24 * 3600, "30d": 30 * 24 * 3600}
+STATUS_LABELS = {STATUS_CONFIRMED: "✅ Подтверждена", STATUS_REJECTED: "❌ Отклонена"}
+FILTER_LABELS = {"source_id": "камеру", "alg_key": "алгоритм"}
+
+
+def default_filters() -> dict:
+    return {"period": "24h", "status": "all", "source_id": None, "alg_key": None, "before": None}
+
+
+def format_entry(entry: dict) -> str:
+    alert_time = datetime.fromtimestamp(entry["alert_time"]).strftime("%Y-%m-%d %H:%M:%S")
+    return (
+        f"⏰ <b>{alert_time}</b>\n"
+        f"🎥 Камера {entry['source_id']} ({entry['ipv4']})\n"
+        f"🤖 {entry['alg']}\n"
+        f"📍 {entry['device'] or 'Неизвестно'}\n"
+        f"{STATUS_LABELS.get(entry['status'], '⏳ Без решения')}"
+    )
+
+
+def format_header(filters: dict, shown: int) -> str:
+    parts = [f"за {HISTORY_PERIODS[filters['period']]}"]
+    if filters["source_id"]:
+        parts.append(f"камера {filters['source_id']}")
+    if filters["alg_key"]:
+        parts.append(f"алгоритм {filters['alg_key']}")
+    if filters["status"] != "all":
+        parts.append(HISTORY_STATUSES[filters["status"]].lower())
+    text = f"📜 <b>История тревог</b>: {', '.join(parts)}\n"
+    if not shown:
+        text += "\nТревог не найдено." if filters["before"] is None else "\nБольше тревог нет."
+    return text
+
+
+async def show_page(message: types.Message, chat_id: int, state: FSMContext, filters: dict):
+    """Отправляет страницу истории: фото по сохранённым file_id одним альбомом, затем фильтры."""
+    await history.refresh_chat(chat_id)
+    companies = history.companies(chat_id)
+    if not companies:
+        await message.answer("📜 История пуста: этому чату ещё не приходили тревоги.")
+        return
+    # Берём на одну строку больше, чтобы знать, есть ли следующая страница
+    entries = await history.query(
+        companies,
+        since=time.time() - PERIOD_SECONDS[filters["period"]],
+        source_id=filters["source_id"],
+        alg_key=filters["alg_key"],
+        status=None if filters["status"] == "all" else int(filters["status"]),
+        before=tuple(filters["before"]) if filters["before"] else None,
+        limit=config.HISTORY_PAGE_SIZE + 1,
+    )
+    has_next = len(entries) > config.HISTORY_PAGE_SIZE
+    entries = entries[:config.HISTORY_PAGE_SIZE]
+
+    with_photo = [entry for entry in entries if entry["file_id"]]
+    if len(with_photo) > 1:
+        await message.answer_media_group([
+            InputMediaPhoto(media=entry["file_id"], caption=format_entry(entry), parse_mode="HTML")
+            for entry in with_photo
+        ])
+    elif with_photo:
+        entry = with_photo[0]
+        await message.answer_photo(entry["file_id"], caption=format_entry(entry), parse_mode="HTML")
+
+    text = format_header(filters, len(entries))
+    without_photo = [entry for entry in entries if not entry["file_id"]]
+    if without_photo:
+        text += "\n" + "\n\n".join(format_entry(entry) for entry in without_photo)
+    if entries:
+        filters["before"] = [entries[-1]["alert_time"], entries[-1]["id"]]
+    await state.update_data(history=filters)
+    await message.answer(text, parse_mode="HTML", reply_markup=history_keyboard(filters, has_next))
+
+
+async def get_filters(state: FSMContext) -> dict:
+    return (await state.get_data()).get("history") or default_filters()
+
+
+@router.message(Command("history"))
+async def history_handler(message: types.Message, command: CommandObject, state: FSMContext):
+    """`/history [камера] [1h|24h|7d|30d]` — например, `/history 16 1h`."""
+    filters = default_filters()
+    for arg in (command.args or "").split():
+        if arg in PERIOD_SECONDS:
+            filters["period"] = arg
+        else:
+            filters["source_id"] = arg
+    await show_page(message, message.chat.id, state, filters)
+
+
+@router.callback_query(F.data.startswith("hist:"))
+async def history_callback(callback: types.CallbackQuery, state: FSMContext):
+    _, action, *args = callback.data.split(":")
+    filters = await get_filters(state)
+    chat_id = callback.message.chat.id
+
+    if action == "pick":
+        kind = args[0]
+        await history.refresh_chat(chat_id)
+        values = history.recent(history.companies(chat_id), kind)
+        await state.update_data(history_choices=values)
+        await callback.message.edit_reply_markup(
+            reply_markup=history_choice_keyboard(kind, values, filters[kind])
+        )
+        await callback.answer(f"Выберите {FILTER_LABELS[kind]}")
+        return
+
+    if action == "set":
+        kind, index = args
+        choices: List[str] = (await state.get_data()).get("history_choices") or []
+        value: Optional[str] = None
+        if index != "all" and int(index) < len(choices):
+            value = choices[int(index)]
+        filters[kind] = value
+    elif action == "period":
+        filters["period"] = args[0]
+    elif action == "status":
+        filters["status"] = args[0]
+
+    # Смена фильтра начинает с первой страницы, «Далее» продолжает от последней показанной тревоги
+    if action != "next":
+        filters["before"] = None
+    await callback.answer()
+    await callback.message.edit_reply_markup(reply_markup=None)
+    await show_page(callback.message, chat_id, state, filters)
@@ -0,0 +1,159 @@
+# bot/handlers/reports.py
+import logging
+
+from aiogram import F, Router, types
+from aiogram.filters import Command
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import State, StatesGroup
+from aiogram.types import BufferedInputFile
+from aiogram.utils.keyboard import InlineKeyboardBuilder
+
+from bot.api import shutdown_hooks
+from bot.services.local_stats import get_alert_stats
+from bot.services.reports import report_renderer
+from bot.utils.logger import log_event
+
+router = Router()
+
+period_map = {
+    "day": "Сегодня",
+    "week": "Неделя",
+    "month": "Месяц",
+    "all": "Всё время"
+}
+
+
+class StatsStates(StatesGroup):
+    awaiting_dates = State()
+
+
+class PDFStatsStates(StatesGroup):
+    awaiting_dates = State()
+
+
+async def shutdown_renderer():
+    report_renderer.shutdown()
+
+
+# Пул построения PDF появляется только вместе с этим роутером
+shutdown_hooks.append(shutdown_renderer)
+
+
+@router.message(Command("stats"))
+async def show_stats_periods(message: types.Message):
+    kb = InlineKeyboardBuilder()
+
+    kb.button(text="Сегодня", callback_data="stats_period:day")
+    kb.button(text="Неделя", callback_data="stats_period:week")
+    kb.button(text="Месяц", callback_data="stats_period:month")
+    kb.button(text="Всё время", callback_data="stats_period:all")
+    kb.button(text="📅 Выбрать даты", callback_data="stats_period:custom")
+
+    kb.adjust(2, 2, 1)
+
+    await message.answer("📊 Выберите период:", reply_markup=kb.as_markup())
+
+
+@router.callback_query(F.data.startswith("stats_period:"))
+async def send_statistics(callback: types.CallbackQuery, state: FSMContext):
+    period = callback.data.split(":")[1]
+
+    if period == "custom":
+        await callback.message.answer("🗓 Введите даты в формате:\n<code>2025-05-05 2025-05-24</code>")
+        await state.set_state(StatsStates.awaiting_dates)
+        return
+
+    try:
+        data = await get_alert_stats(period=period)
+
+        if data is None:
+            await callback.message.answer("❌ Не удалось получить статистику.")
+            return
+
+        await callback.message.answer(format_stats(data, period_map.get(period, "Период")), parse_mode="HTML")
+    except Exception:
+        await callback.message.answer("⚠️ Ошибка при получении статистики.")
+
+
+@router.message(StatsStates.awaiting_dates)
+async def handle_custom_dates(message: types.Message, state: FSMContext):
+    try:
+        start_str, end_str = message.text.strip().split()
+        data = await get_alert_stats(start=start_str, end=end_str)
+
+        if data is None:
+            await message.answer("❌ Не удалось получить статистику.")
+            return
+
+        await message.answer(format_stats(data, f"{start_str} – {end_str}"), parse_mode="HTML")
+    except Exception:
+        await message.answer("⚠️ Неверный формат. Введите даты в виде: 2025-05-05 2025-05-24")
+    finally:
+        await state.clear()
+
+
+@router.message(Command("pdf"))
+async def show_pdf_periods(message: types.Message):
+    kb = InlineKeyboardBuilder()
+    kb.button(text="Сегодня", callback_data="pdf_period:day")
+    kb.button(text="Неделя", callback_data="pdf_period:week")
+    kb.button(text="Месяц", callback_data="pdf_period:month")
+    kb.button(text="Всё время", callback_data="pdf_period:all")
+    kb.button(text="📅 Выбрать даты", callback_data="pdf_period:custom")
+    kb.adjust(2, 2, 1)
+    await message.answer("📄 Выберите период для PDF:", reply_markup=kb.as_markup())
+
+
+@router.callback_query(F.data.startswith("pdf_period:"))
+async def generate_pdf_stats(callback: types.CallbackQuery, state: FSMContext):
+    period = callback.data.split(":")[1]
+    if period == "custom":
+        await callback.message.answer("🗓 Введите даты в формате:\n<code>2025-05-05 2025-05-24</code>")
+        await state.set_state(PDFStatsStates.awaiting_dates)
+        return
+    await fetch_and_send_pdf(callback.message, period)
+
+
+@router.message(PDFStatsStates.awaiting_dates)
+async def handle_pdf_custom_dates(message: types.Message, state: FSMContext):
+    try:
+        start_str, end_str = message.text.strip().split()
+        await fetch_and_send_pdf(message, "custom", start_str, end_str)
+    except Exception:
+        await message.answer("⚠️ Неверный формат. Введите даты в виде: 2025-05-05 2025-05-24")
+    finally:
+        await state.clear()
+
+
+async def fetch_and_send_pdf(message: types.Message, period: str, start=None, end=None):
+    try:
+        if period == "custom":
+            data = await get_alert_stats(start=start, end=end)
+            label = f"{start} – {end}"
+        else:
+            data = await get_alert_stats(period=period)
+            label = period_map.get(period, "Период")
+
+        if data is None:
+            await message.answer("❌ Не удалось получить данные.")
+            return
+
+        pdf_bytes = await report_renderer.render(data, label)
+        document = BufferedInputFile(pdf_bytes, filename="alert_stats.pdf")
+        await message.answer_document(document)
+    except Exception as e:
+        log_event("pdf_report_failed", logging.ERROR, exc_info=True, chat_id=message.chat.id, period=period,
+                  start=start, end=end, error=f"{type(e).__name__}: {e}")
+        await message.answer("⚠️ Ошибка при создании PDF.")
+
+
+def format_stats(data: dict, period: str) -> str:
+    text = (
+        f"📊 <b>Статистика тревог ({period})</b>\n\n"
+        f"🔢 Всего тревог: <b>{data['total_alerts']}</b>\n"
+        f"✅ Подтверждено: <b>{data['confirmed_alerts']}</b>\n\n"
+        f"📌 <b>По алгоритмам:</b>\n"
+    )
+    for alg in data["algorithms"]:
+        text += f"▪️ <b>{alg['name']}</b>: {alg['total']} всего, {alg['confirmed']} подтверждено\n"
+    return text
@@ -1,9 +1,20 @@
 # bot/handlers/start.py
-from aiogram import Router, types
-from aiogram.filters import Command
+from aiogram import Router
+from aiogram.filters import CommandStart
+from aiogram.types import Message
+
+from bot.utils.telegram import register_user
 
 router = Router()
 
-@router.message(Command("start"))
-async def start_handler(message: types.Message):
-    await message.answer("Привет! Я твой AIBox-бот.")
+
+# Обработчик команды /start
+@router.message(CommandStart())
+async def start_handler(message: Message):
+    args = message.text.split()  # Получаем аргументы команды
+
+    if len(args) > 1 and args[1].startswith("register_"):
+        token = args[1].replace("register_", "")
+        await register_user(message, token)
+    else:
+        await message.answer("Привет! Используйте специальную ссылку для регистрации.")
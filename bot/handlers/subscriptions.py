@@ -0,0 +1,89 @@
+# bot/handlers/subscriptions.py
+from typing import List
+
+from aiogram import F, Router, types
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.filters import Command
+from aiogram.fsm.context import FSMContext
+
+from bot.keyboards.inline import SUBSCRIPTION_KINDS, subscriptions_choice_keyboard, subscriptions_keyboard
+from bot.services.database import history
+from bot.services.subscriptions import SubscriptionRules, subscriptions
+
+router = Router()
+
+# Откуда брать варианты для переключателей
+HISTORY_COLUMNS = {"cameras": "source_id", "algorithms": "alg_key"}
+
+
+def format_rules(rules: SubscriptionRules) -> str:
+    quiet = f"{rules.quiet[0]:02d}:00–{rules.quiet[1]:02d}:00 (тревоги охраны — без звука)" if rules.quiet else "выкл"
+    return (
+        "🔔 <b>Настройки уведомлений</b>\n\n"
+        f"🎥 <b>Камеры:</b> {', '.join(sorted(rules.cameras)) or 'все'}\n"
+        f"🤖 <b>Алгоритмы:</b> {', '.join(sorted(rules.algorithms)) or 'все'}\n"
+        f"⚠️ <b>Отключённые уровни опасности:</b> {', '.join(sorted(rules.muted_hazards)) or 'нет'}\n"
+        f"🌙 <b>Тихие часы:</b> {quiet}\n"
+    )
+
+
+def choices(chat_id: int, kind: str, rules: SubscriptionRules) -> List[str]:
+    """Недавние значения плюс уже выбранные, чтобы их можно было снять."""
+    selected = getattr(rules, kind)
+    if kind in HISTORY_COLUMNS:
+        recent = history.recent(history.companies(chat_id), HISTORY_COLUMNS[kind])
+    else:
+        recent = sorted(subscriptions.hazard_levels)
+    return list(dict.fromkeys([*recent, *sorted(selected)]))
+
+
+async def show(message: types.Message, rules: SubscriptionRules, reply_markup):
+    try:
+        await message.edit_text(format_rules(rules), parse_mode="HTML", reply_markup=reply_markup)
+    except TelegramBadRequest as e:
+        # Повторное нажатие той же кнопки: сообщение не изменилось
+        if "message is not modified" not in str(e):
+            raise
+
+
+@router.message(Command("subscriptions"))
+async def subscriptions_handler(message: types.Message):
+    rules = subscriptions.get(message.chat.id)
+    await message.answer(format_rules(rules), parse_mode="HTML", reply_markup=subscriptions_keyboard())
+
+
+@router.callback_query(F.data.startswith("sub:"))
+async def subscriptions_callback(callback: types.CallbackQuery, state: FSMContext):
+    _, action, *args = callback.data.split(":")
+    chat_id = callback.message.chat.id
+    rules = subscriptions.get(chat_id)
+
+    if action in ("pick", "tog", "all"):
+        kind = args[0]
+        if kind not in SUBSCRIPTION_KINDS:
+            await callback.answer()
+            return
+        if action == "pick":
+            await history.refresh_chat(chat_id)
+            values = choices(chat_id, kind, rules)
+            await state.update_data(subscription_choices=values)
+        else:
+            values = (await state.get_data()).get("subscription_choices") or []
+            selected = getattr(rules, kind)
+            if action == "all":
+                selected.clear()
+            elif int(args[1]) < len(values):
+                selected ^= {values[int(args[1])]}
+            await subscriptions.update(chat_id, rules)
+        await callback.answer()
+        await show(callback.message, rules, subscriptions_choice_keyboard(kind, values, getattr(rules, kind)))
+        return
+
+    if action == "quiet":
+        rules.quiet = None if args[0] == "off" else tuple(int(hour) for hour in args[0].split("-"))
+        await subscriptions.update(chat_id, rules)
+    elif action == "reset":
+        rules = SubscriptionRules()
+        await subscriptions.update(chat_id, rules)
+    await callback.answer()
+    await show(callback.message, rules, subscriptions_keyboard())
@@ -0,0 +1,11 @@
+# bot/handlers/user_commands.py
+from aiogram import Router
+from aiogram.filters import Command
+from aiogram.types import Message
+
+router = Router()
+
+
+@router.message(Command("id"))
+async def send_chat_id(message: Message):
+    await message.answer(f"Ваш chat_id: {message.chat.id}")
@@ -0,0 +1,66 @@
+from typing import List, Optional
+
+from aiogram.types import InlineKeyboardMarkup
+from aiogram.utils.keyboard import InlineKeyboardBuilder
+
+HISTORY_PERIODS = {"1h": "1 час", "24h": "24 часа", "7d": "7 дней", "30d": "30 дней"}
+HISTORY_STATUSES = {"all": "Все", "0": "⏳ Без решения", "1": "✅ Подтверждённые", "2": "❌ Отклонённые"}
+
+
+def history_keyboard(filters: dict, has_next: bool) -> InlineKeyboardMarkup:
+    """Фильтры и листание /history. Текущее значение фильтра отмечено точкой."""
+    keyboard = InlineKeyboardBuilder()
+    for key, label in HISTORY_PERIODS.items():
+        mark = "• " if filters["period"] == key else ""
+        keyboard.button(text=f"{mark}{label}", callback_data=f"hist:period:{key}")
+    for key, label in HISTORY_STATUSES.items():
+        mark = "• " if filters["status"] == key else ""
+        keyboard.button(text=f"{mark}{label}", callback_data=f"hist:status:{key}")
+    keyboard.button(text=f"🎥 Камера: {filters['source_id'] or 'все'}", callback_data="hist:pick:source_id")
+    keyboard.button(text=f"🤖 Алгоритм: {filters['alg_key'] or 'все'}", callback_data="hist:pick:alg_key")
+    keyboard.button(text="⏮ Сначала", callback_data="hist:first")
+    if has_next:
+        keyboard.button(text="Далее ▶", callback_data="hist:next")
+    keyboard.adjust(4, 2, 2, 2, 2)
+    return keyboard.as_markup()
+
+
+def history_choice_keyboard(kind: str, values: List[str], current: Optional[str]) -> InlineKeyboardMarkup:
+    """Выбор камеры или алгоритма из недавних; в callback_data — индекс, значения лежат в FSM."""
+    keyboard = InlineKeyboardBuilder()
+    keyboard.button(text=("• " if current is None else "") + "Все", callback_data=f"hist:set:{kind}:all")
+    for index, value in enumerate(values):
+        mark = "• " if value == current else ""
+        keyboard.button(text=f"{mark}{value}", callback_data=f"hist:set:{kind}:{index}")
+    keyboard.adjust(3)
+    return keyboard.as_markup()
+
+
+SUBSCRIPTION_KINDS = {"cameras": "🎥 Камеры", "algorithms": "🤖 Алгоритмы", "muted_hazards": "⚠️ Отключённые уровни"}
+# Варианты тихих часов: (начало, конец) в часах
+QUIET_PRESETS = [(22, 7), (23, 7), (0, 8)]
+
+
+def subscriptions_keyboard() -> InlineKeyboardMarkup:
+    """Главное меню правил подписки."""
+    keyboard = InlineKeyboardBuilder()
+    for kind, label in SUBSCRIPTION_KINDS.items():
+        keyboard.button(text=label, callback_data=f"sub:pick:{kind}")
+    keyboard.button(text="🌙 Выкл", callback_data="sub:quiet:off")
+    for start, end in QUIET_PRESETS:
+        keyboard.button(text=f"🌙 {start:02d}–{end:02d}", callback_data=f"sub:quiet:{start}-{end}")
+    keyboard.button(text="♻️ Сбросить всё", callback_data="sub:reset")
+    keyboard.adjust(1, 1, 1, 4, 1)
+    return keyboard.as_markup()
+
+
+def subscriptions_choice_keyboard(kind: str, values: List[str], selected: set) -> InlineKeyboardMarkup:
+    """Переключатели значений правила; в callback_data — индекс, значения лежат в FSM."""
+    keyboard = InlineKeyboardBuilder()
+    for index, value in enumerate(values):
+        mark = "✅ " if value in selected else ""
+        keyboard.button(text=f"{mark}{value or '—'}", callback_data=f"sub:tog:{kind}:{index}")
+    keyboard.button(text="Все" if kind != "muted_hazards" else "Ни одного", callback_data=f"sub:all:{kind}")
+    keyboard.button(text="⬅️ Назад", callback_data="sub:back")
+    keyboard.adjust(*([3] * ((len(values) + 2) // 3)), 2)
+    return keyboard.as_markup()
@@ -0,0 +1,24 @@
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import CallbackQuery
+
+from bot.services.metrics import callback_seconds
+
+
+class CallbackMetricsMiddleware(BaseMiddleware):
+    """Замеряет время обработки нажатий inline-кнопок по действию (часть callback_data до ':')."""
+
+    async def __call__(
+        self,
+        handler: Callable[[CallbackQuery, Dict[str, Any]], Awaitable[Any]],
+        event: CallbackQuery,
+        data: Dict[str, Any],
+    ) -> Any:
+        action = (event.data or "").split(":", 1)[0] or "unknown"
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            callback_seconds.observe(time.perf_counter() - started, action)
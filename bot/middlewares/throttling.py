@@ -0,0 +1,110 @@
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Tuple, Union
+
+from aiogram import BaseMiddleware
+from aiogram.types import CallbackQuery, Message
+
+from bot.services.metrics import registry
+from bot.services.state import MemoryStateBackend, StateBackend
+
+throttled_updates = registry.counter(
+    "bot_throttled_updates_total", "Входящие сообщения и нажатия, отброшенные ограничителем", ["command", "reason"]
+)
+
+# Тяжёлые команды: запрос в Django и/или сборка PDF
+HEAVY_COMMANDS = ("/stats", "stats_period", "/pdf", "pdf_period")
+# Нажатия, которые нельзя отправлять в Django повторно
+DEBOUNCED_CALLBACKS = ("confirm_alert", "reject_alert")
+
+
+class ThrottlingMiddleware(BaseMiddleware):
+    """Ограничивает частоту входящих команд и нажатий кнопок.
+
+    На каждую пару (пользователь, команда) — свой token bucket: `burst`
+    запросов сразу, дальше `rate` в секунду. Для тяжёлых команд лимиты
+    задаются отдельно в `limits`. Бакеты и ключи повторных нажатий лежат в
+    общем `StateBackend`, как токены `TelegramSender`: с несколькими
+    процессами пользователь получает тот же лимит, а не лимит на процесс.
+
+    Нажатия из `debounce` (подтверждение и отклонение тревоги) дополнительно
+    схлопываются по callback_data у всех пользователей: пока первое нажатие
+    обрабатывается и ещё `debounce_window` секунд после него, повторные
+    отвечаются на месте и в Django не уходят.
+    """
+
+    # Сколько держится ключ нажатия, пока оно обрабатывается: если процесс
+    # упадёт посреди обработки, кнопка не останется заблокированной навсегда
+    PROCESSING_TTL = 60.0
+
+    def __init__(
+        self,
+        rate: float = 1.0,
+        burst: float = 5.0,
+        limits: Optional[Dict[str, Tuple[float, float]]] = None,
+        debounce: Iterable[str] = DEBOUNCED_CALLBACKS,
+        debounce_window: float = 5.0,
+        backend: Optional[StateBackend] = None,
+    ):
+        self.default_limit = (rate, burst)
+        self.limits = limits or {}
+        self.debounce = frozenset(debounce)
+        self.debounce_window = debounce_window
+        self.backend = backend or MemoryStateBackend()
+
+    @staticmethod
+    def command_of(event: Union[Message, CallbackQuery]) -> str:
+        if isinstance(event, CallbackQuery):
+            return (event.data or "").split(":", 1)[0] or "callback"
+        text = event.text or ""
+        if text.startswith("/"):
+            return text.split(maxsplit=1)[0].split("@", 1)[0]
+        return "message"
+
+    async def _allow(self, user_id: int, command: str) -> Tuple[bool, bool]:
+        """Списывает токен; возвращает (пропустить, нужно ли предупредить пользователя)."""
+        rate, burst = self.limits.get(command, self.default_limit)
+        delay = await self.backend.take_token(f"throttle:{user_id}:{command}", rate, burst)
+        if not delay:
+            return True, False
+        # Предупреждаем один раз, пока не появится следующий токен
+        warn = await self.backend.add(f"throttle:warned:{user_id}:{command}", ttl=delay)
+        return False, warn
+
+    async def __call__(
+        self,
+        handler: Callable[[Union[Message, CallbackQuery], Dict[str, Any]], Awaitable[Any]],
+        event: Union[Message, CallbackQuery],
+        data: Dict[str, Any],
+    ) -> Any:
+        user = event.from_user
+        if user is None:
+            return await handler(event, data)
+        command = self.command_of(event)
+
+        debounce_key = None
+        if isinstance(event, CallbackQuery) and command in self.debounce:
+            debounce_key = f"throttle:pressed:{event.data}"
+            if not await self.backend.add(debounce_key, ttl=self.PROCESSING_TTL):
+                throttled_updates.inc(command, "debounce")
+                await event.answer("⏳ Нажатие уже обрабатывается.")
+                return None
+
+        allowed, warn = await self._allow(user.id, command)
+        if not allowed:
+            throttled_updates.inc(command, "rate")
+            if debounce_key is not None:
+                await self.backend.delete(debounce_key)
+            if isinstance(event, CallbackQuery):
+                await event.answer("⏳ Слишком часто, попробуйте через несколько секунд.")
+            elif warn:
+                await event.answer("⏳ Слишком много запросов, попробуйте через несколько секунд.")
+            return None
+
+        if debounce_key is None:
+            return await handler(event, data)
+        try:
+            return await handler(event, data)
+        finally:
+            if self.debounce_window > 0:
+                await self.backend.set(debounce_key, 1, ttl=self.debounce_window)
+            else:
+                await self.backend.delete(debounce_key)
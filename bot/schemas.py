@@ -1,4 +1,4 @@
-from pydantic import BaseModel, HttpUrl
+from pydantic import BaseModel, HttpUrl, PrivateAttr
 from typing import Optional, Dict, Any, List
 from datetime import datetime
 
@@ -39,3 +39,57 @@ class AlertSchema(BaseModel):
     company: CompanySchema
     users_telegram_id: List[int]
     for_security: bool
+    # Служебные атрибуты: задаются только ботом и не принимаются из тела запроса
+    _image_data: Optional[bytes] = PrivateAttr(default=None)
+    _outbox_id: Optional[int] = PrivateAttr(default=None)
+
+    @property
+    def image_data(self) -> Optional[bytes]:
+        """Уже загруженное изображение (например, base64 из сырого формата AIBox)."""
+        return self._image_data
+
+    @image_data.setter
+    def image_data(self, value: Optional[bytes]):
+        self._image_data = value
+
+    @property
+    def outbox_id(self) -> Optional[int]:
+        """ID записи в журнале доставок (bot.services.database)."""
+        return self._outbox_id
+
+    @outbox_id.setter
+    def outbox_id(self, value: Optional[int]):
+        self._outbox_id = value
+
+    def without_image(self) -> "AlertSchema":
+        """Копия тревоги без изображения (отправляется текстом)."""
+        alert = self.model_copy(update={"image": None})
+        alert.image_data = None
+        return alert
+
+
+# Сырой формат тревоги AIBox (см. data/alerts.json)
+
+class RawDeviceSchema(BaseModel):
+    id: str
+    name: Optional[str] = None
+    desc: Optional[str] = None
+
+class RawSourceSchema(BaseModel):
+    id: str
+    ipv4: str
+    desc: Optional[str] = None
+
+class RawAlgorithmSchema(BaseModel):
+    name: str
+    ch_name: Optional[str] = None
+    type: Optional[str] = None
+
+class RawAlertSchema(BaseModel):
+    id: str
+    alert_time: float
+    device: RawDeviceSchema
+    source: RawSourceSchema
+    alg: RawAlgorithmSchema
+    hazard_level: Optional[str] = ""
+    reserved_data: Optional[Dict[str, Any]] = {}
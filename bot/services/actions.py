@@ -0,0 +1,348 @@
+import asyncio
+import logging
+import random
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+from bot import config
+from bot.services.api import DjangoAPIClient, DjangoAPIUnavailable, django_api
+from bot.services.metrics import registry
+from bot.services.state import MemoryStateBackend, StateBackend, state_backend
+from bot.utils.logger import log_event
+
+alert_actions = registry.counter(
+    "bot_alert_actions_total", "Решения по тревогам, отправленные в Django, по результату", ["action", "outcome"]
+)
+action_batch_size = registry.histogram(
+    "bot_alert_action_batch_size", "Число решений в одной отправке в Django", buckets=(1, 2, 5, 10, 20, 50, 100, 200)
+)
+
+
+@dataclass
+class ActionOrigin:
+    """Сообщение, в котором нажали кнопку: нужно, чтобы откатить интерфейс при ошибке."""
+
+    chat_id: int
+    message_id: int
+    reply_markup: Any = None
+
+
+    def to_json(self) -> list:
+        markup = self.reply_markup
+        if hasattr(markup, "model_dump"):
+            markup = markup.model_dump(mode="json", exclude_none=True)
+        return [self.chat_id, self.message_id, markup]
+
+    @classmethod
+    def from_json(cls, data: list) -> "ActionOrigin":
+        # Разметка остаётся словарём: aiogram сам проверит её при отправке
+        return cls(*data)
+
+
+@dataclass
+class PendingAction:
+    alert_id: int
+    action: str
+    origins: List[ActionOrigin] = field(default_factory=list)
+    attempts: int = 0
+    # Чьё это решение в общем хранилище (см. ActionDispatcher.submit)
+    claim_id: str = ""
+
+
+Done = Callable[[PendingAction, Optional[dict]], Awaitable[None]]
+Failed = Callable[[PendingAction, str], Awaitable[None]]
+
+
+class ActionDispatcher:
+    """Фоновая отправка решений по тревогам («подтвердить»/«отклонить») в Django.
+
+    Обработчик кнопки ставит решение в очередь и сразу отвечает пользователю.
+    Цикл отправки ждёт `batch_delay` секунд, собирает всё, что накопилось
+    (до `batch_size`), и отправляет одним bulk-запросом, если задан
+    `bulk_path`, иначе — параллельными запросами по одному соединению.
+    Временные ошибки (сеть, 5xx, открытый circuit breaker) повторяются с
+    экспоненциальной задержкой до `max_attempts` попыток; ответы 4xx —
+    окончательный отказ. Повторное нажатие по тревоге, решение по которой
+    ещё в очереди, не создаёт второй запрос.
+
+    По результату вызываются `on_done` (сразу по ответу Django, в отдельной
+    задаче — например, уведомление учредителей) или `on_failed` для отката.
+
+    Решение по тревоге закрепляется в общем `StateBackend` (на `claim_ttl`
+    секунд или до результата), поэтому с несколькими воркерами его тоже
+    отправляет только один процесс. Нажатие, пришедшее в другой процесс,
+    дописывает своё сообщение к закреплённому решению: при отказе откатят
+    и его.
+    """
+
+    def __init__(
+        self,
+        client: DjangoAPIClient,
+        batch_size: int = 50,
+        batch_delay: float = 0.05,
+        max_attempts: int = 5,
+        retry_delay: float = 1.0,
+        bulk_path: str = "",
+        backend: Optional[StateBackend] = None,
+        claim_ttl: float = 300,
+    ):
+        self.client = client
+        self.backend = backend or MemoryStateBackend()
+        self.claim_ttl = claim_ttl
+        self.batch_size = batch_size
+        self.batch_delay = batch_delay
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.bulk_path = bulk_path
+        self.on_done: Optional[Done] = None
+        self.on_failed: Optional[Failed] = None
+        self._pending: Dict[int, PendingAction] = {}
+        self._ready: Optional[asyncio.Queue] = None
+        self._timers: Dict[int, asyncio.TimerHandle] = {}
+        self._callbacks: Set[asyncio.Task] = set()
+        self._task: Optional[asyncio.Task] = None
+        self.sent = 0
+        self.retried = 0
+        self.failed = 0
+        self.batches = 0
+
+    def setup(self, on_done: Done, on_failed: Failed):
+        self.on_done = on_done
+        self.on_failed = on_failed
+
+    async def start(self):
+        if self._task is None:
+            self._ready = asyncio.Queue()
+            for alert_id in self._pending:
+                self._ready.put_nowait(alert_id)
+            self._task = asyncio.create_task(self._run())
+
+    async def submit(self, alert_id: int, action: str, origin: Optional[ActionOrigin] = None) -> bool:
+        """Ставит решение в очередь. False — по тревоге уже ждёт отправки другое решение."""
+        pending = self._pending.get(alert_id)
+        if pending is not None:
+            if pending.action != action:
+                return False
+            if origin is not None:
+                pending.origins.append(origin)
+            return True
+
+        claim_id = uuid.uuid4().hex
+        joined = origin.to_json() if origin is not None else None
+
+        def claim(record):
+            if record is None:
+                return {"id": claim_id, "action": action, "origins": []}
+            if record["action"] == action and joined is not None:
+                return {**record, "origins": [*record["origins"], joined]}
+            return record
+
+        record = await self.backend.update(self._claim_key(alert_id), claim, ttl=self.claim_ttl)
+        if record["action"] != action:
+            return False
+        if record["id"] != claim_id:
+            return True  # то же решение уже отправляет другой процесс (или соседнее нажатие)
+        self._pending[alert_id] = PendingAction(alert_id, action, [origin] if origin else [], claim_id=claim_id)
+        if self._ready is not None:
+            self._ready.put_nowait(alert_id)
+        return True
+
+    @staticmethod
+    def _claim_key(alert_id: int) -> str:
+        return f"action:pending:{alert_id}"
+
+    async def _release(self, item: PendingAction) -> List[ActionOrigin]:
+        """Снимает закрепление решения; возвращает сообщения, дописанные другими процессами."""
+        released = None
+
+        def release(record):
+            nonlocal released
+            if record is not None and record["id"] == item.claim_id:
+                released = record
+                return None
+            return record
+
+        await self.backend.update(self._claim_key(item.alert_id), release)
+        return [ActionOrigin.from_json(data) for data in released["origins"]] if released else []
+
+    async def _done(self, item: PendingAction, data: Optional[dict]):
+        await self._release(item)
+        if self.on_done is not None:
+            await self.on_done(item, data)
+
+    async def _failed(self, item: PendingAction, error: str):
+        item.origins.extend(await self._release(item))
+        if self.on_failed is not None:
+            await self.on_failed(item, error)
+
+    async def _run(self):
+        while True:
+            batch = [await self._ready.get()]
+            if self.batch_delay > 0:
+                await asyncio.sleep(self.batch_delay)
+            while len(batch) < self.batch_size and not self._ready.empty():
+                batch.append(self._ready.get_nowait())
+            items = [self._pending[alert_id] for alert_id in dict.fromkeys(batch) if alert_id in self._pending]
+            if items:
+                await self._flush_safe(items, final=False)
+
+    async def _flush_safe(self, items: List[PendingAction], final: bool):
+        """`_flush`, после которой цикл отправки живёт дальше при любой ошибке.
+
+        Непредвиденная ошибка считается окончательным отказом для ещё не
+        разобранных решений пачки: интерфейс откатывается, охрана получает
+        уведомление.
+        """
+        try:
+            await self._flush(items, final)
+        except Exception as e:
+            log_event("alert_action_batch_failed", logging.ERROR, exc_info=True, size=len(items), error=repr(e))
+            for item in items:
+                # Уже разобранные и отложенные на повтор решения не трогаем
+                if self._pending.get(item.alert_id) is item and item.alert_id not in self._timers:
+                    self._settle(item, None, None, f"внутренняя ошибка: {e!r}", final=True)
+
+    async def _flush(self, items: List[PendingAction], final: bool):
+        self.batches += 1
+        action_batch_size.observe(len(items))
+        for item in items:
+            item.attempts += 1
+        results = None
+        if self.bulk_path and len(items) > 1:
+            results = await self._send_bulk(items)
+        if results is None:
+            results = await asyncio.gather(*(self._send_one(item) for item in items))
+        for item, (status, data, error) in zip(items, results):
+            self._settle(item, status, data, error, final)
+
+    async def _send_one(self, item: PendingAction):
+        """Возвращает (HTTP-статус или None при сетевой ошибке, тело ответа, описание ошибки)."""
+        try:
+            response = await self.client.send_action(item.alert_id, item.action)
+        except DjangoAPIUnavailable as e:
+            return None, None, str(e)
+        data = _json(response)
+        return response.status_code, data if isinstance(data, dict) else None, f"HTTP {response.status_code}"
+
+    async def _send_bulk(self, items: List[PendingAction]):
+        """Один запрос на всю пачку. None — bulk-эндпоинт недоступен, нужно слать по одному."""
+        try:
+            response = await self.client.send_actions(
+                self.bulk_path, [{"alert_id": item.alert_id, "action": item.action} for item in items]
+            )
+        except DjangoAPIUnavailable as e:
+            return [(None, None, str(e))] * len(items)
+        if response.status_code in (404, 405):
+            logging.warning(f"Bulk-эндпоинт решений {self.bulk_path} недоступен ({response.status_code}), решения отправляются по одному")
+            self.bulk_path = ""
+            return None
+        if response.status_code != 200:
+            return [(response.status_code, None, f"HTTP {response.status_code}")] * len(items)
+        body = _json(response)
+        entries = body.get("results") if isinstance(body, dict) else None
+        if not isinstance(entries, list):
+            return [(None, None, "некорректный bulk-ответ")] * len(items)
+        by_alert = {entry.get("alert_id"): entry for entry in entries if isinstance(entry, dict)}
+        results = []
+        for item in items:
+            entry = by_alert.get(item.alert_id)
+            if entry is None:
+                results.append((None, None, "нет ответа по тревоге в bulk-ответе"))
+                continue
+            status = entry.get("status", 200)
+            if not isinstance(status, int):
+                results.append((None, None, f"некорректный статус в bulk-ответе: {status!r}"))
+                continue
+            data = entry.get("data")
+            results.append((status, data if isinstance(data, dict) else None, f"HTTP {status}"))
+        return results
+
+    def _settle(self, item: PendingAction, status: Optional[int], data: Optional[dict], error: str, final: bool):
+        if status == 200:
+            del self._pending[item.alert_id]
+            self.sent += 1
+            alert_actions.inc(item.action, "ok")
+            self._spawn(self._done, item, data)
+            return
+        # 4xx (кроме 408/429) повторять бессмысленно
+        transient = status is None or status >= 500 or status in (408, 429)
+        if transient and not final and item.attempts < self.max_attempts:
+            self.retried += 1
+            alert_actions.inc(item.action, "retry")
+            delay = min(self.retry_delay * 2 ** (item.attempts - 1), 30) * random.uniform(0.8, 1.2)
+            self._timers[item.alert_id] = asyncio.get_running_loop().call_later(delay, self._requeue, item.alert_id)
+            return
+        del self._pending[item.alert_id]
+        self.failed += 1
+        alert_actions.inc(item.action, "failed")
+        log_event("alert_action_failed", logging.ERROR, alert_id=item.alert_id, action=item.action,
+                  attempts=item.attempts, error=error)
+        self._spawn(self._failed, item, error)
+
+    def _requeue(self, alert_id: int):
+        self._timers.pop(alert_id, None)
+        if alert_id in self._pending and self._ready is not None:
+            self._ready.put_nowait(alert_id)
+
+    def _spawn(self, callback, item: PendingAction, arg):
+        task = asyncio.create_task(callback(item, arg))
+        self._callbacks.add(task)
+        task.add_done_callback(self._callback_done)
+
+    def _callback_done(self, task: asyncio.Task):
+        self._callbacks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logging.error(f"Ошибка обработчика результата решения по тревоге: {task.exception()!r}")
+
+    async def stop(self, timeout: float = 10):
+        """Последняя попытка отправить всё, что в очереди, и ожидание обработчиков результата."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for timer in self._timers.values():
+            timer.cancel()
+        self._timers.clear()
+        items = list(self._pending.values())
+        try:
+            for start in range(0, len(items), self.batch_size):
+                await asyncio.wait_for(self._flush_safe(items[start:start + self.batch_size], final=True), timeout)
+            if self._callbacks:
+                await asyncio.wait(self._callbacks, timeout=timeout)
+        except asyncio.TimeoutError:
+            logging.error(f"Не все решения по тревогам отправлены в Django до остановки: {len(self._pending)}")
+        self._ready = None
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._pending),
+            "sent": self.sent,
+            "retried": self.retried,
+            "failed": self.failed,
+            "batches": self.batches,
+        }
+
+
+def _json(response) -> Optional[Any]:
+    try:
+        return response.json()
+    except ValueError:
+        return None
+
+
+action_dispatcher = ActionDispatcher(
+    django_api,
+    batch_size=config.ACTION_BATCH_SIZE,
+    batch_delay=config.ACTION_BATCH_DELAY,
+    max_attempts=config.ACTION_MAX_ATTEMPTS,
+    retry_delay=config.ACTION_RETRY_DELAY,
+    bulk_path=config.DJANGO_BULK_ACTION_PATH,
+    backend=state_backend,
+    claim_ttl=config.ACTION_CLAIM_TTL,
+)
+registry.gauge("bot_alert_actions_pending", "Решения по тревогам, ожидающие отправки в Django",
+               lambda: action_dispatcher.stats()["pending"])
@@ -0,0 +1,217 @@
+import binascii
+import os
+import re
+from datetime import datetime
+from typing import AsyncIterable, List, Optional, Tuple
+
+import orjson
+
+from bot import config
+from bot.schemas import (
+    AlertSchema,
+    AlgorithmSchema,
+    CompanySchema,
+    DeviceSchema,
+    RawAlertSchema,
+    SourceSchema,
+)
+from bot.services.metrics import validation_seconds
+from bot.utils.misc import load_json
+
+
+class Base64StreamDecoder:
+    """Декодирует base64 по частям в один буфер.
+
+    Части могут приходить любой длины: хвост, не кратный 4 символам,
+    переносится в следующий вызов `feed`.
+    """
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._tail = b""
+
+    def feed(self, chunk: bytes):
+        if self._tail:
+            chunk = self._tail + chunk
+        cut = len(chunk) - len(chunk) % 4
+        self._tail = chunk[cut:]
+        if cut:
+            self._buffer += binascii.a2b_base64(chunk[:cut])
+
+    def finish(self) -> bytes:
+        if self._tail.strip(b"="):
+            raise ValueError("Некорректная длина base64 в поле image")
+        data = bytes(self._buffer)
+        self._buffer = bytearray()
+        return data
+
+
+class RawAlertReader:
+    """Разбирает тело сырой тревоги AIBox по мере поступления.
+
+    Значение верхнеуровневого поля `"image"` не копируется в JSON-буфер:
+    оно сразу декодируется из base64 в `Base64StreamDecoder`, а в JSON
+    вместо него остаётся `null`. Остальной документ (пара килобайт)
+    разбирается orjson целиком.
+    """
+
+    # Внутри строки важны только кавычка и обратный слеш, вне строк — структура JSON;
+    # всё между ними копируется срезом, без разбора по байту
+    _STRING_SPECIAL = re.compile(rb'["\\]')
+    _STRUCTURAL = re.compile(rb'["{}\[\]:,]')
+
+    def __init__(self):
+        self.json = bytearray()
+        self.image: Optional[Base64StreamDecoder] = None
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._last_key: Optional[bytes] = None
+        self._expect = None  # None | "colon" | "value" | "skip"
+        self._in_image = False
+        self._image_escape = False
+
+    def feed(self, chunk: bytes):
+        pos = 0
+        size = len(chunk)
+        while pos < size:
+            if self._in_image:
+                pos = self._feed_image(chunk, pos)
+                continue
+            if self._in_string:
+                pos = self._feed_string(chunk, pos)
+                continue
+            match = self._STRUCTURAL.search(chunk, pos)
+            end = match.start() if match else size
+            if end > pos:
+                run = chunk[pos:end]
+                self.json += run
+                if run.strip():
+                    # Число, true/false/null — значение, а не ключ
+                    self._expect = None
+                pos = end
+                continue
+            byte = chunk[pos]
+            pos += 1
+            if self._expect == "colon":
+                self._expect = "value" if byte == 0x3A else None
+                self.json.append(byte)
+                continue
+            if self._expect == "value":
+                self._expect = None
+                if byte == 0x22 and self._last_key == b"image":
+                    self.json += b"null"
+                    self.image = Base64StreamDecoder()
+                    self._in_image = True
+                    continue
+                if byte == 0x22:
+                    # Строковое значение, а не ключ — не запоминаем его как ключ
+                    self._expect = "skip"
+            elif self._expect == "skip":
+                self._expect = None
+            self.json.append(byte)
+            if byte == 0x22:
+                self._in_string = True
+                self._string_start = len(self.json)
+            elif byte in b"{[":
+                self._depth += 1
+            elif byte in b"}]":
+                self._depth -= 1
+
+    def _feed_string(self, chunk: bytes, pos: int) -> int:
+        if self._escape:
+            self._escape = False
+            self.json.append(chunk[pos])
+            return pos + 1
+        match = self._STRING_SPECIAL.search(chunk, pos)
+        if match is None:
+            self.json += chunk[pos:]
+            return len(chunk)
+        end = match.start()
+        self.json += chunk[pos:end + 1]
+        if chunk[end] == 0x5C:  # \
+            self._escape = True
+        else:
+            self._in_string = False
+            if self._depth == 1 and self._expect is None:
+                self._last_key = bytes(self.json[self._string_start:-1])
+                self._expect = "colon"
+        return end + 1
+
+    def _feed_image(self, chunk: bytes, pos: int) -> int:
+        end = chunk.find(b'"', pos)
+        part = chunk[pos:] if end == -1 else chunk[pos:end]
+        # JSON может экранировать "/" как "\/"; "\" на границе частей
+        # откладываем до следующего вызова
+        if self._image_escape:
+            part = b"\\" + part
+            self._image_escape = False
+        if part.endswith(b"\\") and end == -1:
+            self._image_escape = True
+            part = part[:-1]
+        if b"\\" in part:
+            part = part.replace(b"\\/", b"/")
+        self.image.feed(part)
+        if end == -1:
+            return len(chunk)
+        self._in_image = False
+        return end + 1
+
+    def result(self) -> Tuple[RawAlertSchema, Optional[bytes]]:
+        if self._in_image or self._in_string or self._depth:
+            raise ValueError("Тело запроса обрезано")
+        with validation_seconds.time("raw"):
+            raw = RawAlertSchema.model_validate(orjson.loads(self.json))
+        image = self.image.finish() if self.image is not None else None
+        return raw, image
+
+
+async def read_raw_alert(stream: AsyncIterable[bytes]) -> Tuple[RawAlertSchema, Optional[bytes]]:
+    """Читает сырую тревогу AIBox из потока тела запроса."""
+    reader = RawAlertReader()
+    async for chunk in stream:
+        reader.feed(chunk)
+    return reader.result()
+
+
+_recipients_cache: Tuple[float, List[int]] = (0.0, [])
+
+
+def raw_alert_recipients() -> List[int]:
+    """Получатели сырых тревог из USERS_JSON_PATH (перечитывается при изменении файла)."""
+    global _recipients_cache
+    try:
+        mtime = os.stat(config.USERS_JSON_PATH).st_mtime
+    except OSError:
+        return []
+    if mtime != _recipients_cache[0]:
+        _recipients_cache = (mtime, list(load_json(config.USERS_JSON_PATH).get("telegram_ids", [])))
+    return _recipients_cache[1]
+
+
+def raw_to_alert(raw: RawAlertSchema, image: Optional[bytes]) -> AlertSchema:
+    """Переводит сырую тревогу AIBox в `AlertSchema` для общего пути отправки.
+
+    У сырой тревоги нет записи в Django, поэтому числовые ID равны 0,
+    а кнопки подтверждения не добавляются. Некорректное время — `ValueError`.
+    """
+    try:
+        alert_time = datetime.fromtimestamp(raw.alert_time)
+    except (OverflowError, OSError, ValueError):
+        raise ValueError(f"Некорректное время тревоги: {raw.alert_time}")
+    alert = AlertSchema(
+        id=0,
+        aibox_alert_id=raw.id,
+        alert_time=alert_time,
+        device=DeviceSchema(id=0, aibox_id=raw.device.id, name=raw.device.name, desc=raw.device.desc),
+        source=SourceSchema(id=0, source_id=raw.source.id, ipv4=raw.source.ipv4, desc=raw.source.desc),
+        alg=AlgorithmSchema(id=0, key=raw.alg.name, name=raw.alg.ch_name or raw.alg.name, type=raw.alg.type),
+        hazard_level=raw.hazard_level,
+        reserved_data=raw.reserved_data,
+        company=CompanySchema(id=config.AIBOX_COMPANY_ID, name=config.AIBOX_COMPANY_NAME, description=None),
+        users_telegram_id=raw_alert_recipients(),
+        for_security=False,
+    )
+    alert.image_data = image
+    return alert
@@ -0,0 +1,301 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+from bot.schemas import AlertSchema
+from bot.services.metrics import alert_shed, lane_delivery_seconds, queue_wait_seconds
+
+AlertHandler = Callable[[AlertSchema], Awaitable[None]]
+DigestHandler = Callable[[List[AlertSchema]], Awaitable[None]]
+ShedHandler = Callable[[AlertSchema], Awaitable[None]]
+
+# Полосы в порядке убывания приоритета
+SECURITY, HIGH, NORMAL = "security", "high", "normal"
+# Ступени деградации для отстающих полос
+SHED_TEXT, SHED_DIGEST, SHED_DROP = "text", "digest", "drop"
+
+
+class QueueFullError(Exception):
+    """Очередь тревог заполнена — клиент должен повторить запрос позже."""
+
+
+class _Lane:
+    __slots__ = ("name", "weight", "sheddable", "items", "current")
+
+    def __init__(self, name: str, weight: int, sheddable: bool):
+        self.name = name
+        self.weight = weight
+        self.sheddable = sheddable
+        self.items: Deque[Tuple[float, AlertSchema]] = deque()
+        # Текущий вес для плавного взвешенного round-robin
+        self.current = 0
+
+
+class AlertQueue:
+    """Ограниченная очередь тревог с приоритетными полосами и пулом asyncio-воркеров.
+
+    `put_nowait` не ждёт отправки в Telegram: тревога кладётся в полосу,
+    а воркеры разбирают полосы в фоне. При переполнении выбрасывается
+    `QueueFullError`, чтобы API мог ответить 429.
+
+    Полосы: `security` (тревоги с кнопками охраны), `high` (уровни опасности из
+    `high_hazards`) и `normal`. Воркер выбирает полосу плавным взвешенным
+    round-robin по `weights`: при весах 8:4:1 поток обычных тревог получает
+    каждую 13-ю отправку и не задерживает тревоги охраны, но и не голодает.
+
+    Если тревога из полосы, кроме `security`, ждала в очереди дольше порога,
+    она деградирует: после `shed_after[text]` секунд уходит без фото, после
+    `shed_after[digest]` — попадает в сводку (отправляется раз в
+    `digest_interval`), после `shed_after[drop]` — отбрасывается. Порог 0
+    отключает ступень.
+
+    `hold()` до запуска оставляет воркеры ждать `resume()`: тревоги уже
+    принимаются, а отправка начнётся, когда будет готов клиент Telegram.
+    """
+
+    def __init__(
+        self,
+        handler: AlertHandler,
+        maxsize: int = 1000,
+        workers: int = 4,
+        weights: Optional[Dict[str, int]] = None,
+        high_hazards: Iterable[str] = (),
+        shed_after: Optional[Dict[str, float]] = None,
+        digest: Optional[DigestHandler] = None,
+        digest_interval: float = 60,
+        on_shed: Optional[ShedHandler] = None,
+    ):
+        self.handler = handler
+        self.maxsize = maxsize
+        self.workers = workers
+        weights = {SECURITY: 8, HIGH: 4, NORMAL: 1, **(weights or {})}
+        self.lanes: Dict[str, _Lane] = {
+            name: _Lane(name, weights[name], sheddable=name != SECURITY) for name in (SECURITY, HIGH, NORMAL)
+        }
+        self.high_hazards: FrozenSet[str] = frozenset(high_hazards)
+        self.shed_after = {SHED_TEXT: 0.0, SHED_DIGEST: 0.0, SHED_DROP: 0.0, **(shed_after or {})}
+        self.digest = digest
+        self.digest_interval = digest_interval
+        self.on_shed = on_shed
+        self._size = 0
+        self._unfinished = 0
+        self._not_empty: Optional[asyncio.Event] = None
+        self._not_full: Optional[asyncio.Event] = None
+        self._all_done: Optional[asyncio.Event] = None
+        self._held = False
+        self._resumed: Optional[asyncio.Event] = None
+        self._digest: List[AlertSchema] = []
+        self._digest_task: Optional[asyncio.Task] = None
+        self._tasks: List[asyncio.Task] = []
+        self.enqueued = 0
+        self.rejected = 0
+        self.processed = 0
+        self.failed = 0
+        self.in_progress = 0
+        self.shed: Dict[str, int] = {SHED_TEXT: 0, SHED_DIGEST: 0, SHED_DROP: 0}
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    def start(self):
+        """Запускает воркеры в текущем event loop."""
+        if self.running:
+            return
+        self._not_empty = asyncio.Event()
+        self._not_full = asyncio.Event()
+        self._not_full.set()
+        self._all_done = asyncio.Event()
+        self._all_done.set()
+        self._resumed = asyncio.Event()
+        if not self._held:
+            self._resumed.set()
+        self._tasks = [
+            asyncio.create_task(self._worker(n), name=f"alert-worker-{n}")
+            for n in range(self.workers)
+        ]
+        if self.digest is not None:
+            self._digest_task = asyncio.create_task(self._digest_loop(), name="alert-digest")
+        logging.info(f"Очередь тревог запущена: {self.workers} воркеров, размер {self.maxsize}")
+
+    def hold(self):
+        """Воркеры не берут тревоги до `resume()` (вызывается до `start()`)."""
+        self._held = True
+
+    def resume(self):
+        self._held = False
+        if self._resumed is not None:
+            self._resumed.set()
+
+    async def stop(self, timeout: float = 10.0):
+        """Дожидается опустошения очереди (не дольше `timeout`) и останавливает воркеры."""
+        if not self.running:
+            return
+        if not self._resumed.is_set():
+            # Отправка так и не началась: тревоги остаются в журнале доставок до следующего старта
+            logging.warning(f"Очередь тревог остановлена до начала отправки, осталось {self.depth}")
+        else:
+            try:
+                await asyncio.wait_for(self._all_done.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                logging.warning(f"Очередь тревог не опустела за {timeout} с, осталось {self.depth}")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._digest_task is not None:
+            self._digest_task.cancel()
+            await asyncio.gather(self._digest_task, return_exceptions=True)
+            self._digest_task = None
+            await self._flush_digest()
+
+    def lane_of(self, alert: AlertSchema) -> str:
+        if alert.for_security:
+            return SECURITY
+        if alert.hazard_level in self.high_hazards:
+            return HIGH
+        return NORMAL
+
+    def _push(self, alert: AlertSchema):
+        self.lanes[self.lane_of(alert)].items.append((time.monotonic(), alert))
+        self._size += 1
+        self._unfinished += 1
+        self.enqueued += 1
+        self._all_done.clear()
+        self._not_empty.set()
+        if self._size >= self.maxsize:
+            self._not_full.clear()
+
+    def put_nowait(self, alert: AlertSchema):
+        if not self.running:
+            raise RuntimeError("Очередь тревог не запущена. Вызовите start() при старте приложения.")
+        if self._size >= self.maxsize:
+            self.rejected += 1
+            raise QueueFullError(f"Очередь тревог заполнена ({self.maxsize})")
+        self._push(alert)
+
+    async def put(self, alert: AlertSchema):
+        """Ставит тревогу в очередь, дожидаясь свободного места (для повтора из журнала)."""
+        if not self.running:
+            raise RuntimeError("Очередь тревог не запущена. Вызовите start() при старте приложения.")
+        while self._size >= self.maxsize:
+            await self._not_full.wait()
+        self._push(alert)
+
+    def _pop(self) -> Tuple[_Lane, float, AlertSchema]:
+        """Плавный взвешенный round-robin по непустым полосам."""
+        total = 0
+        best = None
+        for lane in self.lanes.values():
+            if not lane.items:
+                continue
+            lane.current += lane.weight
+            total += lane.weight
+            if best is None or lane.current > best.current:
+                best = lane
+        best.current -= total
+        enqueued_at, alert = best.items.popleft()
+        self._size -= 1
+        if self._size < self.maxsize:
+            self._not_full.set()
+        return best, enqueued_at, alert
+
+    def _task_done(self):
+        self._unfinished -= 1
+        if not self._unfinished:
+            self._all_done.set()
+
+    @property
+    def depth(self) -> int:
+        return self._size
+
+    def oldest_age(self) -> float:
+        """Сколько секунд ждёт самая старая тревога в очереди."""
+        heads = [lane.items[0][0] for lane in self.lanes.values() if lane.items]
+        return time.monotonic() - min(heads) if heads else 0.0
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        return {
+            "depth": self.depth,
+            "maxsize": self.maxsize,
+            "oldest_age": round(self.oldest_age(), 3),
+            "workers": len(self._tasks),
+            "held": self._held,
+            "in_progress": self.in_progress,
+            "enqueued": self.enqueued,
+            "rejected": self.rejected,
+            "processed": self.processed,
+            "failed": self.failed,
+            "lanes": {
+                lane.name: {
+                    "depth": len(lane.items),
+                    "weight": lane.weight,
+                    "oldest_age": round(now - lane.items[0][0], 3) if lane.items else 0.0,
+                }
+                for lane in self.lanes.values()
+            },
+            "shed": dict(self.shed),
+            "digest_pending": len(self._digest),
+        }
+
+    def _shed_level(self, lane: _Lane, waited: float) -> Optional[str]:
+        if not lane.sheddable:
+            return None
+        for level in (SHED_DROP, SHED_DIGEST, SHED_TEXT):
+            threshold = self.shed_after[level]
+            if threshold and waited >= threshold:
+                if level == SHED_DIGEST and self.digest is None:
+                    continue
+                return level
+        return None
+
+    async def _worker(self, n: int):
+        await self._resumed.wait()
+        while True:
+            while not self._size:
+                self._not_empty.clear()
+                await self._not_empty.wait()
+            lane, enqueued_at, alert = self._pop()
+            waited = time.monotonic() - enqueued_at
+            queue_wait_seconds.observe(waited, lane.name)
+            self.in_progress += 1
+            try:
+                level = self._shed_level(lane, waited)
+                if level is not None:
+                    self.shed[level] += 1
+                    alert_shed.inc(lane.name, level)
+                if level == SHED_DROP or level == SHED_DIGEST:
+                    if level == SHED_DIGEST:
+                        self._digest.append(alert)
+                    elif self.on_shed is not None:
+                        await self.on_shed(alert)
+                    continue
+                if level == SHED_TEXT:
+                    alert = alert.without_image()
+                started = time.monotonic()
+                await self.handler(alert)
+                lane_delivery_seconds.observe(time.monotonic() - started, lane.name)
+                self.processed += 1
+            except Exception as e:
+                self.failed += 1
+                logging.error(f"Ошибка доставки тревоги {alert.id} (воркер {n}): {e}")
+            finally:
+                self.in_progress -= 1
+                self._task_done()
+
+    async def _flush_digest(self):
+        if not self._digest:
+            return
+        alerts, self._digest = self._digest, []
+        try:
+            await self.digest(alerts)
+        except Exception as e:
+            logging.error(f"Ошибка отправки сводки по {len(alerts)} тревогам: {e}")
+
+    async def _digest_loop(self):
+        while True:
+            await asyncio.sleep(self.digest_interval)
+            await self._flush_digest()
@@ -0,0 +1,194 @@
+import asyncio
+import logging
+import random
+import time
+from typing import Optional
+
+import httpx
+
+from bot import config
+from bot.services.metrics import django_request_seconds
+
+
+class DjangoAPIUnavailable(Exception):
+    """Django API недоступен: сетевая ошибка после всех повторов или открыт circuit breaker."""
+
+
+class CircuitBreaker:
+    """Размыкается после `failure_threshold` неудачных запросов подряд и
+    `reset_timeout` секунд сразу отказывает в запросах. Затем пропускает один
+    пробный запрос (half-open): успех замыкает цепь, ошибка снова размыкает её.
+    Запрос со всеми его повторами считается одной ошибкой."""
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probe_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half-open" and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._probe_in_flight = False
+
+    def release_probe(self):
+        """Пробный запрос завершился без ответа (отменён или упал): пропускаем следующий."""
+        self._probe_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._probe_in_flight = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            if self.opened_at is None:
+                logging.warning(f"Django API недоступен, circuit breaker разомкнут на {self.reset_timeout} с")
+            self.opened_at = time.monotonic()
+
+
+class DjangoAPIClient:
+    """Общий HTTP-клиент для всех запросов бота к Django.
+
+    Держит keep-alive пул соединений (опционально HTTP/2), задаёт таймауты
+    по эндпоинтам, повторяет временные ошибки с экспоненциальной задержкой
+    и через circuit breaker быстро отказывает, пока Django лежит.
+    """
+
+    # Таймауты (в секундах) по эндпоинтам
+    TIMEOUTS = {
+        "send_action": 5.0,
+        "send_actions": 15.0,
+        "alert_stats": 15.0,
+        "register_telegram": 10.0,
+    }
+
+    def __init__(
+        self,
+        base_url: str,
+        http2: bool = False,
+        max_retries: int = 2,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        self.base_url = base_url or ""
+        self.http2 = http2
+        self.max_retries = max_retries
+        self.breaker = breaker or CircuitBreaker()
+        self._client: Optional[httpx.AsyncClient] = None
+
+    async def start(self):
+        self._get_client()
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+        self._client = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            http2 = self.http2
+            if http2:
+                try:
+                    import h2  # noqa: F401
+                except ImportError:
+                    logging.warning("Пакет h2 не установлен, Django API работает по HTTP/1.1")
+                    http2 = False
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                http2=http2,
+                limits=httpx.Limits(max_connections=50, max_keepalive_connections=20, keepalive_expiry=60),
+            )
+        return self._client
+
+    async def request(self, method: str, path: str, endpoint: str, **kwargs) -> httpx.Response:
+        """Выполняет запрос к Django с повторами и circuit breaker.
+
+        Ответы 5xx повторяются и в итоге возвращаются как есть; сетевые ошибки
+        после последней попытки превращаются в `DjangoAPIUnavailable`.
+        """
+        timeout = self.TIMEOUTS.get(endpoint, 10.0)
+        probe = self.breaker.state != "closed"
+        if not self.breaker.allow():
+            raise DjangoAPIUnavailable(f"Django API недоступен (circuit breaker), запрос {endpoint} отклонён")
+        # Итог запроса для circuit breaker: True — успех, False — ошибка, None — не дошли до ответа
+        succeeded: Optional[bool] = None
+        attempt = 0
+        try:
+            while True:
+                started = time.perf_counter()
+                try:
+                    response = await self._get_client().request(method, path, timeout=timeout, **kwargs)
+                except httpx.TransportError as e:
+                    django_request_seconds.observe(time.perf_counter() - started, endpoint, "error")
+                    # POST повторяем, только если запрос точно не дошёл до сервера
+                    retryable = method == "GET" or isinstance(e, (httpx.ConnectError, httpx.ConnectTimeout))
+                    if not retryable or attempt >= self.max_retries:
+                        succeeded = False
+                        raise DjangoAPIUnavailable(f"Ошибка запроса {endpoint} к Django API: {e!r}") from e
+                else:
+                    django_request_seconds.observe(time.perf_counter() - started, endpoint, f"{response.status_code // 100}xx")
+                    if response.status_code < 500:
+                        succeeded = True
+                        return response
+                    if attempt >= self.max_retries:
+                        succeeded = False
+                        return response
+                attempt += 1
+                await asyncio.sleep(random.uniform(0, 0.3 * 2 ** attempt))
+        finally:
+            if succeeded:
+                self.breaker.record_success()
+            elif succeeded is False:
+                self.breaker.record_failure()
+            elif probe:
+                # Отмена или непредвиденная ошибка (например, DecodingError) в пробном запросе
+                self.breaker.release_probe()
+
+    async def send_action(self, alert_id, action: str) -> httpx.Response:
+        return await self.request(
+            "POST", f"api/algorithms/v1/alerts/{alert_id}/send-action/", "send_action",
+            json={"action": action},
+        )
+
+    async def send_actions(self, path: str, actions: list) -> httpx.Response:
+        """Bulk-отправка решений: `{"actions": [{"alert_id", "action"}, ...]}`."""
+        return await self.request("POST", path, "send_actions", json={"actions": actions})
+
+    async def alert_stats(self, period: str = None, start: str = None, end: str = None) -> httpx.Response:
+        if period is not None:
+            params = {"period": period}
+        else:
+            params = {"start_date": start, "end_date": end}
+        return await self.request("GET", "api/algorithms/alert-stats/", "alert_stats", params=params)
+
+    async def register_telegram(self, telegram_id: int, token: str) -> httpx.Response:
+        return await self.request(
+            "POST", "api/users/v1/register_telegram/", "register_telegram",
+            json={"telegram_id": telegram_id, "token": token},
+        )
+
+    def stats(self) -> dict:
+        return {"circuit": self.breaker.state, "consecutive_failures": self.breaker.failures}
+
+
+django_api = DjangoAPIClient(
+    config.DJANGO_API_URL,
+    http2=config.DJANGO_HTTP2,
+    max_retries=config.DJANGO_API_RETRIES,
+    breaker=CircuitBreaker(config.DJANGO_BREAKER_THRESHOLD, config.DJANGO_BREAKER_RESET),
+)
@@ -0,0 +1,198 @@
+import asyncio
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import TYPE_CHECKING, Awaitable, Callable, Dict, Optional, Set, Tuple
+
+if TYPE_CHECKING:
+    # aiogram тяжёлый на импорт, а приёму тревог он не нужен
+    from aiogram.types import Message
+
+from bot.schemas import AlertSchema
+from bot.services.state import MemoryStateBackend, StateBackend
+
+GroupKey = Tuple[int, str, str]
+Deliver = Callable[[AlertSchema], Awaitable[Dict[int, "Message"]]]
+Update = Callable[[AlertSchema, Dict[int, "Message"], int, datetime], Awaitable[None]]
+Fold = Callable[[AlertSchema], Awaitable[None]]
+
+
+class _Group:
+    """Серия, первую тревогу которой отправил этот процесс: только он может отредактировать сообщения."""
+
+    __slots__ = ("series_id", "alert", "messages", "delivered", "timer")
+
+    def __init__(self, series_id: str, alert: AlertSchema):
+        self.series_id = series_id
+        self.alert = alert
+        self.messages: Dict[int, "Message"] = {}
+        self.delivered = asyncio.Event()
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+
+class AlertCoalescer:
+    """Сворачивает шторм одинаковых тревог перед доставкой.
+
+    Ключ серии — (компания, source_id камеры, ключ алгоритма). Первая тревога
+    серии отправляется сразу, следующие в течение `window` секунд только
+    считаются. По окончании окна исходное сообщение редактируется:
+    к нему дописывается «ещё N тревог». Если первую тревогу отправить не
+    удалось, серия не открывается. Для каждой свёрнутой тревоги вызывается
+    `on_fold`, если он задан.
+
+    Запись серии (кто её открыл, отправлена ли первая тревога, сколько
+    свёрнуто) лежит в общем `StateBackend`, поэтому тревоги одной камеры
+    сворачиваются, в какой бы воркер они ни пришли. Сообщения первой тревоги
+    и таймер окна — у открывшего серию процесса; его индекс серий ограничен
+    `max_groups` записями, вытесненная серия закрывается досрочно.
+    """
+
+    # Запись серии живёт чуть дольше окна: её забирает таймер открывшего процесса
+    RECORD_GRACE = 60.0
+    # Как часто проверять серию, первая тревога которой отправляется в другом процессе
+    WAIT_INTERVAL = 0.05
+
+    def __init__(
+        self,
+        deliver: Deliver,
+        update: Update,
+        window: float = 30,
+        max_groups: int = 10000,
+        on_fold: Optional[Fold] = None,
+        backend: Optional[StateBackend] = None,
+    ):
+        self.deliver = deliver
+        self.update = update
+        self.on_fold = on_fold
+        self.window = window
+        self.max_groups = max_groups
+        self.backend = backend or MemoryStateBackend()
+        self._groups: "OrderedDict[GroupKey, _Group]" = OrderedDict()
+        self._flushes: Set[asyncio.Task] = set()
+        self.delivered = 0
+        self.folded = 0
+
+    @staticmethod
+    def key(alert: AlertSchema) -> GroupKey:
+        return alert.company.id, alert.source.source_id, alert.alg.key
+
+    @staticmethod
+    def _record_key(key: GroupKey) -> str:
+        return "coalesce:{}:{}:{}".format(*key)
+
+    async def handle(self, alert: AlertSchema) -> Dict[int, "Message"]:
+        """Обработчик для очереди тревог: отправляет тревогу или сворачивает её в текущую серию."""
+        if self.window <= 0:
+            self.delivered += 1
+            return await self.deliver(alert)
+
+        key = self.key(alert)
+        record_key = self._record_key(key)
+        series_id = uuid.uuid4().hex
+        alert_time = alert.alert_time.timestamp()
+        while True:
+            now = time.time()
+
+            def step(record):
+                if record is None or record["expires"] <= now:
+                    return {"id": series_id, "sent": False, "expires": now + self.window, "folded": 0, "last": alert_time}
+                if record["sent"]:
+                    return {**record, "folded": record["folded"] + 1, "last": max(record["last"], alert_time)}
+                return record
+
+            record = await self.backend.update(record_key, step, ttl=self.window + self.RECORD_GRACE)
+            if record["id"] == series_id:
+                break
+            if record["sent"]:
+                self.folded += 1
+                if self.on_fold is not None:
+                    await self.on_fold(alert)
+                return {}
+            # Сворачиваем, только когда первая тревога серии действительно отправлена
+            group = self._groups.get(key)
+            if group is not None and group.series_id == record["id"]:
+                await group.delivered.wait()
+            else:
+                await asyncio.sleep(self.WAIT_INTERVAL)
+
+        group = _Group(series_id, alert)
+        self._groups[key] = group
+        self._groups.move_to_end(key)
+        while len(self._groups) > self.max_groups:
+            old_key, old_group = self._groups.popitem(last=False)
+            self._schedule_flush(old_key, old_group)
+        group.timer = asyncio.get_running_loop().call_later(self.window, self._schedule_flush, key, group)
+
+        self.delivered += 1
+        try:
+            group.messages = await self.deliver(alert) or {}
+        finally:
+            try:
+                if group.messages:
+                    await self.backend.update(
+                        record_key, lambda record: {**record, "sent": True} if _owns(record, series_id) else record,
+                        ttl=self.window + self.RECORD_GRACE,
+                    )
+                else:
+                    # Ничего не отправлено: серию закрываем, и следующая тревога уйдёт как обычно
+                    self._drop(key, group)
+                    await self.backend.update(record_key, lambda record: None if _owns(record, series_id) else record)
+            finally:
+                group.delivered.set()
+        return group.messages
+
+    def _drop(self, key: GroupKey, group: _Group):
+        if group.timer is not None:
+            group.timer.cancel()
+            group.timer = None
+        if self._groups.get(key) is group:
+            del self._groups[key]
+
+    def _schedule_flush(self, key: GroupKey, group: _Group):
+        self._drop(key, group)
+        task = asyncio.create_task(self._flush(key, group))
+        self._flushes.add(task)
+        task.add_done_callback(self._flushes.discard)
+
+    async def _flush(self, key: GroupKey, group: _Group):
+        await group.delivered.wait()
+        if not group.messages:
+            return
+        closed = None
+
+        def close(record):
+            nonlocal closed
+            if _owns(record, group.series_id):
+                closed = record
+                return None
+            return record
+
+        try:
+            await self.backend.update(self._record_key(key), close)
+            if closed is None or not closed["folded"]:
+                return
+            last_time = datetime.fromtimestamp(closed["last"], tz=group.alert.alert_time.tzinfo)
+            await self.update(group.alert, group.messages, closed["folded"], last_time)
+        except Exception as e:
+            logging.error(f"Ошибка обновления свёрнутой тревоги {group.alert.aibox_alert_id}: {e}")
+
+    async def close(self):
+        """Закрывает все открытые серии (при остановке приложения)."""
+        for key, group in list(self._groups.items()):
+            self._schedule_flush(key, group)
+        if self._flushes:
+            await asyncio.gather(*self._flushes, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            "window": self.window,
+            "open_groups": len(self._groups),
+            "delivered": self.delivered,
+            "folded": self.folded,
+        }
+
+
+def _owns(record: Optional[dict], series_id: str) -> bool:
+    return record is not None and record["id"] == series_id
@@ -0,0 +1,622 @@
+import asyncio
+import logging
+import sqlite3
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+import orjson
+
+from bot import config
+from bot.schemas import AlertSchema
+
+# Статусы доставки одному получателю
+PENDING, SENT, FAILED, FOLDED, MUTED, SHED = "pending", "sent", "failed", "folded", "muted", "shed"
+# Недоставленная строка, которую процесс забрал на повторную отправку после перезапуска
+REPLAYING = "replaying"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox_alerts (
+    id INTEGER PRIMARY KEY,
+    aibox_alert_id TEXT NOT NULL,
+    payload BLOB NOT NULL,
+    image BLOB,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS outbox_deliveries (
+    alert_id INTEGER NOT NULL,
+    chat_id INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    message_id INTEGER,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (alert_id, chat_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS outbox_deliveries_pending
+    ON outbox_deliveries (alert_id) WHERE status = 'pending';
+"""
+
+Operation = Callable[[sqlite3.Connection, float], Any]
+
+
+class GroupCommitStore:
+    """База SQLite (WAL) с записью через один поток и групповым коммитом.
+
+    Операции, набежавшие, пока выполняется предыдущий коммит, уходят одной
+    транзакцией (не больше `batch_size`), поэтому стоимость fsync делится
+    на всю пачку. Раз в час вызывается `purge()` для очистки старых записей.
+    """
+
+    SCHEMA = ""
+    # Для логов и имён потоков/задач
+    NAME = "sqlite"
+    TITLE = "базу"
+
+    def __init__(self, path: str, batch_size: int = 500, retention: float = 7 * 24 * 3600):
+        self.path = path
+        self.batch_size = batch_size
+        self.retention = retention
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"{self.NAME}-sqlite")
+        self._conn: Optional[sqlite3.Connection] = None
+        self._ops: List[Tuple[Operation, asyncio.Future]] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._writer: Optional[asyncio.Task] = None
+        self._purge_task: Optional[asyncio.Task] = None
+        self._closing = False
+        self.batches = 0
+        self.operations = 0
+
+    # Поток SQLite
+
+    def _open(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = self._open()
+            conn.executescript(self.SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def _commit(self, ops: List[Operation]) -> List[Any]:
+        conn = self._connect()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            results = [op(conn, now) for op in ops]
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return results
+
+    async def _run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    # Групповой коммит
+
+    def _enqueue(self, op: Operation) -> asyncio.Future:
+        if self._writer is None:
+            raise RuntimeError(f"Запись в {self.TITLE} не запущена. Вызовите start() при старте приложения.")
+        future = asyncio.get_running_loop().create_future()
+        self._ops.append((op, future))
+        self._wakeup.set()
+        return future
+
+    async def _submit(self, op: Operation) -> Any:
+        return await self._enqueue(op)
+
+    def _submit_nowait(self, op: Operation):
+        """Ставит операцию в очередь записи, не дожидаясь коммита (ошибка попадёт в лог)."""
+        self._enqueue(op).add_done_callback(_consume_result)
+
+    async def _write_loop(self):
+        while True:
+            if not self._ops:
+                if self._closing:
+                    return
+                await self._wakeup.wait()
+                self._wakeup.clear()
+                continue
+            batch, self._ops = self._ops[:self.batch_size], self._ops[self.batch_size:]
+            try:
+                results = await self._run(self._commit, [op for op, _ in batch])
+            except Exception as e:
+                logging.error(f"Ошибка записи в {self.TITLE} ({len(batch)} операций): {e}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            self.batches += 1
+            self.operations += len(batch)
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+    async def start(self):
+        await self._run(self._connect)
+        self._closing = False
+        self._wakeup = asyncio.Event()
+        self._writer = asyncio.create_task(self._write_loop(), name=f"{self.NAME}-writer")
+        self._purge_task = asyncio.create_task(self._purge_loop(), name=f"{self.NAME}-purge")
+
+    async def close(self):
+        """Дописывает накопленные операции и закрывает базу."""
+        if self._writer is None:
+            return
+        self._purge_task.cancel()
+        await asyncio.gather(self._purge_task, return_exceptions=True)
+        self._closing = True
+        self._wakeup.set()
+        await self._writer
+        self._writer = None
+
+        def close_sync():
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+        await self._run(close_sync)
+
+    async def purge(self):
+        pass
+
+    async def _purge_loop(self):
+        while True:
+            try:
+                await self.purge()
+            except Exception as e:
+                logging.error(f"Не удалось очистить {self.TITLE}: {e}")
+            await asyncio.sleep(3600)
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "operations": self.operations,
+            "avg_batch": round(self.operations / self.batches, 1) if self.batches else 0,
+            "queued": len(self._ops),
+        }
+
+
+def _consume_result(future: asyncio.Future):
+    if not future.cancelled():
+        future.exception()
+
+
+class DeliveryOutbox(GroupCommitStore):
+    """Журнал доставок тревог, переживающий перезапуск процесса.
+
+    Принятая тревога записывается вместе со строкой `pending` на каждого
+    получателя до ответа 202. После отправки строки получают статус `sent`
+    (с `message_id` Telegram), `failed`, `folded` (тревога свёрнута в серию)
+    или `shed` (под нагрузкой ушла в сводку или отброшена).
+
+    При старте всё, что осталось в `pending` с прошлых запусков, отправляется
+    заново. Строки забираются атомарно (`pending` -> `replaying`), поэтому
+    процессы с общим файлом журнала не повторяют одну тревогу дважды.
+    Строки, принятые после открытия журнала (в том числе соседним
+    процессом), не забираются; `replaying` прошлого запуска — забираются снова.
+    """
+
+    SCHEMA = SCHEMA
+    NAME = "outbox"
+    TITLE = "журнал доставок"
+
+    def __init__(self, path: str, batch_size: int = 500, retention: float = 7 * 24 * 3600):
+        super().__init__(path, batch_size, retention)
+        self.started_at = 0.0
+        self.added = 0
+        self.replayed = 0
+
+    async def start(self):
+        self.started_at = time.time()
+        await super().start()
+
+    # Операции журнала
+
+    async def add(self, alert: AlertSchema) -> int:
+        """Записывает тревогу и её получателей; возвращает ID записи журнала после коммита."""
+        payload = alert.model_dump_json().encode()
+        recipients = list(dict.fromkeys(alert.users_telegram_id))
+
+        def op(conn, now):
+            cursor = conn.execute(
+                "INSERT INTO outbox_alerts (aibox_alert_id, payload, image, created_at) VALUES (?, ?, ?, ?)",
+                (alert.aibox_alert_id, payload, alert.image_data, now),
+            )
+            outbox_id = cursor.lastrowid
+            conn.executemany(
+                "INSERT INTO outbox_deliveries (alert_id, chat_id, status, updated_at) VALUES (?, ?, ?, ?)",
+                [(outbox_id, chat_id, PENDING, now) for chat_id in recipients],
+            )
+            return outbox_id
+
+        outbox_id = await self._submit(op)
+        self.added += 1
+        return outbox_id
+
+    async def discard(self, outbox_id: int):
+        """Удаляет запись тревоги, которую так и не приняли (например, очередь была полна)."""
+        def op(conn, now):
+            conn.execute("DELETE FROM outbox_deliveries WHERE alert_id = ?", (outbox_id,))
+            conn.execute("DELETE FROM outbox_alerts WHERE id = ?", (outbox_id,))
+        await self._submit(op)
+
+    async def mark_delivered(self, outbox_id: int, message_ids: Dict[int, int], muted: Iterable[int] = ()):
+        """Отмечает отправленные сообщения и получателей, отключивших такие тревоги (`muted`);
+        остальные получатели тревоги считаются неудачными."""
+        muted = list(muted)
+
+        def op(conn, now):
+            conn.executemany(
+                "UPDATE outbox_deliveries SET status = ?, message_id = ?, updated_at = ? "
+                "WHERE alert_id = ? AND chat_id = ?",
+                [(SENT, message_id, now, outbox_id, chat_id) for chat_id, message_id in message_ids.items()],
+            )
+            if muted:
+                conn.executemany(
+                    "UPDATE outbox_deliveries SET status = ?, updated_at = ? WHERE alert_id = ? AND chat_id = ?",
+                    [(MUTED, now, outbox_id, chat_id) for chat_id in muted],
+                )
+            conn.execute(
+                "UPDATE outbox_deliveries SET status = ?, updated_at = ? WHERE alert_id = ? AND status IN (?, ?)",
+                (FAILED, now, outbox_id, PENDING, REPLAYING),
+            )
+        await self._submit(op)
+
+    async def mark_folded(self, outbox_id: int):
+        """Тревога свёрнута в уже отправленную серию — отдельно её слать не нужно."""
+        await self._submit(lambda conn, now: conn.execute(
+            "UPDATE outbox_deliveries SET status = ?, updated_at = ? WHERE alert_id = ? AND status IN (?, ?)",
+            (FOLDED, now, outbox_id, PENDING, REPLAYING),
+        ))
+
+    async def mark_shed(self, outbox_id: int):
+        """Тревога ушла в сводку или отброшена под нагрузкой — повторять её после перезапуска не нужно."""
+        await self._submit(lambda conn, now: conn.execute(
+            "UPDATE outbox_deliveries SET status = ?, updated_at = ? WHERE alert_id = ? AND status IN (?, ?)",
+            (SHED, now, outbox_id, PENDING, REPLAYING),
+        ))
+
+    def _claim(self, conn: sqlite3.Connection, now: float) -> List[AlertSchema]:
+        claimed = conn.execute(
+            "UPDATE outbox_deliveries SET status = ?, updated_at = ? "
+            "WHERE alert_id IN (SELECT id FROM outbox_alerts WHERE created_at < ?) "
+            "AND (status = ? OR (status = ? AND updated_at < ?)) "
+            "RETURNING alert_id, chat_id",
+            (REPLAYING, now, self.started_at, PENDING, REPLAYING, self.started_at),
+        ).fetchall()
+        recipients: Dict[int, List[int]] = {}
+        for outbox_id, chat_id in claimed:
+            recipients.setdefault(outbox_id, []).append(chat_id)
+        rows = conn.execute(
+            "SELECT id, payload, image FROM outbox_alerts WHERE id IN (SELECT value FROM json_each(?)) ORDER BY id",
+            (orjson.dumps(list(recipients)),),
+        ).fetchall() if recipients else []
+        alerts = []
+        for outbox_id, payload, image in rows:
+            try:
+                alert = AlertSchema.model_validate_json(payload)
+            except ValueError as e:
+                logging.error(f"Запись журнала доставок {outbox_id} повреждена: {e}")
+                continue
+            # Повторяем только тем получателям, до кого тревога не дошла
+            alert.users_telegram_id = sorted(recipients[outbox_id])
+            alert.image_data = image
+            alert.outbox_id = outbox_id
+            alerts.append(alert)
+        return alerts
+
+    async def pending(self) -> List[AlertSchema]:
+        """Забирает тревоги с недоставленными получателями (в порядке приёма) на повторную отправку."""
+        alerts = await self._submit(self._claim)
+        self.replayed += len(alerts)
+        return alerts
+
+    async def purge(self):
+        """Удаляет завершённые записи старше `retention` секунд."""
+        def op(conn, now):
+            stale = "SELECT id FROM outbox_alerts WHERE created_at < ? AND id NOT IN " \
+                    "(SELECT alert_id FROM outbox_deliveries WHERE status IN ('pending', 'replaying'))"
+            cutoff = now - self.retention
+            conn.execute(f"DELETE FROM outbox_deliveries WHERE alert_id IN ({stale})", (cutoff,))
+            return conn.execute(f"DELETE FROM outbox_alerts WHERE id IN ({stale})", (cutoff,)).rowcount
+        removed = await self._submit(op)
+        if removed:
+            logging.info(f"Из журнала доставок удалено {removed} старых тревог")
+
+    def stats(self) -> dict:
+        return {"added": self.added, **super().stats(), "replayed": self.replayed}
+
+
+# Статусы тревоги в истории
+STATUS_NEW, STATUS_CONFIRMED, STATUS_REJECTED = 0, 1, 2
+ACTION_STATUSES = {"confirm": STATUS_CONFIRMED, "reject": STATUS_REJECTED}
+
+HISTORY_SCHEMA = """
+CREATE TABLE IF NOT EXISTS alert_history (
+    id INTEGER PRIMARY KEY,
+    aibox_alert_id TEXT NOT NULL,
+    alert_id INTEGER NOT NULL,
+    company_id INTEGER NOT NULL,
+    source_id TEXT NOT NULL,
+    alg_key TEXT NOT NULL,
+    alert_time REAL NOT NULL,
+    status INTEGER NOT NULL DEFAULT 0,
+    summary BLOB NOT NULL,
+    file_id TEXT
+);
+CREATE INDEX IF NOT EXISTS history_company ON alert_history (company_id, alert_time, id);
+CREATE INDEX IF NOT EXISTS history_source ON alert_history (company_id, source_id, alert_time, id);
+CREATE INDEX IF NOT EXISTS history_alg ON alert_history (company_id, alg_key, alert_time, id);
+CREATE INDEX IF NOT EXISTS history_status ON alert_history (company_id, status, alert_time, id);
+CREATE INDEX IF NOT EXISTS history_time ON alert_history (alert_time);
+CREATE INDEX IF NOT EXISTS history_aibox ON alert_history (aibox_alert_id);
+CREATE INDEX IF NOT EXISTS history_alert ON alert_history (alert_id) WHERE alert_id > 0;
+CREATE TABLE IF NOT EXISTS history_chats (
+    chat_id INTEGER NOT NULL,
+    company_id INTEGER NOT NULL,
+    PRIMARY KEY (chat_id, company_id)
+) WITHOUT ROWID;
+"""
+
+Cursor = Tuple[float, int]
+# Сколько последних камер и алгоритмов предлагать в фильтрах и за какой срок брать их при старте
+RECENT_VALUES = 8
+RECENT_WINDOW = 7 * 24 * 3600
+
+
+class AlertHistory(GroupCommitStore):
+    """Локальная история принятых тревог с индексами под фильтры /history.
+
+    Каждый фильтр (камера, алгоритм, статус) — отдельный составной индекс
+    `(company_id, фильтр, alert_time, id)`, поэтому выборка страницы — это
+    спуск по индексу и чтение `limit` строк при любом объёме таблицы.
+    Страницы листаются по ключу `(alert_time, id)` последней строки, без OFFSET.
+
+    Запись не задерживает приём тревог: операции ставятся в очередь группового
+    коммита без ожидания. Чтение идёт через отдельное соединение в своём потоке
+    (WAL не блокирует читателей). Старше `retention` секунд записи удаляются
+    порциями, освободившиеся страницы возвращаются через incremental vacuum.
+
+    С `shared=True` в файл пишут и другие процессы (несколько воркеров):
+    перед показом истории чата `refresh_chat` перечитывает его компании и
+    недавние значения фильтров из файла.
+    """
+
+    SCHEMA = HISTORY_SCHEMA
+    NAME = "history"
+    TITLE = "историю тревог"
+    PURGE_CHUNK = 10000
+
+    def __init__(self, path: str, batch_size: int = 500, retention: float = 90 * 24 * 3600, shared: bool = False):
+        super().__init__(path, batch_size, retention)
+        self.shared = shared
+        self._reader = ThreadPoolExecutor(max_workers=1, thread_name_prefix="history-read")
+        self._read_conn: Optional[sqlite3.Connection] = None
+        # chat_id -> компании, тревоги которых получал чат (права на просмотр истории)
+        self._chats: Dict[int, Set[int]] = {}
+        # (company_id, "source_id" | "alg_key") -> недавние значения для кнопок фильтра
+        self._recent: Dict[Tuple[int, str], "OrderedDict[str, None]"] = {}
+        self.recorded = 0
+        self.queries = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = self._open()
+            # Должно быть задано до создания таблиц, иначе VACUUM не сможет возвращать место частями
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            conn.executescript(self.SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def _load(self) -> Tuple[List[tuple], List[tuple]]:
+        conn = self._connect()
+        chats = conn.execute("SELECT chat_id, company_id FROM history_chats").fetchall()
+        recent = conn.execute(
+            "SELECT company_id, source_id, alg_key FROM alert_history WHERE alert_time >= ? "
+            "GROUP BY company_id, source_id, alg_key ORDER BY MAX(alert_time)",
+            (time.time() - RECENT_WINDOW,),
+        ).fetchall()
+        return chats, recent
+
+    async def start(self):
+        await super().start()
+        chats, recent = await self._run(self._load)
+        for chat_id, company_id in chats:
+            self._chats.setdefault(chat_id, set()).add(company_id)
+        for company_id, source_id, alg_key in recent:
+            self._remember(company_id, source_id, alg_key)
+
+    def _remember(self, company_id: int, source_id: str, alg_key: str):
+        for kind, value in (("source_id", source_id), ("alg_key", alg_key)):
+            values = self._recent.setdefault((company_id, kind), OrderedDict())
+            values[value] = None
+            values.move_to_end(value)
+            if len(values) > RECENT_VALUES:
+                values.popitem(last=False)
+
+    async def close(self):
+        await super().close()
+
+        def close_sync():
+            if self._read_conn is not None:
+                self._read_conn.close()
+                self._read_conn = None
+        await asyncio.get_running_loop().run_in_executor(self._reader, close_sync)
+
+    # Запись
+
+    def record(self, alert: AlertSchema):
+        """Добавляет принятую тревогу в историю (без ожидания коммита)."""
+        company_id = alert.company.id
+        summary = orjson.dumps({
+            "device": alert.device.name,
+            "ipv4": alert.source.ipv4,
+            "alg": alert.alg.name,
+        })
+        new_chats = [chat_id for chat_id in alert.users_telegram_id if company_id not in self._chats.get(chat_id, ())]
+        for chat_id in new_chats:
+            self._chats.setdefault(chat_id, set()).add(company_id)
+        self._remember(company_id, alert.source.source_id, alert.alg.key)
+        row = (
+            alert.aibox_alert_id, alert.id, company_id, alert.source.source_id, alert.alg.key,
+            alert.alert_time.timestamp(), summary,
+        )
+
+        def op(conn, now):
+            conn.execute(
+                "INSERT INTO alert_history "
+                "(aibox_alert_id, alert_id, company_id, source_id, alg_key, alert_time, summary) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                row,
+            )
+            if new_chats:
+                conn.executemany(
+                    "INSERT OR IGNORE INTO history_chats (chat_id, company_id) VALUES (?, ?)",
+                    [(chat_id, company_id) for chat_id in new_chats],
+                )
+
+        self._submit_nowait(op)
+        self.recorded += 1
+
+    def set_file_id(self, aibox_alert_id: str, file_id: str):
+        """Запоминает file_id фото тревоги — история показывает фото без повторной загрузки."""
+        self._submit_nowait(lambda conn, now: conn.execute(
+            "UPDATE alert_history SET file_id = ? WHERE aibox_alert_id = ?", (file_id, aibox_alert_id)
+        ))
+
+    def set_status(self, alert_id: int, action: str):
+        """Отмечает подтверждение или отклонение тревоги (по ID тревоги в Django)."""
+        self._submit_nowait(lambda conn, now: conn.execute(
+            "UPDATE alert_history SET status = ? WHERE alert_id = ?", (ACTION_STATUSES[action], alert_id)
+        ))
+
+    async def purge(self):
+        """Удаляет записи старше `retention` порциями по PURGE_CHUNK строк и возвращает место на диске."""
+        cutoff = time.time() - self.retention
+        removed = 0
+        while True:
+            chunk = await self._submit(lambda conn, now: conn.execute(
+                "DELETE FROM alert_history WHERE id IN "
+                "(SELECT id FROM alert_history WHERE alert_time < ? LIMIT ?)",
+                (cutoff, self.PURGE_CHUNK),
+            ).rowcount)
+            removed += chunk
+            if chunk < self.PURGE_CHUNK:
+                break
+        if removed:
+            await self._run(lambda: self._connect().execute("PRAGMA incremental_vacuum").fetchall())
+            logging.info(f"Из истории тревог удалено {removed} старых записей")
+
+    # Чтение
+
+    def companies(self, chat_id: int) -> List[int]:
+        """Компании, тревоги которых получал чат."""
+        return sorted(self._chats.get(chat_id, ()))
+
+    def recent(self, companies: List[int], kind: str) -> List[str]:
+        """Недавние камеры (`source_id`) или алгоритмы (`alg_key`) компаний — для кнопок фильтра."""
+        values: Dict[str, None] = {}
+        for company_id in companies:
+            values.update(dict.fromkeys(reversed(self._recent.get((company_id, kind), {}))))
+        return list(values)[:RECENT_VALUES]
+
+    def _chat_sync(self, chat_id: int, since: float) -> List[Tuple[int, List[tuple]]]:
+        if self._read_conn is None:
+            self._read_conn = self._open()
+        companies = [row[0] for row in self._read_conn.execute(
+            "SELECT company_id FROM history_chats WHERE chat_id = ?", (chat_id,)
+        ).fetchall()]
+        return [
+            (company_id, self._read_conn.execute(
+                "SELECT source_id, alg_key FROM alert_history WHERE company_id = ? AND alert_time >= ? "
+                "GROUP BY source_id, alg_key ORDER BY MAX(alert_time)",
+                (company_id, since),
+            ).fetchall())
+            for company_id in companies
+        ]
+
+    async def refresh_chat(self, chat_id: int):
+        """Подхватывает тревоги чата, принятые другими процессами (только при `shared`)."""
+        if not self.shared:
+            return
+        rows = await asyncio.get_running_loop().run_in_executor(
+            self._reader, self._chat_sync, chat_id, time.time() - RECENT_WINDOW
+        )
+        for company_id, recent in rows:
+            self._chats.setdefault(chat_id, set()).add(company_id)
+            for source_id, alg_key in recent:
+                self._remember(company_id, source_id, alg_key)
+
+    def _query_sync(self, sql: str, params_by_company: List[tuple]) -> List[tuple]:
+        if self._read_conn is None:
+            self._read_conn = self._open()
+        return [row for params in params_by_company for row in self._read_conn.execute(sql, params).fetchall()]
+
+    async def query(
+        self,
+        companies: List[int],
+        since: float,
+        source_id: Optional[str] = None,
+        alg_key: Optional[str] = None,
+        status: Optional[int] = None,
+        before: Optional[Cursor] = None,
+        limit: int = 5,
+    ) -> List[dict]:
+        """Страница истории, от новых к старым; `before` — ключ последней строки прошлой страницы."""
+        conditions = ["company_id = ?"]
+        values: list = []
+        # Фильтр, для которого есть индекс, идёт первым — по нему SQLite и выберет индекс
+        for column, value in (("source_id", source_id), ("alg_key", alg_key), ("status", status)):
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                values.append(value)
+        conditions.append("alert_time >= ?")
+        values.append(since)
+        if before is not None:
+            conditions.append("(alert_time, id) < (?, ?)")
+            values.extend(before)
+        sql = (
+            "SELECT id, aibox_alert_id, alert_id, company_id, source_id, alg_key, alert_time, status, summary, file_id "
+            f"FROM alert_history WHERE {' AND '.join(conditions)} ORDER BY alert_time DESC, id DESC LIMIT ?"
+        )
+        # По компании отдельный запрос: с IN (...) SQLite пришлось бы сортировать все подходящие строки
+        params = [(company_id, *values, limit) for company_id in companies]
+        rows = await asyncio.get_running_loop().run_in_executor(self._reader, self._query_sync, sql, params)
+        self.queries += 1
+        rows.sort(key=lambda row: (row[6], row[0]), reverse=True)
+        return [
+            {
+                "id": row[0],
+                "aibox_alert_id": row[1],
+                "alert_id": row[2],
+                "company_id": row[3],
+                "source_id": row[4],
+                "alg_key": row[5],
+                "alert_time": row[6],
+                "status": row[7],
+                **orjson.loads(row[8]),
+                "file_id": row[9],
+            }
+            for row in rows[:limit]
+        ]
+
+    def stats(self) -> dict:
+        return {"recorded": self.recorded, "queries": self.queries, "chats": len(self._chats), **super().stats()}
+
+
+outbox = DeliveryOutbox(
+    config.OUTBOX_PATH,
+    batch_size=config.OUTBOX_BATCH_SIZE,
+    retention=config.OUTBOX_RETENTION,
+)
+
+history = AlertHistory(
+    config.HISTORY_PATH,
+    batch_size=config.OUTBOX_BATCH_SIZE,
+    retention=config.HISTORY_RETENTION,
+    shared=config.WEB_WORKERS > 1,
+)
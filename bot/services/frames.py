@@ -0,0 +1,151 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from typing import Deque, Optional, Tuple
+
+from bot import config
+from bot.schemas import AlertSchema
+from bot.services.metrics import registry
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow есть в requirements.txt; без него сравнение кадров выключено
+    Image = None
+
+frame_hash_seconds = registry.histogram(
+    "bot_alert_frame_hash_seconds", "Вычисление перцептивного хэша кадра тревоги",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1),
+)
+frame_dedup_results = registry.counter(
+    "bot_alert_frame_dedup_total", "Проверки кадров тревог на почти-дубликаты по результату", ["outcome"]
+)
+
+HASH_SIZE = 8
+
+CameraKey = Tuple[int, str]
+# (хэш, время, ключ алгоритма, aibox_alert_id)
+RingEntry = Tuple[int, float, str, str]
+
+
+def dhash(data: bytes, size: int = HASH_SIZE) -> int:
+    """Разностный хэш (dHash) изображения: `size * size` бит, соседние пиксели по строкам.
+
+    JPEG декодируется сразу в градациях серого и в уменьшенном масштабе,
+    а сведение к (size + 1) x size делает Pillow — в Python остаётся только
+    сборка 64 бит.
+    """
+    with Image.open(BytesIO(data)) as image:
+        image.draft("L", (size * 8, size * 8))
+        pixels = image.convert("L").resize((size + 1, size), Image.Resampling.BOX).tobytes()
+    bits = 0
+    for row in range(0, len(pixels), size + 1):
+        for col in range(row, row + size):
+            bits = (bits << 1) | (pixels[col + 1] > pixels[col])
+    return bits
+
+
+class FrameDeduplicator:
+    """Находит почти одинаковые кадры тревог одной камеры.
+
+    Для каждого кадра в пуле потоков считается dHash, затем он сравнивается
+    по расстоянию Хэмминга с кольцом из `ring_size` последних кадров той же
+    камеры и того же алгоритма не старше `window` секунд. Кадр в пределах
+    `threshold` бит считается дубликатом и в кольцо не добавляется: при
+    неподвижной сцене тревога повторяется не чаще раза в `window`.
+    Кольца хранятся в LRU на `max_cameras` камер.
+    """
+
+    def __init__(
+        self,
+        threshold: int = 6,
+        ring_size: int = 16,
+        window: float = 600,
+        max_cameras: int = 10000,
+        workers: int = 1,
+        enabled: bool = True,
+    ):
+        self.threshold = threshold
+        self.ring_size = ring_size
+        self.window = window
+        self.max_cameras = max_cameras
+        self.workers = workers
+        self.enabled = enabled
+        if self.enabled and Image is None:
+            logging.error("ALERT_FRAME_DEDUP=1, но Pillow не установлен (pip install -r requirements.txt): кадры тревог не сравниваются")
+            self.enabled = False
+        self._rings: "OrderedDict[CameraKey, Deque[RingEntry]]" = OrderedDict()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.unique = 0
+        self.duplicates = 0
+        self.errors = 0
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="frame-hash")
+        return self._executor
+
+    async def check(self, alert: AlertSchema, data: bytes) -> Optional[str]:
+        """aibox_alert_id похожего недавнего кадра или None, если кадр новый (тогда он запоминается)."""
+        started = time.perf_counter()
+        try:
+            frame_hash = await asyncio.get_running_loop().run_in_executor(self._get_executor(), dhash, data)
+        except Exception as e:
+            self.errors += 1
+            frame_dedup_results.inc("error")
+            logging.error(f"Не удалось вычислить хэш кадра тревоги {alert.aibox_alert_id}: {e}")
+            return None
+        frame_hash_seconds.observe(time.perf_counter() - started)
+        # Сравнение и запись — без await между ними, чтобы два одинаковых кадра
+        # от параллельных воркеров не прошли оба
+        return self.match(alert, frame_hash, time.monotonic())
+
+    def match(self, alert: AlertSchema, frame_hash: int, now: float) -> Optional[str]:
+        key = (alert.company.id, alert.source.source_id)
+        ring = self._rings.get(key)
+        if ring is None:
+            ring = self._rings[key] = deque(maxlen=self.ring_size)
+            if len(self._rings) > self.max_cameras:
+                self._rings.popitem(last=False)
+        else:
+            self._rings.move_to_end(key)
+        algorithm = alert.alg.key
+        for other_hash, seen_at, other_algorithm, aibox_alert_id in ring:
+            if (
+                other_algorithm == algorithm
+                and now - seen_at < self.window
+                and (frame_hash ^ other_hash).bit_count() <= self.threshold
+            ):
+                self.duplicates += 1
+                frame_dedup_results.inc("duplicate")
+                return aibox_alert_id
+        ring.append((frame_hash, now, algorithm, alert.aibox_alert_id))
+        self.unique += 1
+        frame_dedup_results.inc("unique")
+        return None
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "threshold": self.threshold,
+            "cameras": len(self._rings),
+            "unique": self.unique,
+            "duplicates": self.duplicates,
+            "errors": self.errors,
+        }
+
+
+frame_dedup = FrameDeduplicator(
+    threshold=config.ALERT_FRAME_DEDUP_THRESHOLD,
+    ring_size=config.ALERT_FRAME_DEDUP_RING,
+    window=config.ALERT_FRAME_DEDUP_WINDOW,
+    max_cameras=config.ALERT_FRAME_DEDUP_MAX_CAMERAS,
+    enabled=config.ALERT_FRAME_DEDUP,
+)
@@ -0,0 +1,43 @@
+from typing import Any, Dict, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+
+from bot.services.state import StateBackend
+
+
+class BackendFSMStorage(BaseStorage):
+    """FSM-хранилище aiogram поверх `StateBackend`."""
+
+    def __init__(self, backend: StateBackend, ttl: Optional[float] = None):
+        self.backend = backend
+        self.ttl = ttl
+
+    @staticmethod
+    def _key(key: StorageKey, part: str) -> str:
+        return (
+            f"fsm:{key.bot_id}:{key.chat_id}:{key.user_id}:{key.thread_id}:"
+            f"{key.business_connection_id}:{key.destiny}:{part}"
+        )
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        state = state.state if isinstance(state, State) else state
+        if state is None:
+            await self.backend.delete(self._key(key, "state"))
+        else:
+            await self.backend.set(self._key(key, "state"), state, ttl=self.ttl)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return await self.backend.get(self._key(key, "state"))
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        if not data:
+            await self.backend.delete(self._key(key, "data"))
+        else:
+            await self.backend.set(self._key(key, "data"), dict(data), ttl=self.ttl)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        return dict(await self.backend.get(self._key(key, "data")) or {})
+
+    async def close(self) -> None:
+        pass
@@ -0,0 +1,187 @@
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+import aiohttp
+
+from bot import config
+from bot.services.metrics import image_fetch_seconds
+
+
+class ImageCache:
+    """LRU-кэш изображений, ограниченный суммарным размером в байтах.
+
+    Ключ — URL (или путь к локальному файлу). Одинаковое содержимое под
+    разными URL хранится один раз: байты индексируются по SHA-1.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._by_key: "OrderedDict[str, str]" = OrderedDict()
+        self._by_hash: Dict[str, bytes] = {}
+        self._refs: Dict[str, int] = {}
+
+    def get(self, key: str) -> Optional[bytes]:
+        digest = self._by_key.get(key)
+        if digest is None:
+            return None
+        self._by_key.move_to_end(key)
+        return self._by_hash[digest]
+
+    def put(self, key: str, data: bytes) -> bytes:
+        if len(data) > self.max_bytes:
+            return data
+        if key in self._by_key:
+            self._release(self._by_key.pop(key))
+        digest = hashlib.sha1(data).hexdigest()
+        if digest in self._by_hash:
+            data = self._by_hash[digest]
+            self._refs[digest] += 1
+        else:
+            self._by_hash[digest] = data
+            self._refs[digest] = 1
+            self.size += len(data)
+        self._by_key[key] = digest
+        while self.size > self.max_bytes and self._by_key:
+            _, old_digest = self._by_key.popitem(last=False)
+            self._release(old_digest)
+        return data
+
+    def _release(self, digest: str):
+        self._refs[digest] -= 1
+        if not self._refs[digest]:
+            del self._refs[digest]
+            self.size -= len(self._by_hash.pop(digest))
+
+    def __len__(self):
+        return len(self._by_key)
+
+
+class ImageFetcher:
+    """Загружает изображения тревог в память через общий пул соединений.
+
+    Одновременные запросы одного URL объединяются в одну загрузку,
+    результат кладётся в `ImageCache`. Временные файлы не создаются.
+    """
+
+    def __init__(self, cache: ImageCache, timeout: float = 15):
+        self.cache = cache
+        self.timeout = timeout
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.downloads = 0
+        self.downloaded_bytes = 0
+        self.local_reads = 0
+        self.errors = 0
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                connector=aiohttp.TCPConnector(limit=100, ttl_dns_cache=300),
+            )
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def fetch(self, url: str) -> Optional[bytes]:
+        """Возвращает байты изображения по URL или None, если оно недоступно."""
+        return await self._get(url, self._download, url)
+
+    async def read_local(self, path: str) -> Optional[bytes]:
+        """Читает локальный файл одним вызовом read() в отдельном потоке."""
+        return await self._get(path, self._read_file, path)
+
+    async def content_length(self, url: str) -> Optional[int]:
+        """Размер файла по заголовку Content-Length (HEAD-запрос) или None, если он неизвестен."""
+        try:
+            async with self._get_session().head(url, allow_redirects=True) as resp:
+                if resp.status != 200:
+                    return None
+                return resp.content_length
+        except Exception as e:
+            logging.warning(f"Не удалось узнать размер файла {url}: {e}")
+            return None
+
+    async def _get(self, key: str, loader, arg) -> Optional[bytes]:
+        data = self.cache.get(key)
+        if data is not None:
+            self.hits += 1
+            return data
+        future = self._inflight.get(key)
+        if future is not None:
+            self.hits += 1
+            return await asyncio.shield(future)
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        data = None
+        try:
+            data = await loader(arg)
+            if data is not None:
+                data = self.cache.put(key, data)
+        except Exception as e:
+            self.errors += 1
+            logging.error(f"Не удалось получить изображение {key}: {e}")
+            data = None
+        finally:
+            del self._inflight[key]
+            # И при отмене загрузки (CancelledError — не Exception): иначе ждущие зависнут
+            future.set_result(data)
+        return data
+
+    async def _download(self, url: str) -> Optional[bytes]:
+        started = time.perf_counter()
+        async with self._get_session().get(url) as resp:
+            if resp.status != 200:
+                raise Exception(f"Ошибка загрузки изображения: {resp.status}")
+            data = await resp.read()
+        image_fetch_seconds.observe(time.perf_counter() - started, "http")
+        self.downloads += 1
+        self.downloaded_bytes += len(data)
+        return data
+
+    async def _read_file(self, path: str) -> Optional[bytes]:
+        if not os.path.exists(path):
+            logging.error(f"Файл изображения не найден: {path}")
+            return None
+        started = time.perf_counter()
+        data = await asyncio.to_thread(_read_bytes, path)
+        image_fetch_seconds.observe(time.perf_counter() - started, "local")
+        self.local_reads += 1
+        return data
+
+    def stats(self) -> dict:
+        return {
+            "cached_images": len(self.cache),
+            "cached_bytes": self.cache.size,
+            "max_bytes": self.cache.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "downloads": self.downloads,
+            "downloaded_bytes": self.downloaded_bytes,
+            "local_reads": self.local_reads,
+            "errors": self.errors,
+        }
+
+
+def _read_bytes(path: str) -> bytes:
+    with open(path, "rb") as file:
+        return file.read()
+
+
+image_fetcher = ImageFetcher(
+    ImageCache(config.IMAGE_CACHE_BYTES),
+    timeout=config.IMAGE_FETCH_TIMEOUT,
+)
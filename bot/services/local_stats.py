@@ -0,0 +1,296 @@
+import asyncio
+import base64
+import logging
+import os
+from array import array
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import orjson
+
+from bot import config
+from bot.schemas import AlertSchema
+from bot.services.api import django_api
+from bot.services.stats_cache import stats_cache
+from bot.utils.logger import log_event
+
+# Счётчики в часовой корзине: всего, подтверждено, отклонено
+TOTAL, CONFIRMED, REJECTED = 0, 1, 2
+FIELDS = 3
+
+SeriesKey = Tuple[int, str]
+# Поправка по сверке с Django: (день — date.toordinal(), название алгоритма)
+CorrectionKey = Tuple[int, str]
+
+
+class _Series:
+    """Почасовые счётчики одного алгоритма одной компании.
+
+    Корзины лежат подряд в `array('I')`: три числа на час, начиная с `base_hour`.
+    """
+
+    __slots__ = ("name", "base_hour", "counts")
+
+    def __init__(self, name: str, base_hour: int):
+        self.name = name
+        self.base_hour = base_hour
+        self.counts = array("I")
+
+    def add(self, hour: int, field: int, delta: int = 1):
+        if hour < self.base_hour:
+            self.counts = array("I", [0]) * (FIELDS * (self.base_hour - hour)) + self.counts
+            self.base_hour = hour
+        index = (hour - self.base_hour) * FIELDS + field
+        if index >= len(self.counts):
+            self.counts.extend(array("I", [0]) * ((hour - self.base_hour + 1) * FIELDS - len(self.counts)))
+        self.counts[index] += delta
+
+    def total(self, start_hour: int, end_hour: int, field: int) -> int:
+        """Сумма поля по часам [start_hour, end_hour)."""
+        lo = max(start_hour - self.base_hour, 0) * FIELDS + field
+        hi = max(end_hour - self.base_hour, 0) * FIELDS
+        return sum(self.counts[lo:hi:FIELDS]) if hi > lo else 0
+
+
+class AlertStatsEngine:
+    """Локальная статистика тревог, считаемая инкрементально.
+
+    Тревога учитывается при приёме, подтверждение и отклонение — при нажатии
+    кнопок. Запросы за день/неделю/месяц и произвольные даты отвечаются
+    суммированием почасовых корзин без обращения к Django.
+
+    Источник истины — Django: `reconcile` сверяет с ним последние дни и
+    хранит разницу как поправки по дням. Так покрываются приращения,
+    потерянные при падении между снимками, и решения по тревогам, которых
+    нет в карте ID. Локально отвечаются только периоды внутри сверенного
+    окна; до первой сверки, раньше окна и за «всё время» — спрашиваем Django.
+    Сырые тревоги AIBox (без записи в Django) не учитываются.
+    """
+
+    def __init__(self, snapshot_path: str, max_tracked_alerts: int = 100000):
+        self.snapshot_path = snapshot_path
+        self.max_tracked_alerts = max_tracked_alerts
+        self.series: Dict[SeriesKey, _Series] = {}
+        # ID тревоги Django -> (серия, час), чтобы учесть решение по кнопке
+        self._alerts: "OrderedDict[int, Tuple[SeriesKey, int]]" = OrderedDict()
+        self.corrections: Dict[CorrectionKey, List[int]] = {}
+        # Первый день сверенного окна (date.toordinal()), None — сверки ещё не было
+        self.reconciled_from: Optional[int] = None
+        self.reconciliations = 0
+        self._snapshot_task: Optional[asyncio.Task] = None
+        self._reconcile_task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def _hour(moment: datetime) -> int:
+        return int(moment.timestamp() // 3600)
+
+    def record_alert(self, alert: AlertSchema):
+        if not alert.id:
+            return  # сырая тревога AIBox: в статистике Django её нет
+        key = (alert.company.id, alert.alg.key)
+        hour = self._hour(alert.alert_time)
+        series = self.series.get(key)
+        if series is None:
+            series = self.series[key] = _Series(alert.alg.name, hour)
+        series.add(hour, TOTAL)
+        self._alerts[alert.id] = (key, hour)
+        while len(self._alerts) > self.max_tracked_alerts:
+            self._alerts.popitem(last=False)
+
+    def record_action(self, alert_id: int, action: str):
+        """Учитывает подтверждение ("confirm") или отклонение ("reject") тревоги."""
+        tracked = self._alerts.pop(alert_id, None)
+        if tracked is None:
+            return
+        key, hour = tracked
+        self.series[key].add(hour, CONFIRMED if action == "confirm" else REJECTED)
+
+    @staticmethod
+    def period_range(period: str = None, start: str = None, end: str = None) -> Tuple[Optional[datetime], datetime]:
+        """Границы периода [начало, конец). Для "all" начало — None."""
+        now = datetime.now()
+        today = datetime.combine(date.today(), datetime.min.time())
+        if period == "day":
+            return today, now
+        if period == "week":
+            return today - timedelta(days=6), now
+        if period == "month":
+            return today - timedelta(days=29), now
+        if period == "all":
+            return None, now
+        start_day = datetime.combine(date.fromisoformat(start), datetime.min.time())
+        end_day = datetime.combine(date.fromisoformat(end), datetime.min.time()) + timedelta(days=1)
+        return start_day, end_day
+
+    def can_answer(self, start: Optional[datetime]) -> bool:
+        return start is not None and self.reconciled_from is not None and start.toordinal() >= self.reconciled_from
+
+    def query(self, start: datetime, end: datetime, company_id: int = None, corrected: bool = True) -> dict:
+        """Статистика в формате ответа Django `alert-stats` (алгоритмы — по названию).
+
+        Поправки сверки общие для всех компаний и применяются только без `company_id`.
+        """
+        start_hour = self._hour(start)
+        end_hour = self._hour(end) + 1 if end.timestamp() % 3600 else self._hour(end)
+        algorithms: Dict[str, dict] = {}
+        for (series_company, _), series in self.series.items():
+            if company_id is not None and series_company != company_id:
+                continue
+            total = series.total(start_hour, end_hour, TOTAL)
+            if not total:
+                continue
+            entry = algorithms.setdefault(series.name, {"name": series.name, "total": 0, "confirmed": 0, "rejected": 0})
+            entry["total"] += total
+            entry["confirmed"] += series.total(start_hour, end_hour, CONFIRMED)
+            entry["rejected"] += series.total(start_hour, end_hour, REJECTED)
+        if corrected and company_id is None:
+            # Поправки — по целым дням, а периоды начинаются с полуночи
+            first_day, last_day = start.toordinal(), (end - timedelta(microseconds=1)).toordinal()
+            for (day, name), delta in self.corrections.items():
+                if first_day <= day <= last_day:
+                    entry = algorithms.setdefault(name, {"name": name, "total": 0, "confirmed": 0, "rejected": 0})
+                    entry["total"] += delta[TOTAL]
+                    entry["confirmed"] += delta[CONFIRMED]
+                    entry["rejected"] += delta[REJECTED]
+            algorithms = {name: entry for name, entry in algorithms.items() if entry["total"] > 0}
+        return {
+            "total_alerts": sum(alg["total"] for alg in algorithms.values()),
+            "confirmed_alerts": sum(alg["confirmed"] for alg in algorithms.values()),
+            "rejected_alerts": sum(alg["rejected"] for alg in algorithms.values()),
+            "algorithms": sorted(algorithms.values(), key=lambda alg: -alg["total"]),
+        }
+
+    async def reconcile(self, days: int):
+        """Сверяет последние `days` дней (включая сегодня) с Django и пересчитывает поправки.
+
+        Если Django не ответил хотя бы за один день, поправки не меняются.
+        """
+        today = date.today()
+        first_day = today - timedelta(days=days - 1)
+        reference: Dict[int, dict] = {}
+        for offset in range(days):
+            day = (first_day + timedelta(days=offset)).isoformat()
+            response = await django_api.alert_stats(start=day, end=day)
+            if response.status_code != 200:
+                raise RuntimeError(f"Django вернул {response.status_code} на статистику за {day}")
+            reference[first_day.toordinal() + offset] = response.json()
+
+        corrections: Dict[CorrectionKey, List[int]] = {}
+        for day, expected in reference.items():
+            day_start = datetime.combine(date.fromordinal(day), datetime.min.time())
+            local = {alg["name"]: alg for alg in self.query(day_start, day_start + timedelta(days=1), corrected=False)["algorithms"]}
+            remote = {alg["name"]: alg for alg in expected.get("algorithms", [])}
+            for name in local.keys() | remote.keys():
+                ours, theirs = local.get(name, {}), remote.get(name, {})
+                delta = [theirs.get(field, 0) - ours.get(field, 0) for field in ("total", "confirmed", "rejected")]
+                if "rejected" not in theirs:
+                    delta[REJECTED] = 0  # Django может не отдавать отклонённые — их не трогаем
+                if any(delta):
+                    corrections[(day, name)] = delta
+        drift = sum(abs(delta[TOTAL]) for delta in corrections.values())
+        # Поправки за дни вне окна больше не нужны: такие периоды спрашиваются у Django
+        self.corrections = corrections
+        self.reconciled_from = first_day.toordinal()
+        self.reconciliations += 1
+        log_event("stats_reconciled", days=days, corrected_days=len({day for day, _ in corrections}), drift=drift)
+
+    # Снимок на диск
+
+    def dump(self) -> bytes:
+        """Снимок в байтах. Вызывается в цикле событий: словари меняются только в нём."""
+        payload = {
+            "reconciled_from": self.reconciled_from,
+            "series": [
+                {
+                    "company": company_id,
+                    "alg": alg_key,
+                    "name": series.name,
+                    "base_hour": series.base_hour,
+                    "counts": base64.b64encode(series.counts.tobytes()).decode(),
+                }
+                for (company_id, alg_key), series in self.series.items()
+            ],
+            # Карта ID нужна, чтобы после перезапуска учесть решения по уже принятым тревогам
+            "alerts": [[alert_id, company_id, alg_key, hour] for alert_id, ((company_id, alg_key), hour) in self._alerts.items()],
+            "corrections": [[day, name, *delta] for (day, name), delta in self.corrections.items()],
+        }
+        return orjson.dumps(payload)
+
+    def write(self, data: bytes):
+        tmp_path = self.snapshot_path + ".tmp"
+        with open(tmp_path, "wb") as file:
+            file.write(data)
+        os.replace(tmp_path, self.snapshot_path)
+
+    def save(self):
+        self.write(self.dump())
+
+    async def save_async(self):
+        """Собирает снимок в цикле событий, а на диск пишет в отдельном потоке."""
+        await asyncio.to_thread(self.write, self.dump())
+
+    def load(self):
+        if not os.path.exists(self.snapshot_path):
+            return
+        try:
+            with open(self.snapshot_path, "rb") as file:
+                payload = orjson.loads(file.read())
+            for item in payload["series"]:
+                series = _Series(item["name"], item["base_hour"])
+                series.counts.frombytes(base64.b64decode(item["counts"]))
+                self.series[(item["company"], item["alg"])] = series
+            for alert_id, company_id, alg_key, hour in payload.get("alerts", []):
+                self._alerts[alert_id] = ((company_id, alg_key), hour)
+            for day, name, *delta in payload.get("corrections", []):
+                self.corrections[(day, name)] = delta
+            self.reconciled_from = payload.get("reconciled_from")
+        except (OSError, ValueError, KeyError) as e:
+            logging.error(f"Не удалось загрузить снимок статистики {self.snapshot_path}: {e}")
+
+    async def start(self, interval: float, reconcile_interval: float = 0, reconcile_days: int = 30):
+        """Загружает снимок и запускает его периодическое сохранение и сверку с Django (0 — без сверки)."""
+        self.load()
+        self._snapshot_task = asyncio.create_task(self._snapshot_loop(interval))
+        if reconcile_interval > 0:
+            self._reconcile_task = asyncio.create_task(self._reconcile_loop(reconcile_interval, reconcile_days))
+
+    async def stop(self):
+        for task in (self._snapshot_task, self._reconcile_task):
+            if task is not None:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+        self._snapshot_task = self._reconcile_task = None
+        await self._save_logged()
+
+    async def _save_logged(self):
+        try:
+            await self.save_async()
+        except Exception as e:
+            logging.error(f"Не удалось сохранить снимок статистики: {e!r}")
+
+    async def _snapshot_loop(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            await self._save_logged()
+
+    async def _reconcile_loop(self, interval: float, days: int):
+        # Первая сверка — сразу при старте: до неё /stats отвечает Django
+        while True:
+            try:
+                await self.reconcile(days)
+            except Exception as e:
+                log_event("stats_reconcile_failed", logging.WARNING, error=str(e))
+            await asyncio.sleep(interval)
+
+
+local_stats = AlertStatsEngine(config.STATS_SNAPSHOT_PATH)
+
+
+async def get_alert_stats(period: str = None, start: str = None, end: str = None) -> Optional[dict]:
+    """Статистика тревог: локально, если период покрыт учётом, иначе из Django (через кэш)."""
+    if config.STATS_SOURCE == "local":
+        range_start, range_end = local_stats.period_range(period, start, end)
+        if local_stats.can_answer(range_start):
+            return local_stats.query(range_start, range_end)
+    return await stats_cache.get(period=period, start=start, end=end)
@@ -0,0 +1,123 @@
+import asyncio
+import hashlib
+import logging
+import multiprocessing
+import os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+import orjson
+from fpdf import FPDF
+import fpdf.fpdf
+
+from bot import config
+
+FONT_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "DejaVuSans.ttf")
+FONT_KEY = "dejavu"
+
+# Не пишем рядом со шрифтом .pkl-кэш: метрики шрифта держим в памяти воркера
+fpdf.fpdf.FPDF_CACHE_MODE = 1
+
+# Разобранный шрифт DejaVu (fonts/font_files из FPDF), один раз на процесс
+_font_template: Optional[dict] = None
+
+
+def _load_font():
+    """Разбирает TTF один раз и запоминает описание шрифта для следующих документов."""
+    global _font_template
+    if _font_template is not None:
+        return
+    pdf = FPDF()
+    pdf.add_font("DejaVu", "", FONT_PATH, uni=True)
+    _font_template = {
+        "font": pdf.fonts[FONT_KEY],
+        "font_files": {key: dict(value) for key, value in pdf.font_files.items()},
+    }
+
+
+def _new_pdf() -> FPDF:
+    _load_font()
+    pdf = FPDF()
+    # То же, что делает add_font (fpdf==1.7.2), но без повторного разбора TTF.
+    # Список subset у каждого документа свой: в него попадают использованные символы.
+    font = dict(_font_template["font"], i=len(pdf.fonts) + 1, subset=list(_font_template["font"]["subset"]))
+    pdf.fonts[FONT_KEY] = font
+    pdf.font_files.update({key: dict(value) for key, value in _font_template["font_files"].items()})
+    return pdf
+
+
+def create_stats_pdf(data: dict, period: str) -> bytes:
+    """Строит PDF со статистикой тревог и возвращает его содержимое."""
+    pdf = _new_pdf()
+    pdf.add_page()
+    pdf.set_font("DejaVu", size=12)
+
+    pdf.cell(200, 10, txt=f"Статистика тревог ({period})", ln=True, align="C")
+    pdf.ln(10)
+    pdf.cell(200, 10, txt=f"Всего тревог: {data['total_alerts']}", ln=True)
+    pdf.cell(200, 10, txt=f"Подтверждено: {data['confirmed_alerts']}", ln=True)
+    pdf.ln(10)
+    pdf.cell(200, 10, txt="По алгоритмам:", ln=True)
+
+    for alg in data["algorithms"]:
+        line = f"{alg['name']}: {alg['total']} всего, {alg['confirmed']} подтверждено"
+        pdf.cell(200, 10, txt=line, ln=True)
+
+    # fpdf 1.7 отдаёт документ строкой latin-1
+    return pdf.output(dest="S").encode("latin1")
+
+
+class ReportRenderer:
+    """Строит PDF-отчёты в пуле процессов, не блокируя event loop.
+
+    Шрифт разбирается один раз при старте каждого воркера. Готовые отчёты
+    кэшируются по (подпись периода, хэш данных): повторный запрос тех же
+    цифр отдаётся без рендеринга.
+    """
+
+    def __init__(self, workers: int = 1, cache_size: int = 32):
+        self.workers = workers
+        self.cache_size = cache_size
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._cache: "OrderedDict[tuple, bytes]" = OrderedDict()
+        self.rendered = 0
+        self.hits = 0
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_load_font,
+            )
+        return self._executor
+
+    async def render(self, data: dict, period: str) -> bytes:
+        digest = hashlib.sha1(orjson.dumps(data, option=orjson.OPT_SORT_KEYS)).hexdigest()
+        key = (period, digest)
+        pdf = self._cache.get(key)
+        if pdf is not None:
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return pdf
+
+        loop = asyncio.get_running_loop()
+        pdf = await loop.run_in_executor(self._get_executor(), create_stats_pdf, data, period)
+        self.rendered += 1
+        self._cache[key] = pdf
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return pdf
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+            logging.info("Пул построения PDF остановлен")
+
+    def stats(self) -> dict:
+        return {"rendered": self.rendered, "cache_hits": self.hits, "cached": len(self._cache)}
+
+
+report_renderer = ReportRenderer(workers=config.PDF_WORKERS, cache_size=config.PDF_CACHE_SIZE)
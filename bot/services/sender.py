@@ -0,0 +1,137 @@
+import asyncio
+import logging
+import random
+import time
+from typing import Any, Awaitable, Callable, Optional, Union
+
+from aiogram.exceptions import TelegramNetworkError, TelegramRetryAfter, TelegramServerError
+
+from bot import config
+from bot.services.metrics import telegram_errors, telegram_request_seconds, telegram_retry_after
+from bot.services.state import MemoryStateBackend, StateBackend, state_backend
+from bot.utils.logger import log_event
+
+ChatId = Union[int, str]
+
+
+class TelegramSender:
+    """Единый планировщик исходящих запросов к Telegram.
+
+    Каждый вызов проходит через три ограничителя: глобальный (~30 сообщений/с
+    на бота), на личный чат (~1/с) и на группу (~20/мин). `TelegramRetryAfter`
+    блокирует чат на `retry_after` секунд, после чего запрос снова встаёт
+    в очередь бакетов. Сетевые и 5xx-ошибки повторяются с экспоненциальной
+    задержкой и случайным джиттером.
+
+    Бакеты и блокировки лежат в общем хранилище состояния, поэтому с общим
+    бэкендом лимиты соблюдаются суммарно по всем процессам бота. Проверка
+    блокировок и списание токенов чата и глобального — одна операция
+    `reserve_tokens` (в SQLite — одна транзакция на отправку).
+    """
+
+    GLOBAL_BLOCK_KEY = "tg:blocked"
+
+    def __init__(
+        self,
+        global_rate: float = 30,
+        chat_rate: float = 1,
+        chat_burst: float = 3,
+        group_rate: float = 20 / 60,
+        group_burst: float = 5,
+        max_retries: int = 3,
+        backend: Optional[StateBackend] = None,
+    ):
+        self.backend = backend or MemoryStateBackend()
+        self.global_rate = global_rate
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_rate = group_rate
+        self.group_burst = group_burst
+        self.max_retries = max_retries
+        self.sent = 0
+        self.retry_after_hits = 0
+        self.retried = 0
+        self.failed = 0
+
+    @staticmethod
+    def is_group(chat_id: ChatId) -> bool:
+        return isinstance(chat_id, str) or chat_id < 0
+
+    async def _acquire(self, chat_id: ChatId):
+        if self.is_group(chat_id):
+            chat_bucket = (f"tg:chat:{chat_id}", self.group_rate, self.group_burst)
+        else:
+            chat_bucket = (f"tg:chat:{chat_id}", self.chat_rate, self.chat_burst)
+        buckets = [chat_bucket, ("tg:global", self.global_rate, self.global_rate)]
+        blocked = (f"tg:blocked:{chat_id}", self.GLOBAL_BLOCK_KEY)
+        # Глобальный токен берётся только когда чат готов: ожидающий своего
+        # чата запрос не должен занимать общую полосу
+        while buckets:
+            delay, taken = await self.backend.reserve_tokens(buckets, blocked)
+            buckets = buckets[taken:]
+            if delay:
+                await asyncio.sleep(delay)
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(30.0, 0.5 * 2 ** attempt))
+
+    async def send(self, chat_id: ChatId, method: Callable[..., Awaitable[Any]], **kwargs) -> Any:
+        """Вызывает метод бота (`bot.send_photo`, `bot.send_message`, ...) с соблюдением лимитов.
+
+        `chat_id` передаётся в метод автоматически.
+        """
+        method_name = getattr(method, "__name__", "unknown")
+        attempt = 0
+        while True:
+            await self._acquire(chat_id)
+            started = time.perf_counter()
+            try:
+                result = await method(chat_id=chat_id, **kwargs)
+                telegram_request_seconds.observe(time.perf_counter() - started, method_name)
+                self.sent += 1
+                return result
+            except TelegramRetryAfter as e:
+                # Лимит превышен: блокируем чат и ставим запрос обратно в очередь
+                telegram_retry_after.inc(method_name)
+                self.retry_after_hits += 1
+                blocked_until = time.time() + e.retry_after
+                await self.backend.set(f"tg:blocked:{chat_id}", blocked_until, ttl=e.retry_after)
+                if e.retry_after > 5:
+                    # Длинная пауза обычно означает глобальный флуд-контроль
+                    await self.backend.set(self.GLOBAL_BLOCK_KEY, blocked_until, ttl=e.retry_after)
+                # Число 429 видно в метриках, в лог попадает выборка
+                log_event(
+                    "telegram_retry_after", logging.WARNING, sample=config.LOG_SAMPLE_RATE,
+                    chat_id=chat_id, method=method_name, retry_after=e.retry_after,
+                )
+            except (TelegramNetworkError, TelegramServerError) as e:
+                telegram_errors.inc(method_name, type(e).__name__)
+                if attempt >= self.max_retries:
+                    self.failed += 1
+                    raise
+                attempt += 1
+                self.retried += 1
+                delay = self._backoff(attempt)
+                logging.warning(f"Временная ошибка Telegram для чата {chat_id}: {e}, повтор через {delay:.1f} с")
+                await asyncio.sleep(delay)
+            except Exception as e:
+                telegram_errors.inc(method_name, type(e).__name__)
+                self.failed += 1
+                raise
+
+    def stats(self) -> dict:
+        return {
+            "sent": self.sent,
+            "retry_after": self.retry_after_hits,
+            "retried": self.retried,
+            "failed": self.failed,
+        }
+
+
+sender = TelegramSender(
+    global_rate=config.TELEGRAM_GLOBAL_RATE,
+    chat_rate=config.TELEGRAM_CHAT_RATE,
+    group_rate=config.TELEGRAM_GROUP_RATE,
+    max_retries=config.TELEGRAM_SEND_RETRIES,
+    backend=state_backend,
+)
@@ -0,0 +1,337 @@
+import asyncio
+import sqlite3
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Optional, Sequence, Tuple
+
+import orjson
+
+from bot import config
+
+# Бакет токенов: (ключ, пополнение в секунду, ёмкость)
+Bucket = Tuple[str, float, float]
+
+
+class StateBackend:
+    """Общее хранилище изменяемого состояния бота.
+
+    Через него идут FSM-состояния, множество уже принятых тревог, токены
+    лимитов Telegram и входящих команд, кэши. С `SQLiteStateBackend`
+    несколько процессов (воркеры gunicorn или разные запуски на одной машине)
+    видят одно и то же состояние, а операции `add`, `incr`, `update`,
+    `take_token` и `reserve_tokens` атомарны между ними.
+    """
+
+    async def get(self, key: str) -> Any:
+        raise NotImplementedError
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        raise NotImplementedError
+
+    async def delete(self, key: str):
+        raise NotImplementedError
+
+    async def add(self, key: str, value: Any = 1, ttl: Optional[float] = None) -> bool:
+        """Записывает ключ, только если его нет. Возвращает False, если ключ уже есть."""
+        raise NotImplementedError
+
+    async def incr(self, key: str, delta: int = 1) -> int:
+        raise NotImplementedError
+
+    async def update(self, key: str, func: Callable[[Any], Any], ttl: Optional[float] = None) -> Any:
+        """Атомарно заменяет значение ключа на `func(старое значение или None)` и возвращает новое.
+
+        None от `func` удаляет ключ, тот же объект — оставляет ключ как есть
+        (вместе со сроком жизни). `func` не должна менять переданное значение
+        на месте и может выполняться в другом потоке, внутри транзакции.
+        """
+        raise NotImplementedError
+
+    async def reserve_token(self, key: str, rate: float, capacity: float) -> float:
+        """Списывает токен из бакета `key` и возвращает, сколько секунд ждать до его появления."""
+        delay, _ = await self.reserve_tokens([(key, rate, capacity)])
+        return delay
+
+    async def take_token(self, key: str, rate: float, capacity: float) -> float:
+        """Списывает токен из бакета `key`, только если он уже есть (в долг не берёт).
+
+        Возвращает 0, если токен списан, иначе — через сколько секунд он появится.
+        """
+        raise NotImplementedError
+
+    async def reserve_tokens(self, buckets: Sequence[Bucket], blocked: Iterable[str] = ()) -> Tuple[float, int]:
+        """Списывает по токену из бакетов `buckets` по порядку одной атомарной операцией.
+
+        Если действует хоть одна блокировка из `blocked` (значение ключа —
+        `time.time()`, до которого ждать), ничего не списывается: возвращается
+        (остаток блокировки, 0). Иначе токены списываются, пока очередной бакет
+        не потребует ждать, и возвращается (задержка, сколько бакетов списано):
+        следующие бакеты вызывающий списывает после паузы.
+        """
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
+class MemoryStateBackend(StateBackend):
+    """Состояние в памяти процесса; размер ограничен `maxsize` ключами."""
+
+    def __init__(self, maxsize: int = 100000):
+        self.maxsize = maxsize
+        self._items: "OrderedDict[str, Tuple[Any, Optional[float]]]" = OrderedDict()
+        # Бакет: [токены, время обновления]
+        self._buckets: "OrderedDict[str, list]" = OrderedDict()
+
+    def _alive(self, key: str) -> Optional[Tuple[Any, Optional[float]]]:
+        item = self._items.get(key)
+        if item is not None and item[1] is not None and item[1] <= time.monotonic():
+            del self._items[key]
+            return None
+        return item
+
+    def _put(self, key: str, value: Any, ttl: Optional[float]):
+        self._items[key] = (value, time.monotonic() + ttl if ttl else None)
+        self._items.move_to_end(key)
+        while len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+
+    async def get(self, key: str) -> Any:
+        item = self._alive(key)
+        return item[0] if item is not None else None
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        self._put(key, value, ttl)
+
+    async def delete(self, key: str):
+        self._items.pop(key, None)
+
+    async def add(self, key: str, value: Any = 1, ttl: Optional[float] = None) -> bool:
+        if self._alive(key) is not None:
+            return False
+        self._put(key, value, ttl)
+        return True
+
+    async def incr(self, key: str, delta: int = 1) -> int:
+        item = self._alive(key)
+        value = (item[0] if item is not None else 0) + delta
+        self._put(key, value, None)
+        return value
+
+    async def update(self, key: str, func: Callable[[Any], Any], ttl: Optional[float] = None) -> Any:
+        item = self._alive(key)
+        old = item[0] if item is not None else None
+        value = func(old)
+        if value is None:
+            self._items.pop(key, None)
+        elif value is not old:
+            self._put(key, value, ttl)
+        return value
+
+    async def take_token(self, key: str, rate: float, capacity: float) -> float:
+        return self._take(key, rate, capacity, time.monotonic(), borrow=False)
+
+    async def reserve_tokens(self, buckets: Sequence[Bucket], blocked: Iterable[str] = ()) -> Tuple[float, int]:
+        wall = time.time()
+        until = max((self._items[key][0] for key in blocked if self._alive(key) is not None), default=0.0)
+        if until > wall:
+            return until - wall, 0
+        now = time.monotonic()
+        for taken, (key, rate, capacity) in enumerate(buckets, 1):
+            delay = self._take(key, rate, capacity, now)
+            if delay:
+                return delay, taken
+        return 0.0, len(buckets)
+
+    def _take(self, key: str, rate: float, capacity: float, now: float, borrow: bool = True) -> float:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = [capacity, now]
+            # Вытесняем давние бакеты, которые уже успели наполниться
+            while len(self._buckets) > self.maxsize:
+                old_key, (tokens, updated) = next(iter(self._buckets.items()))
+                if old_key == key or tokens + (now - updated) * rate < capacity:
+                    break
+                del self._buckets[old_key]
+        else:
+            self._buckets.move_to_end(key)
+        tokens = min(capacity, bucket[0] + (now - bucket[1]) * rate)
+        if tokens < 1 and not borrow:
+            bucket[0], bucket[1] = tokens, now
+            return (1 - tokens) / rate
+        tokens -= 1
+        bucket[0], bucket[1] = tokens, now
+        return 0.0 if tokens >= 0 else -tokens / rate
+
+
+class SQLiteStateBackend(StateBackend):
+    """Состояние в файле SQLite (режим WAL), общее для всех процессов на машине.
+
+    Все запросы процесса выполняются в одном выделенном потоке со своим
+    соединением; между процессами атомарность обеспечивают транзакции
+    `BEGIN IMMEDIATE`.
+    """
+
+    PURGE_EVERY = 1000
+
+    def __init__(self, path: str):
+        self.path = path
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="state-sqlite")
+        self._conn: Optional[sqlite3.Connection] = None
+        self._writes = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS state ("
+                " key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL)"
+            )
+            self._conn = conn
+        return self._conn
+
+    async def _run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    def _write(self, func, *args):
+        """Выполняет func(conn, now, ...) в транзакции BEGIN IMMEDIATE."""
+        conn = self._connect()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = func(conn, now, *args)
+            self._writes += 1
+            if self._writes % self.PURGE_EVERY == 0:
+                conn.execute("DELETE FROM state WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return result
+
+    @staticmethod
+    def _expires(now: float, ttl: Optional[float]) -> Optional[float]:
+        return now + ttl if ttl else None
+
+    def _get_sync(self, key: str) -> Any:
+        row = self._connect().execute(
+            "SELECT value FROM state WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (key, time.time()),
+        ).fetchone()
+        return orjson.loads(row[0]) if row is not None else None
+
+    async def get(self, key: str) -> Any:
+        return await self._run(self._get_sync, key)
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        def op(conn, now):
+            conn.execute(
+                "INSERT OR REPLACE INTO state (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, orjson.dumps(value), self._expires(now, ttl)),
+            )
+        await self._run(self._write, op)
+
+    async def delete(self, key: str):
+        await self._run(self._write, lambda conn, now: conn.execute("DELETE FROM state WHERE key = ?", (key,)))
+
+    async def add(self, key: str, value: Any = 1, ttl: Optional[float] = None) -> bool:
+        def op(conn, now):
+            conn.execute("DELETE FROM state WHERE key = ? AND expires_at <= ?", (key, now))
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO state (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, orjson.dumps(value), self._expires(now, ttl)),
+            )
+            return cursor.rowcount == 1
+        return await self._run(self._write, op)
+
+    async def incr(self, key: str, delta: int = 1) -> int:
+        def op(conn, now):
+            row = conn.execute("SELECT value FROM state WHERE key = ?", (key,)).fetchone()
+            value = (orjson.loads(row[0]) if row is not None else 0) + delta
+            conn.execute("INSERT OR REPLACE INTO state (key, value, expires_at) VALUES (?, ?, NULL)",
+                         (key, orjson.dumps(value)))
+            return value
+        return await self._run(self._write, op)
+
+    async def update(self, key: str, func: Callable[[Any], Any], ttl: Optional[float] = None) -> Any:
+        def op(conn, now):
+            row = conn.execute(
+                "SELECT value FROM state WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)", (key, now)
+            ).fetchone()
+            old = orjson.loads(row[0]) if row is not None else None
+            value = func(old)
+            if value is None:
+                conn.execute("DELETE FROM state WHERE key = ?", (key,))
+            elif value is not old:
+                conn.execute(
+                    "INSERT OR REPLACE INTO state (key, value, expires_at) VALUES (?, ?, ?)",
+                    (key, orjson.dumps(value), self._expires(now, ttl)),
+                )
+            return value
+        return await self._run(self._write, op)
+
+    async def take_token(self, key: str, rate: float, capacity: float) -> float:
+        return await self._run(self._write, self._take, key, rate, capacity, False)
+
+    async def reserve_tokens(self, buckets: Sequence[Bucket], blocked: Iterable[str] = ()) -> Tuple[float, int]:
+        blocked = list(blocked)
+
+        def op(conn, now):
+            if blocked:
+                rows = conn.execute(
+                    f"SELECT value FROM state WHERE key IN ({', '.join('?' * len(blocked))})"
+                    " AND (expires_at IS NULL OR expires_at > ?)",
+                    (*blocked, now),
+                ).fetchall()
+                until = max((orjson.loads(row[0]) for row in rows), default=0.0)
+                if until > now:
+                    return until - now, 0
+            for taken, (key, rate, capacity) in enumerate(buckets, 1):
+                delay = self._take(conn, now, key, rate, capacity)
+                if delay:
+                    return delay, taken
+            return 0.0, len(buckets)
+        # Блокировки и все бакеты — одна транзакция BEGIN IMMEDIATE на отправку
+        return await self._run(self._write, op)
+
+    @staticmethod
+    def _take(
+        conn: sqlite3.Connection, now: float, key: str, rate: float, capacity: float, borrow: bool = True,
+    ) -> float:
+        row = conn.execute("SELECT value FROM state WHERE key = ?", (key,)).fetchone()
+        tokens, updated = orjson.loads(row[0]) if row is not None else (capacity, now)
+        tokens = min(capacity, tokens + (now - updated) * rate)
+        taken = borrow or tokens >= 1
+        if taken:
+            tokens -= 1
+        # Полный бакет больше не нужен — пусть истечёт
+        ttl = (capacity - tokens) / rate + 1
+        conn.execute(
+            "INSERT OR REPLACE INTO state (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, orjson.dumps([tokens, now]), now + ttl),
+        )
+        if not taken:
+            return (1 - tokens) / rate
+        return 0.0 if tokens >= 0 else -tokens / rate
+
+    async def close(self):
+        def close_sync():
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+        await self._run(close_sync)
+        self._executor.shutdown(wait=True)
+
+
+def create_state_backend(kind: str) -> StateBackend:
+    if kind == "sqlite":
+        return SQLiteStateBackend(config.STATE_SQLITE_PATH)
+    if kind == "memory":
+        return MemoryStateBackend(config.STATE_MEMORY_MAX_KEYS)
+    raise ValueError(f"Неизвестный STATE_BACKEND: {kind}")
+
+
+state_backend = create_state_backend(config.STATE_BACKEND)
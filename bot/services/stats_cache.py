@@ -0,0 +1,160 @@
+import asyncio
+import time
+from datetime import date
+from typing import Dict, Optional, Tuple
+
+from bot import config
+from bot.services.api import DjangoAPIUnavailable, django_api
+from bot.services.state import MemoryStateBackend, StateBackend, state_backend
+
+StatsKey = Tuple[str, ...]
+
+
+class StatsCache:
+    """Кэш ответов `alert-stats` с TTL по периоду и объединением одинаковых запросов.
+
+    Пока запрос к Django за статистикой выполняется, остальные такие же
+    запросы ждут его результат, а не идут в Django сами. Кэшируются только
+    успешные ответы.
+
+    Записи лежат в хранилище состояния. Ключи записей, в которые входит
+    сегодняшний день, содержат номер поколения: `invalidate_recent` просто
+    увеличивает его, и старые записи дотлевают по TTL во всех процессах сразу.
+    Поколение меняется не чаще раза в `invalidate_interval` (по умолчанию TTL
+    записей за день): иначе во время шторма тревог каждая новая тревога
+    сбрасывала бы кэш и каждое нажатие /stats снова шло бы в Django.
+    Тревоги, пришедшие между сбросами, учитываются при следующем чтении.
+    """
+
+    GENERATION_KEY = "stats:generation"
+    INVALIDATION_KEY = "stats:invalidated"
+
+    def __init__(
+        self,
+        ttls: Dict[str, float],
+        history_ttl: float,
+        backend: Optional[StateBackend] = None,
+        invalidate_interval: Optional[float] = None,
+    ):
+        self.ttls = ttls
+        self.history_ttl = history_ttl
+        self.backend = backend or MemoryStateBackend()
+        self.invalidate_interval = ttls["day"] if invalidate_interval is None else invalidate_interval
+        self._inflight: Dict[StatsKey, asyncio.Future] = {}
+        self._next_invalidation = 0.0
+        self._stale = False
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def make_key(period: str = None, start: str = None, end: str = None) -> StatsKey:
+        """Нормализует запрос: произвольные даты приводятся к ISO (ValueError, если формат неверный)."""
+        if period is not None:
+            return ("period", period)
+        start_date, end_date = date.fromisoformat(start), date.fromisoformat(end)
+        return ("range", start_date.isoformat(), end_date.isoformat())
+
+    def _ttl(self, key: StatsKey) -> float:
+        if key[0] == "period":
+            return self.ttls.get(key[1], self.ttls["day"])
+        # Закрытый диапазон в прошлом уже не меняется
+        if key[2] < date.today().isoformat():
+            return self.history_ttl
+        return self.ttls["custom"]
+
+    @staticmethod
+    def _is_recent(key: StatsKey) -> bool:
+        return key[0] == "period" or key[2] >= date.today().isoformat()
+
+    async def _storage_key(self, key: StatsKey) -> str:
+        if not self._is_recent(key):
+            return "stats:" + ":".join(key)
+        generation = await self.backend.get(self.GENERATION_KEY) or 0
+        return f"stats:{generation}:" + ":".join(key)
+
+    async def get(self, period: str = None, start: str = None, end: str = None) -> Optional[dict]:
+        """Статистика за период или диапазон дат; None, если Django ответил ошибкой."""
+        key = self.make_key(period, start, end)
+        if self._stale and self._is_recent(key):
+            await self._invalidate()
+        storage_key = await self._storage_key(key)
+        data = await self.backend.get(storage_key)
+        if data is not None:
+            self.hits += 1
+            return data
+
+        future = self._inflight.get(key)
+        if future is not None:
+            self.coalesced += 1
+            return await asyncio.shield(future)
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        error: Optional[BaseException] = None
+        data = None
+        try:
+            if key[0] == "period":
+                response = await django_api.alert_stats(period=key[1])
+            else:
+                response = await django_api.alert_stats(start=key[1], end=key[2])
+            data = response.json() if response.status_code == 200 else None
+            if data is not None:
+                await self.backend.set(storage_key, data, ttl=self._ttl(key))
+        except asyncio.CancelledError:
+            # Отменили только загружающего — ожидающим это обычная ошибка запроса
+            error = DjangoAPIUnavailable("Запрос статистики отменён")
+            raise
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            del self._inflight[key]
+            if error is None:
+                future.set_result(data)
+            else:
+                future.set_exception(error)
+                # Исключение доставляется ожидающим; если их нет, не даём asyncio ругаться
+                future.exception()
+        return data
+
+    async def invalidate_recent(self):
+        """Сбрасывает записи, в которые входит сегодняшний день (пришли новые тревоги)."""
+        self._stale = True
+        await self._invalidate()
+
+    async def _invalidate(self):
+        now = time.monotonic()
+        if now < self._next_invalidation:
+            return
+        self._next_invalidation = now + self.invalidate_interval
+        # Общая для процессов отметка: поколение увеличивает первый успевший,
+        # остальные повторят попытку после своего интервала
+        if self.invalidate_interval > 0 and not await self.backend.add(self.INVALIDATION_KEY, ttl=self.invalidate_interval):
+            return
+        self._stale = False
+        await self.backend.incr(self.GENERATION_KEY)
+        self.invalidations += 1
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "invalidations": self.invalidations,
+        }
+
+
+stats_cache = StatsCache(
+    ttls={
+        "day": config.STATS_TTL_DAY,
+        "week": config.STATS_TTL_WEEK,
+        "month": config.STATS_TTL_MONTH,
+        "all": config.STATS_TTL_ALL,
+        "custom": config.STATS_TTL_DAY,
+    },
+    history_ttl=config.STATS_TTL_HISTORY,
+    backend=state_backend,
+)
@@ -0,0 +1,257 @@
+import asyncio
+import logging
+import os
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+import orjson
+
+from bot import config
+from bot.schemas import AlertSchema
+from bot.services.metrics import registry
+from bot.services.state import MemoryStateBackend, StateBackend, state_backend
+
+alert_recipients = registry.counter(
+    "bot_alert_recipients_total", "Получатели тревог после правил подписки", ["outcome"]
+)
+
+
+@dataclass
+class SubscriptionRules:
+    """Правила одного чата. Пустой набор камер или алгоритмов — «все»."""
+
+    cameras: Set[str] = field(default_factory=set)
+    algorithms: Set[str] = field(default_factory=set)
+    muted_hazards: Set[str] = field(default_factory=set)
+    # Тихие часы [начало, конец) в часах 0–23; конец может быть меньше начала (через полночь)
+    quiet: Optional[Tuple[int, int]] = None
+
+    def is_empty(self) -> bool:
+        return not (self.cameras or self.algorithms or self.muted_hazards or self.quiet)
+
+    def to_dict(self) -> dict:
+        return {
+            "cameras": sorted(self.cameras),
+            "algorithms": sorted(self.algorithms),
+            "muted_hazards": sorted(self.muted_hazards),
+            "quiet": list(self.quiet) if self.quiet else None,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "SubscriptionRules":
+        quiet = data.get("quiet")
+        return cls(
+            cameras=set(data.get("cameras") or ()),
+            algorithms=set(data.get("algorithms") or ()),
+            muted_hazards=set(data.get("muted_hazards") or ()),
+            quiet=(int(quiet[0]), int(quiet[1])) if quiet else None,
+        )
+
+
+class _CompiledRules:
+    """Правила в виде неизменяемых множеств для проверки одной-двумя операциями `in`."""
+
+    __slots__ = ("cameras", "algorithms", "muted_hazards", "quiet_hours")
+
+    def __init__(self, rules: SubscriptionRules):
+        self.cameras: Optional[FrozenSet[str]] = frozenset(rules.cameras) or None
+        self.algorithms: Optional[FrozenSet[str]] = frozenset(rules.algorithms) or None
+        self.muted_hazards: FrozenSet[str] = frozenset(rules.muted_hazards)
+        self.quiet_hours: FrozenSet[int] = frozenset(_hours(rules.quiet)) if rules.quiet else frozenset()
+
+
+def _hours(quiet: Tuple[int, int]) -> Iterable[int]:
+    start, end = quiet
+    hour = start
+    while hour != end:
+        yield hour
+        hour = (hour + 1) % 24
+
+
+class SubscriptionIndex:
+    """Правила подписки пользователей, применяемые перед рассылкой тревоги.
+
+    Правила каждого чата компилируются в неизменяемые множества, а весь
+    индекс — словарь `chat_id -> правила` — при изменении собирается заново
+    и подменяется одной ссылкой. Поэтому фильтр на горячем пути — это
+    несколько проверок `in` на получателя, без блокировок. Чаты без правил
+    в индекс не попадают и пропускаются одной проверкой.
+
+    Правила хранятся в JSON-файле: запись атомарна (временный файл +
+    `os.replace`) и идёт в отдельном потоке. Фоновая задача раз в
+    `reload_interval` секунд проверяет mtime файла и подхватывает правки
+    других воркеров или ручные изменения. Тогда же встреченные уровни
+    опасности обмениваются с другими воркерами через `StateBackend`.
+    """
+
+    HAZARD_LEVELS_KEY = "subscriptions:hazard_levels"
+
+    def __init__(self, path: str, reload_interval: float = 10, backend: Optional[StateBackend] = None):
+        self.path = path
+        self.reload_interval = reload_interval
+        self.backend = backend or MemoryStateBackend()
+        self._rules: Dict[int, SubscriptionRules] = {}
+        self._index: Dict[int, _CompiledRules] = {}
+        # Уровни опасности, встречавшиеся в тревогах — варианты для кнопок
+        self.hazard_levels: Set[str] = set()
+        # Ещё не переданные другим воркерам
+        self._new_hazards: Set[str] = set()
+        self._mtime: Optional[float] = None
+        self._lock = asyncio.Lock()
+        self._reload_task: Optional[asyncio.Task] = None
+        self.reloads = 0
+
+    # Горячий путь
+
+    def route(self, alert: AlertSchema, now: Optional[datetime] = None) -> Tuple[List[int], Set[int]]:
+        """Возвращает получателей тревоги и тех из них, кому отправлять без звука.
+
+        В тихие часы тревоги без `for_security` не отправляются, а тревоги
+        охраны приходят без звука.
+        """
+        index = self._index
+        if alert.hazard_level and alert.hazard_level not in self.hazard_levels:
+            self.hazard_levels.add(alert.hazard_level)
+            self._new_hazards.add(alert.hazard_level)
+        if not index:
+            alert_recipients.inc("sent", amount=len(alert.users_telegram_id))
+            return list(alert.users_telegram_id), set()
+
+        camera = alert.source.source_id
+        algorithm = alert.alg.key
+        hazard = alert.hazard_level or ""
+        hour = (now or datetime.now()).hour
+        recipients = []
+        silent = set()
+        for chat_id in alert.users_telegram_id:
+            rules = index.get(chat_id)
+            if rules is not None:
+                if (
+                    (rules.cameras is not None and camera not in rules.cameras)
+                    or (rules.algorithms is not None and algorithm not in rules.algorithms)
+                    or hazard in rules.muted_hazards
+                ):
+                    continue
+                if hour in rules.quiet_hours:
+                    if not alert.for_security:
+                        continue
+                    silent.add(chat_id)
+            recipients.append(chat_id)
+        alert_recipients.inc("sent", amount=len(recipients) - len(silent))
+        alert_recipients.inc("silent", amount=len(silent))
+        alert_recipients.inc("muted", amount=len(alert.users_telegram_id) - len(recipients))
+        return recipients, silent
+
+    # Правила
+
+    def get(self, chat_id: int) -> SubscriptionRules:
+        rules = self._rules.get(chat_id)
+        return SubscriptionRules.from_dict(rules.to_dict()) if rules else SubscriptionRules()
+
+    def _swap(self, rules: Dict[int, SubscriptionRules]):
+        self._rules = rules
+        self._index = {chat_id: _CompiledRules(item) for chat_id, item in rules.items()}
+
+    async def update(self, chat_id: int, rules: SubscriptionRules):
+        """Применяет правила чата сразу и сохраняет их в файл."""
+        async with self._lock:
+            # Сначала подхватываем правки других воркеров, чтобы не затереть их своим файлом
+            await self._reload_unlocked()
+            updated = dict(self._rules)
+            if rules.is_empty():
+                updated.pop(chat_id, None)
+            else:
+                updated[chat_id] = rules
+            self._swap(updated)
+            payload = orjson.dumps(
+                {str(chat_id): item.to_dict() for chat_id, item in updated.items()},
+                option=orjson.OPT_INDENT_2,
+            )
+            self._mtime = await asyncio.to_thread(self._write, payload)
+
+    # Хранение
+
+    def _write(self, payload: bytes) -> float:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "wb") as file:
+            file.write(payload)
+        os.replace(tmp_path, self.path)
+        return os.stat(self.path).st_mtime
+
+    def _read(self) -> Tuple[Optional[float], Optional[bytes]]:
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except FileNotFoundError:
+            return None, None
+        if mtime == self._mtime:
+            return mtime, None
+        with open(self.path, "rb") as file:
+            return mtime, file.read()
+
+    async def reload(self):
+        """Перечитывает файл, если он изменился; чтение идёт в потоке, подмена — одной ссылкой."""
+        # Блокировка общая с update(): иначе старое содержимое файла могло бы затереть свежую правку
+        async with self._lock:
+            await self._reload_unlocked()
+
+    async def _reload_unlocked(self):
+        mtime, payload = await asyncio.to_thread(self._read)
+        if payload is None:
+            return
+        self._mtime = mtime
+        try:
+            data = orjson.loads(payload)
+            rules = {int(chat_id): SubscriptionRules.from_dict(item) for chat_id, item in data.items()}
+        except (ValueError, TypeError, IndexError) as e:
+            logging.error(f"Не удалось прочитать правила подписки {self.path}: {e}")
+            return
+        self._swap({chat_id: item for chat_id, item in rules.items() if not item.is_empty()})
+        self.reloads += 1
+
+    async def sync_hazard_levels(self):
+        """Отдаёт в общее хранилище новые уровни опасности и забирает встреченные другими воркерами."""
+        new, self._new_hazards = self._new_hazards, set()
+        try:
+            if new:
+                levels = await self.backend.update(
+                    self.HAZARD_LEVELS_KEY, lambda known: sorted(new.union(known or ()))
+                )
+            else:
+                levels = await self.backend.get(self.HAZARD_LEVELS_KEY)
+        except Exception:
+            self._new_hazards |= new  # отдадим в следующий раз
+            raise
+        self.hazard_levels.update(levels or ())
+
+    async def _reload_loop(self):
+        while True:
+            await asyncio.sleep(self.reload_interval)
+            try:
+                await self.reload()
+                await self.sync_hazard_levels()
+            except Exception as e:
+                logging.error(f"Ошибка перезагрузки правил подписки: {e}")
+
+    async def start(self):
+        await self.reload()
+        await self.sync_hazard_levels()
+        if self._reload_task is None and self.reload_interval > 0:
+            self._reload_task = asyncio.create_task(self._reload_loop())
+
+    async def stop(self):
+        if self._reload_task is not None:
+            self._reload_task.cancel()
+            await asyncio.gather(self._reload_task, return_exceptions=True)
+            self._reload_task = None
+
+    def stats(self) -> dict:
+        return {"chats_with_rules": len(self._index), "reloads": self.reloads}
+
+
+subscriptions = SubscriptionIndex(
+    config.SUBSCRIPTIONS_PATH, reload_interval=config.SUBSCRIPTIONS_RELOAD_INTERVAL, backend=state_backend
+)
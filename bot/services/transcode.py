@@ -0,0 +1,156 @@
+import asyncio
+import hashlib
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from typing import Dict, Optional
+
+from bot import config
+from bot.services.images import ImageCache
+from bot.services.metrics import registry
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow есть в requirements.txt; без него фото уходят как есть
+    Image = None
+
+transcode_seconds = registry.histogram("bot_image_transcode_seconds", "Пережатие фото тревоги перед отправкой")
+
+
+def transcode_image(data: bytes, max_dimension: int, quality: int, strip_metadata: bool) -> bytes:
+    """Уменьшает изображение до `max_dimension` по большей стороне и пережимает в JPEG."""
+    with Image.open(BytesIO(data)) as image:
+        # JPEG декодируется сразу в уменьшенном масштабе (1/2, 1/4, 1/8) — в разы быстрее полного
+        image.draft("RGB", (max_dimension, max_dimension))
+        exif = image.info.get("exif")
+        icc_profile = image.info.get("icc_profile")
+        if strip_metadata:
+            # Без EXIF ориентация потеряется, поэтому поворачиваем пиксели
+            image = ImageOps.exif_transpose(image)
+        if image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        image.thumbnail((max_dimension, max_dimension))
+        options = {"quality": quality, "optimize": True, "progressive": True}
+        if not strip_metadata:
+            if exif:
+                options["exif"] = exif
+            if icc_profile:
+                options["icc_profile"] = icc_profile
+        output = BytesIO()
+        image.save(output, "JPEG", **options)
+        return output.getvalue()
+
+
+class ImageTranscoder:
+    """Пережимает фото тревог для Telegram в пуле потоков.
+
+    Pillow отпускает GIL на декодировании, масштабировании и кодировании,
+    поэтому потоков хватает, чтобы не блокировать event loop. Результат
+    кэшируется по хэшу исходных байт и параметрам: одно и то же фото
+    пережимается один раз, одновременные запросы объединяются. Если
+    пережатое фото не меньше исходного, используется исходное.
+    """
+
+    def __init__(
+        self,
+        max_dimension: int = 1280,
+        quality: int = 80,
+        strip_metadata: bool = True,
+        workers: int = 2,
+        cache_bytes: int = 32 * 1024 * 1024,
+        enabled: bool = True,
+    ):
+        self.max_dimension = max_dimension
+        self.quality = quality
+        self.strip_metadata = strip_metadata
+        self.workers = workers
+        self.cache = ImageCache(cache_bytes)
+        self.enabled = enabled and max_dimension > 0
+        if self.enabled and Image is None:
+            logging.error("IMAGE_TRANSCODE=1, но Pillow не установлен (pip install -r requirements.txt): фото тревог отправляются без пережатия")
+            self.enabled = False
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.transcoded = 0
+        self.skipped = 0
+        self.hits = 0
+        self.errors = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="image-transcode")
+        return self._executor
+
+    async def transcode(self, data: bytes) -> Optional[bytes]:
+        """Пережатое фото или None, если пережатие выключено, не удалось или не уменьшило размер."""
+        if not self.enabled:
+            return None
+        key = f"{hashlib.sha1(data).hexdigest()}:{self.max_dimension}:{self.quality}:{int(self.strip_metadata)}"
+        # Пустые байты в кэше означают «оставить исходное»
+        result = self.cache.get(key)
+        if result is not None:
+            self.hits += 1
+            return result or None
+        future = self._inflight.get(key)
+        if future is not None:
+            self.hits += 1
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        result = b""
+        try:
+            started = time.perf_counter()
+            result = await asyncio.get_running_loop().run_in_executor(
+                self._get_executor(), transcode_image, data, self.max_dimension, self.quality, self.strip_metadata
+            )
+            transcode_seconds.observe(time.perf_counter() - started)
+            if len(result) >= len(data):
+                self.skipped += 1
+                result = b""
+            else:
+                self.transcoded += 1
+                self.bytes_in += len(data)
+                self.bytes_out += len(result)
+            self.cache.put(key, result)
+        except Exception as e:
+            self.errors += 1
+            logging.error(f"Не удалось пережать фото тревоги: {e}")
+            result = b""
+        finally:
+            del self._inflight[key]
+            # И при отмене (CancelledError — не Exception): ожидающие получат исходное фото, а не зависнут
+            future.set_result(result or None)
+        return result or None
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "max_dimension": self.max_dimension,
+            "quality": self.quality,
+            "transcoded": self.transcoded,
+            "skipped": self.skipped,
+            "cache_hits": self.hits,
+            "errors": self.errors,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "cached_bytes": self.cache.size,
+        }
+
+
+image_transcoder = ImageTranscoder(
+    max_dimension=config.IMAGE_MAX_DIMENSION,
+    quality=config.IMAGE_JPEG_QUALITY,
+    strip_metadata=config.IMAGE_STRIP_METADATA,
+    workers=config.IMAGE_TRANSCODE_WORKERS,
+    cache_bytes=config.IMAGE_TRANSCODE_CACHE_BYTES,
+    enabled=config.IMAGE_TRANSCODE,
+)
@@ -0,0 +1,66 @@
+import asyncio
+import hmac
+import logging
+from typing import Awaitable, Callable, Optional, Set
+
+import orjson
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+from fastapi import FastAPI, Request, Response
+
+from bot.api import shutdown_hooks
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+def setup_webhook(
+    app: FastAPI, dispatcher: Dispatcher, bot: Bot, base_url: str, path: str, secret: Optional[str]
+) -> Callable[[], Awaitable[None]]:
+    """Подключает диспетчер aiogram к FastAPI как webhook-маршрут.
+
+    Telegram получает 200 сразу после проверки секрета, сам апдейт
+    обрабатывается в фоне. Маршрут можно добавить и в уже работающее
+    приложение. Возвращает корутину-функцию, которая регистрирует webhook
+    в Telegram и вызывает startup-хуки диспетчера.
+    """
+    if not secret:
+        # Без секрета любой, кто знает URL, подделает нажатия «подтвердить»/«отклонить»
+        raise ValueError("Режим webhook требует WEBHOOK_SECRET")
+    tasks: Set[asyncio.Task] = set()
+
+    def on_update_done(task: asyncio.Task):
+        tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logging.error("Ошибка обработки апдейта Telegram из webhook", exc_info=task.exception())
+
+    @app.post(path, include_in_schema=False)
+    async def telegram_webhook(request: Request):
+        if not hmac.compare_digest(request.headers.get(SECRET_HEADER, ""), secret):
+            return Response(status_code=401)
+        try:
+            update = Update.model_validate(orjson.loads(await request.body()), context={"bot": bot})
+        except ValueError as e:
+            logging.error(f"Некорректный апдейт Telegram: {e}")
+            return Response(status_code=400)
+        task = asyncio.create_task(dispatcher.feed_update(bot, update))
+        tasks.add(task)
+        task.add_done_callback(on_update_done)
+        return Response(status_code=200)
+
+    async def on_startup():
+        await dispatcher.emit_startup(bot=bot)
+        await bot.set_webhook(
+            url=base_url.rstrip("/") + path,
+            secret_token=secret,
+            allowed_updates=dispatcher.resolve_used_update_types(),
+        )
+        logging.info(f"Webhook Telegram установлен: {base_url.rstrip('/')}{path}")
+
+    async def on_shutdown():
+        # Webhook не снимаем: при перезапуске Telegram придержит апдейты до нашего возвращения
+        if tasks:
+            await asyncio.wait(tasks, timeout=10)
+        await dispatcher.emit_shutdown(bot=bot)
+
+    shutdown_hooks.append(on_shutdown)
+    return on_startup
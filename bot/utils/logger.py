@@ -0,0 +1,29 @@
+import logging
+import random
+from typing import Optional
+
+import orjson
+
+_logger = logging.getLogger("bot.events")
+
+
+def log_event(event: str, level: int = logging.INFO, sample: Optional[float] = None, exc_info: bool = False, **fields):
+    """Пишет одно структурированное событие: `event {"поле": значение, ...}`.
+
+    `sample` — доля событий, попадающих в лог. Её передают в горячих местах
+    (события на каждую тревогу), где построчные логи сами по себе становятся
+    заметной нагрузкой; обычно это `config.LOG_SAMPLE_RATE`. Без `sample`
+    событие пишется всегда. Поля сериализуются только для тех событий, что
+    прошли выборку и включены на этом уровне логирования. `exc_info=True`
+    добавляет трассировку текущего исключения.
+    """
+    if sample is not None and sample < 1:
+        if random.random() >= sample:
+            return
+        fields["sampled"] = sample
+    if not _logger.isEnabledFor(level):
+        return
+    _logger.log(
+        level, "%s %s", event, orjson.dumps(fields, default=str, option=orjson.OPT_NON_STR_KEYS).decode(),
+        exc_info=exc_info,
+    )
@@ -0,0 +1,75 @@
+import logging
+import os
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Tuple
+
+
+def _process_age() -> float:
+    """Сколько секунд назад запущен процесс (Linux, /proc); 0 — если узнать нельзя."""
+    try:
+        with open("/proc/self/stat") as stat:
+            # Имя процесса в скобках может содержать пробелы — считаем поля после него
+            fields = stat.read().rsplit(")", 1)[1].split()
+        with open("/proc/uptime") as uptime:
+            now = float(uptime.read().split()[0])
+        return max(0.0, now - int(fields[19]) / os.sysconf("SC_CLK_TCK"))
+    except (OSError, ValueError, IndexError):
+        return 0.0
+
+
+class StartupProfiler:
+    """Время фаз запуска: импорты и инициализация подсистем.
+
+    Отсчёт идёт от запуска процесса (включая старт интерпретатора), так что
+    отметки `ingest_ready` и `updates_ready` — это реальное время, через
+    которое бот начинает принимать тревоги и апдейты Telegram после
+    перезапуска. Фазы могут идти параллельно (импорт aiogram в потоке
+    идёт, пока API уже принимает тревоги), поэтому у каждой своё начало.
+    """
+
+    def __init__(self):
+        self._origin = time.perf_counter() - _process_age()
+        self.phases: List[Tuple[str, float, float]] = []
+        self.marks: Dict[str, float] = {}
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self._origin
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        started = self.elapsed()
+        try:
+            yield
+        finally:
+            self.phases.append((name, started, self.elapsed() - started))
+
+    def mark(self, name: str):
+        """Отмечает момент готовности (только первый раз)."""
+        self.marks.setdefault(name, self.elapsed())
+
+    def report(self) -> dict:
+        return {
+            "phases": [
+                {"name": name, "start_ms": round(started * 1000, 1), "duration_ms": round(duration * 1000, 1)}
+                for name, started, duration in self.phases
+            ],
+            "marks": {name: round(at * 1000, 1) for name, at in self.marks.items()},
+        }
+
+    def log_report(self, budget_ms: float = 0):
+        """Пишет таблицу фаз в лог; при превышении `budget_ms` до `ingest_ready` — предупреждение."""
+        lines = [f"{'фаза':<36}{'начало, мс':>12}{'длит., мс':>12}"]
+        for name, started, duration in sorted(self.phases, key=lambda phase: phase[1]):
+            lines.append(f"{name:<36}{started * 1000:>12.1f}{duration * 1000:>12.1f}")
+        for name, at in sorted(self.marks.items(), key=lambda mark: mark[1]):
+            lines.append(f"{'* ' + name:<36}{at * 1000:>12.1f}")
+        logging.info("Время запуска:\n" + "\n".join(lines))
+        ingest_ready = self.marks.get("ingest_ready")
+        if budget_ms and ingest_ready is not None and ingest_ready * 1000 > budget_ms:
+            logging.warning(
+                f"Приём тревог готов через {ingest_ready * 1000:.0f} мс после запуска — больше бюджета {budget_ms:.0f} мс"
+            )
+
+
+startup_profiler = StartupProfiler()
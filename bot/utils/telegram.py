@@ -1,22 +1,35 @@
 import asyncio
-import tempfile
 import logging
-import aiohttp
-from io import BytesIO
-from aiogram.types import FSInputFile
-import requests
 from aiogram import Bot, types
 from aiogram.utils.keyboard import InlineKeyboardBuilder
-from aiogram.types import FSInputFile
-from urllib.parse import urlparse
+from aiogram.types import BufferedInputFile, FSInputFile, InlineKeyboardMarkup, InputFile, Message, URLInputFile
+from urllib.parse import urljoin, urlparse
+from bot import config
 from bot.schemas import AlertSchema
+from bot.services.sender import sender
+from bot.services.images import image_fetcher
+from bot.services.transcode import image_transcoder
+from bot.services.api import django_api, DjangoAPIUnavailable
+from bot.services.state import state_backend
+from bot.utils.logger import log_event
 import os
+from datetime import datetime
+from typing import AbstractSet, Dict, List, Optional, Set, Tuple
 
 BASE_DIR = "/Users/cholponklv/python/visionaibox"
 bot: Bot = None
 chat_id: str = None
 django_api_url: str = None
 
+# Сколько хранить file_id фото тревоги и отметку о принятом по ней решении
+ALERT_STATE_TTL = 24 * 3600
+ORIGINAL_CALLBACK = "original:"
+LOCAL_HOSTS = ("127.0.0.1", "localhost")
+
+# Загрузка видео долгая и занимает канал: свой лимит параллельных загрузок, отдельно от фото
+_video_slots: Optional[asyncio.Semaphore] = None
+_video_tasks: Set[asyncio.Task] = set()
+
 def setup_telegram(bot_instance: Bot, chat_id_instance: str, api_url: str):
     """Инициализация бота один раз при запуске."""
     global bot, chat_id, django_api_url
@@ -25,96 +38,58 @@ def setup_telegram(bot_instance: Bot, chat_id_instance: str, api_url: str):
     django_api_url = api_url
 
 
-
-async def send_alert_to_telegram(alert: AlertSchema):
-    """Формирует сообщение о тревоге и отправляет его в Telegram всем указанным пользователям параллельно."""
-
-    if not bot:
-        raise RuntimeError("Бот не инициализирован. Вызовите setup_telegram() в __main__.py.")
-    print(alert.users_telegram_id)
-    telegram_ids = alert.users_telegram_id
-    print(alert.users_telegram_id)
-    if not telegram_ids:
-        print(f"Пропущена отправка тревоги {alert.id} — нет пользователей")
-        logging.warning(f"Пропущена отправка тревоги {alert.id} — нет пользователей")
-        return
-
-    message_text = (
+def build_alert_text(alert: AlertSchema) -> str:
+    """Текст (подпись к фото) сообщения о тревоге."""
+    return (
         f"🚨 <b>Тревога обнаружена!</b>\n\n"
         f"📍 <b>Устройство:</b> {alert.device.name or 'Неизвестно'}\n"
-        f"🎥 <b>Камера:</b> {alert.source.source_id} ({alert.source.ipv4})\n"        f"⏰ <b>Время:</b> {alert.alert_time.strftime('%Y-%m-%d %H:%M:%S')}\n"
+        f"🎥 <b>Камера:</b> {alert.source.source_id} ({alert.source.ipv4})\n"
+        f"⏰ <b>Время:</b> {alert.alert_time.strftime('%Y-%m-%d %H:%M:%S')}\n"
         f"🤖 <b>Алгоритм:</b> {alert.alg.name}\n"
+        f"🆔 <b>ID тревоги:</b> {alert.aibox_alert_id}\n"
     )
 
-    image_url = str(alert.image) if alert.image else None
 
-    tasks = []  # Список задач для asyncio.gather()
+def build_alert_markup(alert: AlertSchema, original: bool = False, actions: bool = True) -> Optional[InlineKeyboardMarkup]:
+    """Кнопки подтверждения и отклонения для тревог с `for_security=True`.
 
-    for telegram_id in telegram_ids:
-        if image_url:
-            # Загружаем изображение через aiohttp
-            async with aiohttp.ClientSession() as session:
-                try:
-                    async with session.get(image_url) as resp:
-                        if resp.status == 200:
-                            image_bytes = BytesIO(await resp.read())
-                            image_bytes.name = f"alert_{alert.id}.jpg"
-                            print("suc1")
-                            tasks.append(
-                                bot.send_photo(
-                                    chat_id=telegram_id,
-                                    photo=image_bytes,
-                                    caption=message_text,
-                                    parse_mode="HTML",
-                                    reply_markup=reply_markup
-                                )
-                            )
-                        else:
-                            logging.error(f"Не удалось загрузить изображение: {resp.status}")
-                            tasks.append(
-                                bot.send_message(
-                                    chat_id=telegram_id,
-                                    text=message_text + "\n⚠️ Изображение недоступно.",
-                                    parse_mode="HTML",
-                                    reply_markup=reply_markup
-                                )
-                            )
-                except Exception as e:
-                    logging.error(f"Ошибка при получении изображения: {e}")
-                    tasks.append(
-                        bot.send_message(
-                            chat_id=telegram_id,
-                            text=message_text + "\n⚠️ Ошибка при получении изображения.",
-                            parse_mode="HTML",
-                            reply_markup=reply_markup
-                        )
-                    )
-        else:
-            tasks.append(
-                bot.send_message(
-                    chat_id=telegram_id,
-                    text=message_text,
-                    parse_mode="HTML",
-                    reply_markup=reply_markup
-                )
-            )
-    # Запускаем отправку сообщений параллельно
-    results = await asyncio.gather(*tasks, return_exceptions=True)
-    print(results)
-    print(alert.image)
-    for user_id, result in zip(telegram_ids, results):
-        if isinstance(result, Exception):
-            print(f"Ошибка отправки тревоги {alert.id} пользователю {user_id}: {result}")
-            logging.error(f"Ошибка отправки тревоги {alert.id} пользователю {user_id}: {result}")
-        else:
-            print(f"Тревога {alert.id} успешно отправлена пользователю {user_id}")
-            logging.info(f"Тревога {alert.id} успешно отправлена пользователю {user_id}")
+    `original=True` добавляет кнопку «Оригинал» — фото было пережато перед отправкой.
+    """
+    keyboard = InlineKeyboardBuilder()
+    sizes = []
+    if actions and alert.for_security:
+        keyboard.button(text="✅ Подтвердить", callback_data=f"confirm_alert:{alert.id}")
+        keyboard.button(text="❌ Отклонить", callback_data=f"reject_alert:{alert.id}")
+        sizes.append(2)
+    original_data = f"{ORIGINAL_CALLBACK}{alert.aibox_alert_id}"
+    # callback_data в Telegram ограничена 64 байтами
+    if original and len(original_data.encode()) <= 64:
+        keyboard.button(text="🖼 Оригинал", callback_data=original_data)
+        sizes.append(1)
+    if not sizes:
+        return None
+    keyboard.adjust(*sizes)
+    return keyboard.as_markup()
+
+
+def keep_extra_buttons(markup: Optional[InlineKeyboardMarkup]) -> Optional[InlineKeyboardMarkup]:
+    """Убирает из клавиатуры кнопки подтверждения и отклонения, оставляя остальные."""
+    if markup is None:
+        return None
+    rows = [
+        row for row in markup.inline_keyboard
+        if not any((button.callback_data or "").startswith(("confirm_", "reject_")) for button in row)
+    ]
+    return InlineKeyboardMarkup(inline_keyboard=rows) if rows else None
 
 
-async def send_alert_to_telegram_v2(alert: AlertSchema):
+async def send_alert_to_telegram_v2(alert: AlertSchema, silent: AbstractSet[int] = frozenset()) -> Dict[int, Message]:
     """Отправляет тревогу в Telegram.
     - Если `for_security=True`, добавляет кнопки подтверждения и отклонения.
     - Если `for_security=False`, отправляет только сообщение без кнопок.
+    - Получателям из `silent` (тихие часы) тревога приходит без звука.
+
+    Возвращает отправленные сообщения по ID получателя.
     """
     if not bot:
         raise RuntimeError("Бот не инициализирован. Вызовите setup_telegram() в __main__.py.")
@@ -122,95 +97,389 @@ async def send_alert_to_telegram_v2(alert: AlertSchema):
     telegram_ids = alert.users_telegram_id
     if not telegram_ids:
         logging.warning(f"Пропущена отправка тревоги {alert.id} — нет пользователей")
-        return
-
-    message_text = (
-        f"🚨 <b>Тревога обнаружена!</b>\n\n"
-        f"📍 <b>Устройство:</b> {alert.device.name or 'Неизвестно'}\n"
-        f"🎥 <b>Камера:</b> {alert.source.source_id} ({alert.source.ipv4})\n"
-        f"⏰ <b>Время:</b> {alert.alert_time.strftime('%Y-%m-%d %H:%M:%S')}\n"
-        f"🤖 <b>Алгоритм:</b> {alert.alg.name}\n"
-        f"🆔 <b>ID тревоги:</b> {alert.aibox_alert_id}\n"
-    )
+        return {}
 
+    message_text = build_alert_text(alert)
     image_url = str(alert.image) if alert.image else None
 
-    # Кнопки подтверждения и отклонения
-    if alert.for_security:
-        keyboard = InlineKeyboardBuilder()
-        keyboard.button(text="✅ Подтвердить", callback_data=f"confirm_alert:{alert.id}")
-        keyboard.button(text="❌ Отклонить", callback_data=f"reject_alert:{alert.id}")
-        keyboard.adjust(2)
-        reply_markup = keyboard.as_markup()
-    else:
-        reply_markup = None
+    if not image_url and alert.image_data is None:
+        reply_markup = build_alert_markup(alert)
+        tasks = [
+            sender.send(
+                telegram_id,
+                bot.send_message,
+                text=message_text,
+                parse_mode="HTML",
+                reply_markup=reply_markup,
+                disable_notification=telegram_id in silent,
+            )
+            for telegram_id in telegram_ids
+        ]
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        return _log_send_results(alert, telegram_ids, results)
 
-    tasks = []
+    user_ids = []
+    results = []
+    pending = list(telegram_ids)
+    file_id = None
+    photo, transcoded = await _prepare_photo(alert, image_url)
+    reply_markup = build_alert_markup(alert, original=transcoded)
+    if photo is None:
+        tasks = [
+            sender.send(
+                telegram_id,
+                bot.send_message,
+                text=message_text + "\n⚠️ Изображение недоступно.",
+                parse_mode="HTML",
+                reply_markup=reply_markup,
+                disable_notification=telegram_id in silent,
+            )
+            for telegram_id in telegram_ids
+        ]
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        return _log_send_results(alert, telegram_ids, results)
 
-    async def fetch_and_send(telegram_id: int, image_url: str, reply_markup):
+    # Загружаем фото один раз: отправляем получателям по очереди,
+    # пока первая загрузка не пройдёт и Telegram не вернёт file_id
+    while pending and file_id is None:
+        telegram_id = pending.pop(0)
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(image_url) as resp:
-                    if resp.status != 200:
-                        raise Exception(f"Ошибка загрузки изображения: {resp.status}")
-                    with tempfile.NamedTemporaryFile(delete=False, suffix=".jpg") as tmp_file:
-                        tmp_file.write(await resp.read())
-                        tmp_file_path = tmp_file.name
-            photo = FSInputFile(tmp_file_path)
-            await bot.send_photo(
-                chat_id=telegram_id,
+            sent = await sender.send(
+                telegram_id,
+                bot.send_photo,
                 photo=photo,
                 caption=message_text,
                 parse_mode="HTML",
-                reply_markup=reply_markup
+                reply_markup=reply_markup,
+                disable_notification=telegram_id in silent,
             )
-            os.remove(tmp_file_path)
+            file_id = sent.photo[-1].file_id
+            results.append(sent)
         except Exception as e:
-            logging.error(f"Ошибка отправки тревоги {alert.id} пользователю {telegram_id}: {e}")
-
-    for telegram_id in telegram_ids:
-        if image_url:
-            url_parts = urlparse(image_url)
-            if url_parts.hostname in ("127.0.0.1", "localhost"):
-                relative_path = url_parts.path.lstrip("/")
-                local_path = os.path.join(BASE_DIR, relative_path)
-                if not os.path.exists(local_path):
-                    logging.error(f"Файл изображения не найден: {local_path}")
-                    continue
-                photo = FSInputFile(local_path)
-                task = bot.send_photo(
-                    chat_id=telegram_id,
-                    photo=photo,
-                    caption=message_text,
-                    parse_mode="HTML",
-                    reply_markup=reply_markup
-                )
-                tasks.append((telegram_id, task))
-            else:
-                task = fetch_and_send(telegram_id, image_url, reply_markup)
-                tasks.append((telegram_id, task))
-        else:
-            task = bot.send_message(
-                chat_id=telegram_id,
-                text=message_text,
+            results.append(e)
+        user_ids.append(telegram_id)
+
+    if file_id:
+        if alert.id:
+            await remember_alert_photo(alert.id, file_id)
+        # Остальным получателям отправляем только file_id — без повторной загрузки
+        tasks = [
+            sender.send(
+                telegram_id,
+                bot.send_photo,
+                photo=file_id,
+                caption=message_text,
                 parse_mode="HTML",
-                reply_markup=reply_markup
+                reply_markup=reply_markup,
+                disable_notification=telegram_id in silent,
             )
-            tasks.append((telegram_id, task))
+            for telegram_id in pending
+        ]
+        user_ids.extend(pending)
+        results.extend(await asyncio.gather(*tasks, return_exceptions=True))
 
-    # Выполняем все задачи параллельно
-    if not tasks:
-        logging.warning(f"Нет задач для отправки тревоги {alert.id}")
-        return
+    return _log_send_results(alert, user_ids, results)
+
+
+async def _load_image(image_url: str) -> Optional[bytes]:
+    """Байты изображения из общего кэша в памяти (загружается туда один раз)."""
+    url_parts = urlparse(image_url)
+    if url_parts.hostname in LOCAL_HOSTS:
+        relative_path = url_parts.path.lstrip("/")
+        return await image_fetcher.read_local(os.path.join(BASE_DIR, relative_path))
+    return await image_fetcher.fetch(image_url)
+
+
+async def load_alert_image(alert: AlertSchema) -> Optional[bytes]:
+    """Байты изображения тревоги: уже загруженные вместе с тревогой или из общего кэша."""
+    if alert.image_data is not None:
+        return alert.image_data
+    if alert.image:
+        return await _load_image(str(alert.image))
+    return None
+
+
+async def _prepare_photo(alert: AlertSchema, image_url: Optional[str]) -> Tuple[Optional[InputFile], bool]:
+    """Готовит фото тревоги к загрузке в Telegram.
+
+    Если включено пережатие, отправляется уменьшенная копия, а источник
+    оригинала запоминается для кнопки «Оригинал». Возвращает фото
+    (None, если изображение недоступно) и признак того, что оно пережато.
+    """
+    data = await load_alert_image(alert)
+    if data is None:
+        return None, False
+    filename = f"alert_{alert.aibox_alert_id}.jpg"
+    transcoded = await image_transcoder.transcode(data)
+    if transcoded is None:
+        return BufferedInputFile(data, filename=filename), False
+    if image_url:
+        original = {"url": image_url}
+    else:
+        # Без URL оригинал есть только в памяти этого процесса
+        key = f"original:{alert.aibox_alert_id}"
+        image_fetcher.cache.put(key, data)
+        original = {"cache": key}
+    await state_backend.set(f"alert:original:{alert.aibox_alert_id}", original, ttl=ALERT_STATE_TTL)
+    return BufferedInputFile(transcoded, filename=filename), True
 
-    user_ids, task_list = zip(*tasks)
-    results = await asyncio.gather(*task_list, return_exceptions=True)
 
+def _log_send_results(alert: AlertSchema, user_ids, results) -> Dict[int, Message]:
+    """Собирает успешные отправки и пишет по тревоге одно событие вместо строки на получателя."""
+    sent = {}
+    failed = {}
     for user_id, result in zip(user_ids, results):
         if isinstance(result, Exception):
-            logging.error(f"Ошибка отправки тревоги {alert.id} пользователю {user_id}: {result}")
+            failed[user_id] = repr(result)
+        else:
+            sent[user_id] = result
+    if failed:
+        log_event("alert_send_failed", logging.ERROR, alert_id=alert.id, aibox_alert_id=alert.aibox_alert_id,
+                  sent=len(sent), failed=failed)
+    else:
+        log_event("alert_sent", sample=config.LOG_SAMPLE_RATE, alert_id=alert.id, aibox_alert_id=alert.aibox_alert_id,
+                  sent=len(sent))
+    return sent
+
+
+def schedule_alert_video(alert: AlertSchema, messages: Dict[int, Message]):
+    """Запускает отправку клипа тревоги в фоне, чтобы не задерживать очередь тревог."""
+    if not config.VIDEO_DELIVERY or not alert.video or not messages:
+        return
+    task = asyncio.create_task(send_alert_video(alert, messages))
+    _video_tasks.add(task)
+    task.add_done_callback(_video_tasks.discard)
+
+
+async def wait_video_deliveries(timeout: float):
+    """Ждёт начатые отправки видео при остановке; незавершённые за `timeout` отменяются."""
+    if not _video_tasks:
+        return
+    _, pending = await asyncio.wait(set(_video_tasks), timeout=timeout)
+    for task in pending:
+        task.cancel()
+
+
+async def _prepare_video(alert: AlertSchema) -> Tuple[Optional[InputFile], Optional[str]]:
+    """Готовит клип тревоги к потоковой загрузке в Telegram.
+
+    Файл не читается в память: `FSInputFile` и `URLInputFile` отдают его
+    частями прямо в запрос к Telegram. Возвращает файл (None, если клип
+    недоступен или больше VIDEO_MAX_BYTES) и ссылку на клип для запасного
+    варианта (None, если ссылки нет).
+    """
+    video = alert.video
+    url_parts = urlparse(video)
+    if url_parts.scheme in ("http", "https") and url_parts.hostname not in LOCAL_HOSTS:
+        size = await image_fetcher.content_length(video)
+        if size is not None and size > config.VIDEO_MAX_BYTES:
+            return None, video
+        return URLInputFile(video, filename=os.path.basename(url_parts.path) or None, timeout=config.VIDEO_FETCH_TIMEOUT), video
+
+    relative_path = url_parts.path.lstrip("/")
+    path = os.path.join(BASE_DIR, relative_path)
+    link = urljoin(config.VIDEO_PUBLIC_URL, relative_path) if config.VIDEO_PUBLIC_URL else None
+    try:
+        size = (await asyncio.to_thread(os.stat, path)).st_size
+    except OSError as e:
+        logging.error(f"Видео тревоги {alert.aibox_alert_id} недоступно: {e}")
+        return None, None
+    if size > config.VIDEO_MAX_BYTES:
+        return None, link
+    return FSInputFile(path), link
+
+
+async def send_alert_video(alert: AlertSchema, messages: Dict[int, Message]):
+    """Отправляет клип тревоги ответом на уже доставленные сообщения.
+
+    Клип загружается в Telegram один раз (под отдельным семафором), остальным
+    получателям уходит его file_id. Если клип слишком большой или загрузка не
+    удалась, получатели получают ссылку на него.
+    """
+    global _video_slots
+    if _video_slots is None:
+        _video_slots = asyncio.Semaphore(config.VIDEO_CONCURRENCY)
+    pending = list(messages.items())
+    state_key = f"alert:video:{alert.aibox_alert_id}"
+    file_id = await state_backend.get(state_key)
+    link = None
+    results = []
+    user_ids = []
+
+    if file_id is None:
+        async with _video_slots:
+            video, link = await _prepare_video(alert)
+            if video is not None:
+                # Загрузку не повторяем для следующего получателя: при ошибке всем уходит ссылка
+                telegram_id, message = pending[0]
+                try:
+                    sent = await sender.send(
+                        telegram_id,
+                        bot.send_video,
+                        video=video,
+                        supports_streaming=True,
+                        reply_to_message_id=message.message_id,
+                        request_timeout=config.VIDEO_UPLOAD_TIMEOUT,
+                    )
+                    file_id = sent.video.file_id
+                    pending.pop(0)
+                    user_ids.append(telegram_id)
+                    results.append(sent)
+                except Exception as e:
+                    log_event("alert_video_upload_failed", logging.ERROR, aibox_alert_id=alert.aibox_alert_id, error=repr(e))
+        if file_id:
+            await state_backend.set(state_key, file_id, ttl=ALERT_STATE_TTL)
+
+    if file_id:
+        tasks = [
+            sender.send(telegram_id, bot.send_video, video=file_id, reply_to_message_id=message.message_id)
+            for telegram_id, message in pending
+        ]
+    elif link:
+        tasks = [
+            sender.send(
+                telegram_id,
+                bot.send_message,
+                text=f"🎬 <a href=\"{link}\">Видео тревоги</a>",
+                parse_mode="HTML",
+                reply_to_message_id=message.message_id,
+            )
+            for telegram_id, message in pending
+        ]
+    else:
+        log_event("alert_video_unavailable", logging.WARNING, aibox_alert_id=alert.aibox_alert_id, video=alert.video)
+        return
+    user_ids.extend(telegram_id for telegram_id, _ in pending)
+    results.extend(await asyncio.gather(*tasks, return_exceptions=True))
+    failed = {user_id: repr(result) for user_id, result in zip(user_ids, results) if isinstance(result, Exception)}
+    log_event(
+        "alert_video_failed" if failed else "alert_video_sent",
+        logging.ERROR if failed else logging.INFO,
+        aibox_alert_id=alert.aibox_alert_id, as_link=file_id is None, sent=len(results) - len(failed), failed=failed,
+    )
+
+
+async def update_coalesced_alert(alert: AlertSchema, messages: Dict[int, Message], folded: int, last_time: datetime):
+    """Дописывает к уже отправленной тревоге, сколько похожих тревог было свёрнуто в неё."""
+    text = (
+        build_alert_text(alert)
+        + f"🔁 <b>Ещё тревог:</b> {folded} (последняя в {last_time.strftime('%H:%M:%S')})\n"
+    )
+    # Если тревогу уже подтвердили или отклонили, кнопки решения не возвращаем
+    handled = await state_backend.get(f"alert:handled:{alert.id}")
+    original = await state_backend.get(f"alert:original:{alert.aibox_alert_id}")
+    reply_markup = build_alert_markup(alert, original=original is not None, actions=not handled)
+    tasks = []
+    for telegram_id, message in messages.items():
+        if message.photo:
+            tasks.append(sender.send(
+                telegram_id,
+                bot.edit_message_caption,
+                message_id=message.message_id,
+                caption=text,
+                parse_mode="HTML",
+                reply_markup=reply_markup
+            ))
         else:
-            logging.info(f"Тревога {alert.id} успешно отправлена пользователю {user_id}")
+            tasks.append(sender.send(
+                telegram_id,
+                bot.edit_message_text,
+                message_id=message.message_id,
+                text=text,
+                parse_mode="HTML",
+                reply_markup=reply_markup
+            ))
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    for telegram_id, result in zip(messages, results):
+        if isinstance(result, Exception):
+            logging.error(f"Не удалось обновить тревогу {alert.id} у пользователя {telegram_id}: {result}")
+
+
+def build_digest_text(alerts: List[AlertSchema], max_lines: int = 20) -> str:
+    """Сводка по тревогам, отложенным под нагрузкой: число тревог по камере и алгоритму."""
+    groups: Dict[Tuple[str, str], int] = {}
+    for alert in alerts:
+        key = (alert.source.source_id, alert.alg.name)
+        groups[key] = groups.get(key, 0) + 1
+    first = min(alert.alert_time for alert in alerts)
+    last = max(alert.alert_time for alert in alerts)
+    lines = [
+        f"🎥 {source_id} · 🤖 {alg}: {count}"
+        for (source_id, alg), count in sorted(groups.items(), key=lambda item: -item[1])[:max_lines]
+    ]
+    if len(groups) > max_lines:
+        lines.append(f"…и ещё {len(groups) - max_lines} камер и алгоритмов")
+    return (
+        f"📋 <b>Сводка тревог</b>\n"
+        f"Из-за нагрузки {len(alerts)} тревог отправлены без подробностей "
+        f"({first.strftime('%H:%M:%S')}–{last.strftime('%H:%M:%S')}).\n\n"
+        + "\n".join(lines)
+    )
+
+
+async def send_alert_digest(alerts_by_chat: Dict[int, List[AlertSchema]]):
+    """Отправляет каждому получателю одну сводку вместо отдельных сообщений о тревогах."""
+    if not bot:
+        raise RuntimeError("Бот не инициализирован. Вызовите setup_telegram() в __main__.py.")
+    tasks = [
+        sender.send(telegram_id, bot.send_message, text=build_digest_text(alerts), parse_mode="HTML")
+        for telegram_id, alerts in alerts_by_chat.items()
+    ]
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    failed = sum(isinstance(result, Exception) for result in results)
+    log_event(
+        "alert_digest_sent", logging.ERROR if failed else logging.INFO,
+        chats=len(results) - failed, failed=failed,
+        alerts=sum(len(alerts) for alerts in alerts_by_chat.values()),
+    )
+
+
+async def mark_alert_handled(alert_id: int):
+    """Отмечает, что по тревоге уже нажали «Подтвердить» или «Отклонить»."""
+    await state_backend.set(f"alert:handled:{alert_id}", 1, ttl=ALERT_STATE_TTL)
+
+
+async def unmark_alert_handled(alert_id: int):
+    """Снимает отметку о решении, если его не удалось отправить в Django."""
+    await state_backend.delete(f"alert:handled:{alert_id}")
+
+
+async def remember_alert_photo(alert_id: int, file_id: str):
+    """Запоминает file_id фото тревоги для повторной отправки (например, учредителям)."""
+    await state_backend.set(f"alert:photo:{alert_id}", file_id, ttl=ALERT_STATE_TTL)
+
+
+async def get_alert_photo(alert_id: int) -> Optional[str]:
+    """Возвращает file_id ранее загруженного фото тревоги, если он известен."""
+    return await state_backend.get(f"alert:photo:{alert_id}")
+
+
+async def send_original_photo(telegram_id: int, aibox_alert_id: str) -> bool:
+    """Отправляет получателю исходное (непережатое) фото тревоги документом.
+
+    Документ загружается в Telegram один раз, дальше отправляется по file_id.
+    Возвращает False, если оригинал уже недоступен.
+    """
+    file_id = await state_backend.get(f"alert:original_file:{aibox_alert_id}")
+    if file_id:
+        await sender.send(telegram_id, bot.send_document, document=file_id)
+        return True
+    original = await state_backend.get(f"alert:original:{aibox_alert_id}")
+    if original is None:
+        return False
+    if "url" in original:
+        data = await _load_image(original["url"])
+    else:
+        data = image_fetcher.cache.get(original["cache"])
+    if data is None:
+        return False
+    sent = await sender.send(
+        telegram_id,
+        bot.send_document,
+        document=BufferedInputFile(data, filename=f"alert_{aibox_alert_id}_original.jpg"),
+    )
+    await state_backend.set(f"alert:original_file:{aibox_alert_id}", sent.document.file_id, ttl=ALERT_STATE_TTL)
+    return True
 
 
 async def register_user(message: types.Message, token: str):
@@ -218,15 +487,9 @@ async def register_user(message: types.Message, token: str):
     Отправляет токен пользователя в Django API для привязки Telegram ID.
     """
     try:
-        print(1111)
-        url = f"{django_api_url}/api/users/v1/register_telegram/"
-        print(2222222)
-        response = requests.post(url, json={"telegram_id": message.chat.id, "token": token})
-        print(response.status_code)
+        response = await django_api.register_telegram(message.chat.id, token)
         data = response.json()
-        print(response.status_code)
         if response.status_code == 200:
-            print(3333)
             user_info = data.get("user", {})
             company_name = user_info.get("company_name", "Неизвестная компания")
             telegram_username = message.from_user.full_name  # Получаем имя из Telegram
@@ -238,6 +501,6 @@ async def register_user(message: types.Message, token: str):
             )
         else:
             await message.answer(f"❌ Ошибка: {data.get('error', 'Попробуйте позже.')}")
-    except requests.RequestException as e:
+    except (DjangoAPIUnavailable, ValueError) as e:
         logging.error(f"Ошибка при отправке данных в Django API: {e}")
         await message.answer("❌ Не удалось связаться с сервером. Попробуйте позже.")